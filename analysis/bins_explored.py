@@ -4,6 +4,8 @@ import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib import cm
 
+from htsohm.tables import load_columns
+
 output_path = "comparison_graph1.png"
 col = 18
 csv_files = ["reference", "random4", "random8", "random16", "atoms_1", "atoms_2", "atoms_8",
@@ -22,7 +24,8 @@ max_mats = 0
 print("loading data...")
 
 for path in csv_files:
-    r = np.loadtxt(path + ".csv", delimiter=',', skiprows=1, usecols=col)
+    # the bin columns are only in csv files from psm-csv-add-bin, not in psm-export files
+    r = load_columns(path + ".csv", col)
     rmax_by_mat = np.maximum.accumulate(r)
     all_data.append(rmax_by_mat)
     max_mats = max(max_mats, rmax_by_mat.size)
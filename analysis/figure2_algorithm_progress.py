@@ -6,7 +6,8 @@ from matplotlib.collections import PatchCollection
 from matplotlib.patches import Rectangle, Circle, ConnectionPatch
 import numpy as np
 
-from htsohm.htsohm_run import calc_bins
+from htsohm.bins import calc_bins
+from htsohm.tables import load_columns
 
 
 def delaunay_figure(ax, convergence_bins, bins=[], prop1range=(0.0,1.0), prop2range=(0.0,1.0)):
@@ -66,8 +67,10 @@ def figure2_bin_graph(csv_paths=("reference", "random16")):
     fig = plt.figure(figsize=(3.8,3.8*2))
 
     for i, csv_path in enumerate(csv_paths):
+        # the bin columns are only in csv files from psm-csv-add-bin, not in psm-export files
+        all_bins = load_columns(csv_path + ".csv", (16, 17), max_rows=max(materials), dtype=int)
         for j, last_material in enumerate(materials):
-            bins = np.loadtxt(csv_path + ".csv", delimiter=',', skiprows=1, usecols=(16, 17), max_rows=last_material, dtype=int)
+            bins = all_bins[:last_material]
             bin_counts = np.zeros((num_bins, num_bins))
             for bx, by in bins:
                 bin_counts[bx,by] += 1
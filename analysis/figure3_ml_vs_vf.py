@@ -4,7 +4,8 @@ import matplotlib
 import matplotlib.pyplot as plt
 from matplotlib import rc
 import numpy as np
-import pandas as pd
+
+from htsohm.tables import read_table
 
 prop1range = [0.0, 1.0]   # VF
 prop2range = [0.0, 800.0] # ML
@@ -15,14 +16,14 @@ rc('font',**{'family':'sans-serif','sans-serif':['Helvetica']})
 # rc('text', usetex=True)
 
 @click.command()
-@click.argument('csv-path', type=click.File())
+@click.argument('csv-path', type=click.Path())
 def figure3_ml_vs_vf(csv_path):
     num_bins = 40
 
     fig = plt.figure(figsize=(4,4))
 
     cm = matplotlib.cm.get_cmap("viridis")
-    points = pd.read_csv(csv_path)
+    points = read_table(csv_path, columns=['void_fraction_geo', 'absolute_volumetric_loading', 'a', 'b', 'c'])
     points['ch4_uc'] = points.absolute_volumetric_loading * (num_ch4_a3 * points.a * points.b * points.c)
 
     ax = fig.subplots(ncols=1)
@@ -5,7 +5,8 @@ import matplotlib
 import matplotlib.pyplot as plt
 from matplotlib import rc
 import numpy as np
-import pandas as pd
+
+from htsohm.tables import read_table
 
 prop1range = [-0.01, 1.0]   # site_distribution
 prop2range = [0.0, 800.0] # ML
@@ -23,13 +24,13 @@ matplotlib.rc('font', **font)
 # rc('text', usetex=True)
 
 @click.command()
-@click.argument('csv-path', type=click.File())
+@click.argument('csv-path', type=click.Path())
 def figure4_ml_vs_site_distribution(csv_path):
     fig = plt.figure(figsize=(8.5 / 2.54, 8.5 / 2.54))
 
     cm = matplotlib.cm.get_cmap("viridis")
     # cm = cmocean.cm.thermal
-    points = pd.read_csv(csv_path)
+    points = read_table(csv_path, columns=['site_distribution', 'absolute_volumetric_loading', 'a', 'b', 'c'])
     points['ch4_uc'] = points.absolute_volumetric_loading * (num_ch4_a3 * points.a * points.b * points.c)
 
     ax = fig.subplots(ncols=1)
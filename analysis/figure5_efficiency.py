@@ -8,6 +8,8 @@ from matplotlib import rc
 # from matplotlib import cm
 import pandas as pd
 
+from htsohm.tables import read_table
+
 # fsl = fs = 8
 # rc('font',**{'family':'sans-serif','sans-serif':['Helvetica']})
 
@@ -38,7 +40,7 @@ def figure5_efficiency():
         ax.grid(linestyle='-', color='0.8', zorder=0)
         # ax.axhline(1600, linestyle="--", lw=2, color="black", label=0)
         for path in csv_paths:
-            df[path] = pd.read_csv(path, usecols=["unique_bins"])
+            df[path] = read_table(path, columns=["unique_bins"])
 
         return df
 
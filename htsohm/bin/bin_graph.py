@@ -6,14 +6,15 @@ import numpy as np
 from htsohm import load_config_file, db
 from htsohm.db import Material, VoidFraction
 from htsohm.figures import delaunay_figure
-from htsohm.htsohm_run import calc_bins
+from htsohm.bins import calc_bins
+from htsohm.tables import load_columns
 
 from sqlalchemy.orm import joinedload
 
 @click.command()
 @click.argument('config-path', type=click.Path())
 @click.option('--database-path', type=click.Path())
-@click.option('--csv-path', type=click.Path())
+@click.option('--csv-path', type=click.Path(), help="csv, parquet or feather file from psm-csv or psm-export")
 @click.option('--last-material', '-l', type=int, default=None)
 @click.option('--sigma-limits', type=float, nargs=2)
 @click.option('--epsilon-limits', type=float, nargs=2)
@@ -35,7 +36,7 @@ def bin_graph(config_path, database_path=None, csv_path=None, last_material=None
     print("loading materials...")
 
     if csv_path:
-        mats_r = np.loadtxt(csv_path, delimiter=',', skiprows=1, usecols=(8,9,5,6), max_rows=last_material)
+        mats_r = load_columns(csv_path, (8,9,5,6), max_rows=last_material)
         print("%d rows loaded from csv" % mats_r.shape[0])
         if sigma_limits:
             mats_r = mats_r[(sigma_limits[0] <= mats_r[:,2]) & (mats_r[:,2] <= sigma_limits[1])]
@@ -62,12 +63,11 @@ def bin_graph(config_path, database_path=None, csv_path=None, last_material=None
     print("calculating bins...")
     bin_counts = np.zeros((num_bins, num_bins))
     start_bins = calc_bins(mats_r[0:last_generation_start], num_bins, prop1range=prop1range, prop2range=prop2range)
-    for i, (bx, by) in enumerate(start_bins):
-        bin_counts[bx,by] += 1
+    np.add.at(bin_counts, tuple(start_bins.T), 1)
     bins_explored = np.count_nonzero(bin_counts)
     new_bins = calc_bins(mats_r[last_generation_start:], num_bins, prop1range=prop1range, prop2range=prop2range)
-    print(len(new_bins), len(start_bins), len(set(new_bins) - set(start_bins)))
-    new_bins = set(new_bins) - set(start_bins)
+    new_bins = set(map(tuple, new_bins.tolist())) - set(map(tuple, start_bins.tolist()))
+    print(len(mats_r) - last_generation_start, last_generation_start, len(new_bins))
     print("bins explored = %d" % bins_explored)
 
     children = []
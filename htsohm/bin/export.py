@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+
+import click
+
+from htsohm import db
+from htsohm.bin.output_csv import MATERIAL_COLUMNS, ATOM_SITE_COLUMNS, material_row_chunks, atom_site_row_chunks
+from htsohm.tables import table_format, write_table
+
+@click.command()
+@click.argument('database-path', type=click.Path())
+@click.argument('output-path', type=click.Path())
+@click.option('--atom-sites-path', type=click.Path(), help="also write every atom site to this path")
+@click.option('--start-id', default=0, type=int)
+@click.option('--chunk-size', default=10000, type=int, help="materials read and written at a time")
+def export(database_path, output_path, atom_sites_path=None, start_id=0, chunk_size=10000):
+    """writes the same columns as psm-csv (and psm-atoms-csv) to a parquet (.parquet, .pq) or feather
+    (.feather, .arrow) file, with typed columns, so analysis scripts can read just the columns they
+    need."""
+    for path in filter(None, [output_path, atom_sites_path]):
+        if table_format(path) == "csv":
+            raise click.BadParameter("%s must end in .parquet, .pq, .feather or .arrow" % path)
+
+    db.init_database(db.get_sqlite_dbcs(database_path))
+    session = db.get_session()
+    export_from_db(session, output_path, atom_sites_path, start_id, chunk_size)
+
+def export_from_db(session, output_path, atom_sites_path=None, start_id=0, chunk_size=10000):
+    write_table(output_path, MATERIAL_COLUMNS, material_row_chunks(session, start_id, chunk_size))
+    if atom_sites_path:
+        write_table(atom_sites_path, ATOM_SITE_COLUMNS, atom_site_row_chunks(session, 10 * chunk_size))
+
+if __name__ == '__main__':
+    export()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+import click
+import numpy as np
+
+from htsohm import db
+from htsohm.db import AtomSite, AtomTypes, Structure
+from htsohm.structure_arrays import PACKED_SITE_DTYPE, unpack_sites
+
+@click.command()
+@click.argument('database-path', type=click.Path())
+@click.option('--pack-atom-sites', 'atom_site_storage', flag_value='packed',
+              help="store the atom sites of every structure in structures.packed_sites")
+@click.option('--unpack-atom-sites', 'atom_site_storage', flag_value='rows',
+              help="store the atom sites of every structure as atom_sites rows")
+@click.option('--chunk-size', default=10000, type=int, help="structures converted per transaction")
+def migrate_db(database_path, atom_site_storage=None, chunk_size=10000):
+    """adds the columns missing from databases created by older versions (as any command that
+    opens the database does), then optionally converts the atom sites to (or from) packed storage."""
+    engine, session = db.init_database(db.get_sqlite_dbcs(database_path))
+
+    if atom_site_storage == "packed":
+        print("packed atom sites of %d structures" % pack_atom_sites(session, chunk_size))
+    elif atom_site_storage == "rows":
+        print("unpacked atom sites of %d structures" % unpack_atom_sites(session, chunk_size))
+
+def pack_atom_sites(session, chunk_size=10000):
+    """moves the AtomSite rows of every structure into the structure's packed_sites, chunk_size
+    structures per transaction, and returns the number of structures packed."""
+    num_packed = 0
+    last_id = -1
+    while True:
+        structure_ids = [structure_id for structure_id, in session.query(Structure.id)
+            .filter(Structure.packed_sites.is_(None))
+            .filter(Structure.id > last_id).order_by(Structure.id).limit(chunk_size)]
+        if len(structure_ids) == 0:
+            break
+        first_id, last_id = structure_ids[0], structure_ids[-1]
+
+        # the index of each atom type in its Structure.atom_types
+        type_indices = {}
+        num_atom_types = {}
+        for structure_id, atom_types_id in session.query(AtomTypes.structure_id, AtomTypes.id) \
+                .filter(AtomTypes.structure_id.between(first_id, last_id)).order_by(AtomTypes.id):
+            type_indices[atom_types_id] = num_atom_types.get(structure_id, 0)
+            num_atom_types[structure_id] = type_indices[atom_types_id] + 1
+        sites = {structure_id: [] for structure_id in structure_ids}
+        for structure_id, x, y, z, q, atom_types_id in session.query(AtomSite.structure_id, AtomSite.x,
+                AtomSite.y, AtomSite.z, AtomSite.q, AtomSite.atom_types_id) \
+                .filter(AtomSite.structure_id.between(first_id, last_id)).order_by(AtomSite.id):
+            if structure_id in sites:
+                sites[structure_id].append((x, y, z, q, type_indices[atom_types_id]))
+
+        session.bulk_update_mappings(Structure, [
+            dict(id=structure_id, packed_sites=np.array(s, dtype=PACKED_SITE_DTYPE).tobytes())
+            for structure_id, s in sites.items()])
+        session.query(AtomSite).filter(AtomSite.structure_id.in_(structure_ids)).delete(synchronize_session=False)
+        session.commit()
+        num_packed += len(structure_ids)
+    return num_packed
+
+def unpack_atom_sites(session, chunk_size=10000):
+    """moves the packed_sites of every structure back into AtomSite rows, chunk_size structures per
+    transaction, and returns the number of structures unpacked."""
+    num_unpacked = 0
+    while True:
+        structures = session.query(Structure.id, Structure.packed_sites) \
+            .filter(Structure.packed_sites.isnot(None)).order_by(Structure.id).limit(chunk_size).all()
+        if len(structures) == 0:
+            break
+
+        atom_types_ids = {structure_id: [] for structure_id, _ in structures}
+        for structure_id, atom_types_id in session.query(AtomTypes.structure_id, AtomTypes.id) \
+                .filter(AtomTypes.structure_id.between(structures[0][0], structures[-1][0])).order_by(AtomTypes.id):
+            if structure_id in atom_types_ids:
+                atom_types_ids[structure_id].append(atom_types_id)
+
+        session.bulk_insert_mappings(AtomSite, [
+            dict(structure_id=structure_id, atom_types_id=atom_types_ids[structure_id][t], x=x, y=y, z=z, q=q)
+            for structure_id, packed_sites in structures
+            for x, y, z, q, t in unpack_sites(packed_sites).tolist()])
+        session.bulk_update_mappings(Structure, [dict(id=structure_id, packed_sites=None)
+                                                 for structure_id, _ in structures])
+        session.commit()
+        num_unpacked += len(structures)
+    return num_unpacked
+
+if __name__ == '__main__':
+    migrate_db()
@@ -1,13 +1,17 @@
 #!/usr/bin/env python3
 import csv
+from itertools import islice
 import sys
 
 import click
+import numpy as np
+from sqlalchemy import func
 from sqlalchemy.orm import joinedload
 
 from htsohm import db
-from htsohm.bins import calc_bin
-from htsohm.db import Material, AtomSite
+from htsohm.bins import calc_property_bins
+from htsohm.db import Material, AtomSite, AtomTypes, Structure
+from htsohm.structure_arrays import unpack_sites
 
 @click.command()
 @click.argument('database-path', type=click.Path())
@@ -17,24 +21,82 @@ def output_csv(database_path, start_id=0):
     session = db.get_session()
     output_csv_from_db(session, start_id)
 
-def output_csv_from_db(session, start_id=0, output_file=sys.stdout):
-    mats = session.query(Material) \
-        .options(joinedload("structure").joinedload("atom_types", "atom_sites")) \
-        .options(joinedload("gas_loading")) \
-        .options(joinedload("void_fraction")) \
-        .filter(Material.id >= start_id).all()
-
+MATERIAL_COLUMNS = [("id", "int64"), ("parent_id", "int64"), ("generation", "int64"), ("a", "float64"),
+    ("b", "float64"), ("c", "float64"), ("volume", "float64"), ("atom_sites", "int64"),
+    ("number_density", "float64"), ("total_epsilon", "float64"), ("epsilon_density", "float64"),
+    ("void_fraction", "float64"), ("void_fraction_geo", "float64"), ("absolute_volumetric_loading", "float64"),
+    ("absolute_volumetric_loading_error", "float64"), ("site_distribution", "float64")]
+
+ATOM_SITE_COLUMNS = [("id", "int64"), ("structure_id", "int64"), ("x", "float64"), ("y", "float64"),
+    ("z", "float64"), ("epsilon", "float64"), ("sigma", "float64"), ("a", "float64")]
+
+# MATERIAL_COLUMNS column of each property that spans the property space; surface area has none
+PROPERTY_COLUMNS = {"gas_loading": "absolute_volumetric_loading", "number_density": "number_density",
+                    "site_distribution": "site_distribution"}
+
+def property_column_index(name, void_fraction_subtype="raspa"):
+    """returns the index in MATERIAL_COLUMNS of the property with the given name, or None if the
+    property isn't a material column (surface_area, or the zeo++ void fraction)."""
+    if name == "void_fraction":
+        column = {"raspa": "void_fraction", "geo": "void_fraction_geo"}.get(void_fraction_subtype)
+    else:
+        column = PROPERTY_COLUMNS.get(name)
+    names = [n for n, _ in MATERIAL_COLUMNS]
+    return names.index(column) if column in names else None
+
+def output_csv_from_db(session, start_id=0, output_file=sys.stdout, chunk_size=10000):
+    """writes a row for every material with an id >= start_id; see material_row_chunks."""
     f = csv.writer(output_file, lineterminator="\n")
-    f.writerow(["id", "parent_id", "generation", "a", "b", "c", "volume", "atom_sites", "number_density",
-                "total_epsilon", "epsilon_density", "void_fraction", "void_fraction_geo",
-                "absolute_volumetric_loading", "absolute_volumetric_loading_error", "site_distribution"])
-    for m in mats:
-        f.writerow([m.id, m.parent_id, m.generation, m.structure.a, m.structure.b, m.structure.c, m.structure.volume,
-            len(m.structure.atom_sites),  m.structure.number_density, m.structure.total_epsilon, m.structure.epsilon_density,
-            m.void_fraction[0].void_fraction, m.void_fraction[0].void_fraction_geo,
-            m.gas_loading[0].absolute_volumetric_loading, m.gas_loading[0].absolute_volumetric_loading_error,
-            m.structure.site_distribution
-        ])
+    f.writerow([name for name, _ in MATERIAL_COLUMNS])
+    for rows in material_row_chunks(session, start_id, chunk_size):
+        f.writerows(rows)
+
+def material_row_chunks(session, start_id=0, chunk_size=10000):
+    """yields lists of rows, with the MATERIAL_COLUMNS of every material with an id >= start_id.
+
+    Materials are read chunk_size at a time, in id order, and each chunk is expunged from the
+    session once it is yielded, so memory use doesn't grow with the size of the database. The
+    number of atom sites and the total epsilon of each structure are summed in SQL instead of
+    loading the atom sites (or, for structures with packed sites, summed from the packed sites).
+    """
+    last_id = start_id - 1
+    while True:
+        mats = session.query(Material) \
+            .options(joinedload("structure")) \
+            .options(joinedload("gas_loading")) \
+            .options(joinedload("void_fraction")) \
+            .filter(Material.id > last_id).order_by(Material.id).limit(chunk_size).all()
+        if len(mats) == 0:
+            break
+
+        site_stats = session.query(AtomSite.structure_id, func.count(AtomSite.id), func.sum(AtomTypes.epsilon)) \
+            .join(AtomTypes, AtomSite.atom_types_id == AtomTypes.id) \
+            .join(Structure, AtomSite.structure_id == Structure.id) \
+            .filter(Structure.material_id.between(mats[0].id, mats[-1].id)) \
+            .group_by(AtomSite.structure_id)
+        site_stats = {structure_id: (num_sites, total_epsilon) for structure_id, num_sites, total_epsilon in site_stats}
+
+        packed = [m.structure for m in mats if m.structure.packed_sites is not None]
+        atom_types = atom_types_by_structure(session, [s.id for s in packed])
+        for s in packed:
+            type_index = unpack_sites(s.packed_sites)["type_index"]
+            site_stats[s.id] = (len(type_index), sum(atom_types[s.id][1][type_index].tolist()))
+
+        rows = []
+        for m in mats:
+            s = m.structure
+            num_sites, total_epsilon = site_stats.get(s.id, (0, 0))
+            rows.append([m.id, m.parent_id, m.generation, s.a, s.b, s.c, s.volume,
+                num_sites, num_sites / s.volume, total_epsilon, total_epsilon / s.volume,
+                m.void_fraction[0].void_fraction, m.void_fraction[0].void_fraction_geo,
+                m.gas_loading[0].absolute_volumetric_loading, m.gas_loading[0].absolute_volumetric_loading_error,
+                m.site_distribution if m.site_distribution is not None else s.site_distribution
+            ])
+        yield rows
+
+        last_id = mats[-1].id
+        for m in mats:
+            session.expunge(m)
 
 
 @click.command()
@@ -44,14 +106,57 @@ def output_atom_sites_csv(database_path):
     session = db.get_session()
     output_atom_sites_csv_from_db(session)
 
-def output_atom_sites_csv_from_db(session, output_file=sys.stdout):
-    sites = session.query(AtomSite) \
-        .options(joinedload("atom_types"))
-
+def output_atom_sites_csv_from_db(session, output_file=sys.stdout, chunk_size=100000):
     f = csv.writer(output_file, lineterminator="\n")
-    f.writerow(["id", "structure_id", "x", "y", "z", "epsilon", "sigma", "a"])
-    for s in sites:
-        f.writerow([s.id, s.structure_id, s.x, s.y, s.z, s.atom_types.epsilon, s.atom_types.sigma, s.structure.a])
+    f.writerow([name for name, _ in ATOM_SITE_COLUMNS])
+    for rows in atom_site_row_chunks(session, chunk_size):
+        f.writerows(rows)
+
+def atom_types_by_structure(session, structure_ids):
+    """returns a dict of structure id => (sigma, epsilon) arrays of the structure's atom types, in
+    the order of Structure.atom_types."""
+    atom_types = {structure_id: ([], []) for structure_id in structure_ids}
+    if len(atom_types) > 0:
+        rows = session.query(AtomTypes.structure_id, AtomTypes.sigma, AtomTypes.epsilon) \
+            .filter(AtomTypes.structure_id.between(min(structure_ids), max(structure_ids))) \
+            .order_by(AtomTypes.id)
+        for structure_id, sigma, epsilon in rows:
+            if structure_id in atom_types:
+                atom_types[structure_id][0].append(sigma)
+                atom_types[structure_id][1].append(epsilon)
+    return {structure_id: (np.array(sigma), np.array(epsilon)) for structure_id, (sigma, epsilon) in atom_types.items()}
+
+def atom_site_row_chunks(session, chunk_size=100000):
+    """yields lists of rows, with the ATOM_SITE_COLUMNS of every atom site, chunk_size sites at a
+    time in id order. Sites of structures with packed sites don't have ids; they follow all other
+    sites, in structure order, with an id of None."""
+    last_id = -1
+    while True:
+        rows = session.query(AtomSite.id, AtomSite.structure_id, AtomSite.x, AtomSite.y, AtomSite.z,
+                             AtomTypes.epsilon, AtomTypes.sigma, Structure.a) \
+            .join(AtomTypes, AtomSite.atom_types_id == AtomTypes.id) \
+            .join(Structure, AtomSite.structure_id == Structure.id) \
+            .filter(AtomSite.id > last_id).order_by(AtomSite.id).limit(chunk_size).all()
+        if len(rows) == 0:
+            break
+        yield [list(r) for r in rows]
+        last_id = rows[-1][0]
+
+    last_id = -1
+    while True:
+        structures = session.query(Structure.id, Structure.a, Structure.packed_sites) \
+            .filter(Structure.packed_sites.isnot(None)) \
+            .filter(Structure.id > last_id).order_by(Structure.id).limit(max(chunk_size // 10, 1)).all()
+        if len(structures) == 0:
+            break
+        atom_types = atom_types_by_structure(session, [structure_id for structure_id, _, _ in structures])
+        rows = []
+        for structure_id, a, packed_sites in structures:
+            sigma, epsilon = atom_types[structure_id]
+            rows += [[None, structure_id, x, y, z, epsilon[t], sigma[t], a]
+                     for x, y, z, _, t in unpack_sites(packed_sites).tolist()]
+        yield rows
+        last_id = structures[-1][0]
 
 @click.command()
 @click.argument('database-path', type=click.Path())
@@ -62,14 +167,14 @@ def output_material_csv(database_path, ids):
     output_materials_csvs_from_db(session, ids)
 
 def output_material_csv_from_db(session, id, output_file):
-    sites = session.query(AtomSite).options(joinedload("atom_types")).filter(AtomSite.structure_id == id)
+    structure = session.query(Structure).get(id)
 
-    a = sites[0].structure.a
+    a = structure.a
     output_file.write("ucs: %f,%f,%f\n" % (a,a,a))
 
     f = csv.writer(output_file, lineterminator="\n")
     f.writerow(["id", "structure_id", "x", "y", "z", "epsilon", "sigma"])
-    for s in sites:
+    for s in structure.atom_sites:
         f.writerow([s.id, s.structure_id, s.x, s.y, s.z, s.atom_types.epsilon, s.atom_types.sigma])
 
 def output_materials_csvs_from_db(session, ids):
@@ -85,7 +190,11 @@ def output_materials_csvs_from_db(session, ids):
 def csv_add_bin(csv_path, bin, output_file=sys.stdout):
     csv_add_bin_column(csv_path, bin, output_file)
 
-def csv_add_bin_column(csv_path, bin, output_file=sys.stdout):
+def csv_add_bin_column(csv_path, bin, output_file=sys.stdout, chunk_size=100000):
+    """adds a column with the bin of each of the columns in bin, and a column with the number of
+    unique bins so far. Rows are binned chunk_size rows at a time."""
+    ranges = [(lb, ub) for _, lb, ub, _ in bin]
+    num_bins = [nb for _, _, _, nb in bin]
     with open(csv_path) as f:
         csv_in = csv.reader(f)
         csv_out = csv.writer(output_file, lineterminator="\n")
@@ -94,10 +203,23 @@ def csv_add_bin_column(csv_path, bin, output_file=sys.stdout):
         bin_col_labels = ["bin%d" % col for col, _, _, _ in bin]
         csv_out.writerow(header + bin_col_labels + ["unique_bins"])
         unique_bins = set()
-        for row in csv_in:
-            calcd_bins = [calc_bin(float(row[col]), lb, ub, nb) for col, lb, ub, nb in bin]
-            unique_bins = unique_bins.union(set([tuple(calcd_bins)]))
-            csv_out.writerow(row + calcd_bins + [len(unique_bins)])
+        while True:
+            rows = list(islice(csv_in, chunk_size))
+            if len(rows) == 0:
+                break
+            values = np.array([[row[col] for col, _, _, _ in bin] for row in rows], dtype=float)
+            calcd_bins = calc_property_bins(values, ranges, num_bins)
+
+            # a row adds a unique bin if it is the first row in any chunk with that bin
+            keys = np.ravel_multi_index(calcd_bins.T, num_bins)
+            chunk_keys, first_rows = np.unique(keys, return_index=True)
+            is_new = np.zeros(len(rows), dtype=int)
+            is_new[first_rows[~np.isin(chunk_keys, list(unique_bins))]] = 1
+            num_unique_bins = len(unique_bins) + np.cumsum(is_new)
+            unique_bins.update(chunk_keys.tolist())
+
+            csv_out.writerows(row + row_bins + [n] for row, row_bins, n in
+                              zip(rows, calcd_bins.tolist(), num_unique_bins.tolist()))
 
 
 if __name__ == '__main__':
@@ -1,3 +1,8 @@
+from itertools import product
+
+import numpy as np
+from scipy.ndimage import binary_dilation
+
 
 def calc_bin(value, bound_min, bound_max, bins):
     """Find bin in parameter range.
@@ -15,5 +20,312 @@ def calc_bin(value, bound_min, bound_max, bins):
     assigned_bin = max(assigned_bin, 0)
     return int(assigned_bin)
 
+def calc_property_bins(values, ranges, num_bins):
+    """Find the bins of many values of many properties at once; vectorized version of calc_bin.
+    Args:
+        values (array-like): (n, k) values of k properties.
+        ranges (array-like): (lower limit, upper limit) of each of the k properties.
+        num_bins (int or array-like): number of bins for all properties, or for each property.
+    Returns:
+        (n, k) int array of the bin of each value.
+    """
+    ranges = np.asarray(ranges, dtype=float).reshape(-1, 2)
+    values = np.asarray(values, dtype=float).reshape(-1, len(ranges))
+    num_bins = np.broadcast_to(num_bins, len(ranges))
+    step = (ranges[:, 1] - ranges[:, 0]) / num_bins
+    assigned_bins = (values - ranges[:, 0]) // step
+    return np.clip(assigned_bins, 0, num_bins - 1).astype(int)
+
 def calc_bins(box_r, num_bins, prop1range=(0.0, 1.0), prop2range=(0.0, 1.0)):
-    return [(calc_bin(b[0], *prop1range, num_bins), calc_bin(b[1], *prop2range, num_bins)) for b in box_r]
+    """returns an (n, 2) int array of the bins of the materials in box_r."""
+    return calc_property_bins(box_r, (prop1range, prop2range), num_bins)
+
+class FenwickTree(object):
+    """binary indexed tree over n non-negative values, with prefix sums, updates and weighted
+    sampling in O(log n). Indices are 0-based; the tree grows as larger indices are updated."""
+
+    def __init__(self, n=16):
+        self.values = np.zeros(n)
+        self.tree = np.zeros(n + 1)
+
+    @classmethod
+    def from_values(cls, values):
+        """returns a new FenwickTree over values, built in O(n)."""
+        fenwick = cls(0)
+        fenwick.values = np.array(values, dtype=float)
+        fenwick.tree = np.concatenate(([0.0], fenwick.values))
+        for i in range(1, len(fenwick.tree)):
+            parent = i + (i & -i)
+            if parent < len(fenwick.tree):
+                fenwick.tree[parent] += fenwick.tree[i]
+        return fenwick
+
+    def __len__(self):
+        return len(self.values)
+
+    def add(self, i, delta):
+        if i >= len(self):
+            values = np.zeros(max(i + 1, 2 * len(self)))
+            values[:len(self)] = self.values
+            grown = FenwickTree.from_values(values)
+            self.values, self.tree = grown.values, grown.tree
+        self.values[i] += delta
+        i += 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix_sum(self, i):
+        """returns the sum of values[0:i]."""
+        total = 0.0
+        i = min(i, len(self))
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def search(self, targets):
+        """returns, for each target, the smallest index i with prefix_sum(i + 1) >= target. Draws
+        for many targets are made at once, with one vectorized step per level of the tree."""
+        targets = np.array(targets, dtype=float)
+        positions = np.zeros(len(targets), dtype=int)
+        step = 1 << (len(self.tree) - 1).bit_length()
+        while step > 0:
+            next_positions = positions + step
+            in_tree = next_positions < len(self.tree)
+            below = np.zeros(len(targets), dtype=bool)
+            below[in_tree] = self.tree[next_positions[in_tree]] < targets[in_tree]
+            positions[below] = next_positions[below]
+            targets[below] -= self.tree[next_positions[below]]
+            step >>= 1
+        return positions
+
+class BinGrid(object):
+    """tracks which materials are in which bin of a grid over a k-dimensional property space.
+
+    Replaces separate bin count, bin membership and occupied bin structures with one object that
+    is updated incrementally as materials are added. Only occupied bins are stored, in dicts and
+    sets keyed by the bin's tuple of indices, so memory grows with the number of occupied bins
+    rather than with num_bins ** k. Materials are identified by their index in the order they were
+    added (i.e. their index into box_d and box_r). The members of each occupied bin are kept in an
+    int array that doubles in size when full, so that they can be returned without copying.
+
+    Attributes:
+        num_bins (int): number of bins along each property axis.
+        shape (tuple): number of bins along every axis.
+        counts (dict): number of materials in each occupied bin.
+        occupied (set): bins, as tuples, with at least one material.
+        frontier (set): occupied bins with at least one empty bin within frontier_radius. The
+            frontier is also kept in a list, so that random frontier bins can be drawn without
+            walking the frontier.
+        frontier_radius (int): radius, in bins, of the neighborhood used for the frontier.
+
+    For the density-bin selector, occupied bins are also grouped by their count, with Fenwick
+    trees over the number of bins with each count and over their total weight, 1 / count. Adding
+    a material moves its bin to the next group in O(log max count), and parent bins are drawn
+    with random_density_bins without walking the bins.
+    """
+
+    def __init__(self, num_bins, num_dims=2, frontier_radius=1):
+        self.num_bins = num_bins
+        self.shape = (num_bins,) * num_dims
+        self.frontier_radius = frontier_radius
+        self.counts = {}
+        self._frontier_list = []
+        self._frontier_index = {}
+        self._material_bins = np.zeros((16, num_dims), dtype=int)
+        self._num_materials = 0
+        self._members = {}
+        # bins grouped by count: _count_groups[c] lists the bins with count c + 1
+        self._count_groups = []
+        self._count_group_index = {}
+        self._count_group_sizes = FenwickTree()
+        self._count_group_weights = FenwickTree()
+
+    @classmethod
+    def from_material_bins(cls, num_bins, material_bins, **kwargs):
+        """returns a new BinGrid with materials in the bins in material_bins, an (n, num_dims)
+        array."""
+        material_bins = np.asarray(material_bins, dtype=int).reshape(len(material_bins), -1)
+        grid = cls(num_bins, num_dims=material_bins.shape[1], **kwargs)
+        grid.add(material_bins)
+        return grid
+
+    def __len__(self):
+        return self._num_materials
+
+    @property
+    def num_dims(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        """total number of bins, occupied or not."""
+        return self.num_bins ** self.num_dims
+
+    @property
+    def occupied(self):
+        return self.counts.keys()
+
+    @property
+    def frontier(self):
+        return self._frontier_index.keys()
+
+    @property
+    def material_bins(self):
+        """(n, num_dims) array of the bin of every material."""
+        return self._material_bins[:len(self)]
+
+    def dense_counts(self):
+        """returns the counts as a dense num_bins ** k array, i.e. for plotting."""
+        counts = np.zeros(self.shape, dtype=int)
+        for b, count in self.counts.items():
+            counts[b] = count
+        return counts
+
+    def add(self, bins):
+        """adds a material to each bin in bins, an (n, num_dims) array-like; the materials get the
+        next n indices. Returns the set of bins that were empty before."""
+        bins = np.asarray(bins, dtype=int).reshape(-1, self.num_dims)
+
+        end = self._num_materials + len(bins)
+        if end > len(self._material_bins):
+            new_material_bins = np.zeros((max(end, 2 * len(self._material_bins)), self.num_dims), dtype=int)
+            new_material_bins[:self._num_materials] = self.material_bins
+            self._material_bins = new_material_bins
+        self._material_bins[self._num_materials:end] = bins
+
+        # large batches (i.e. loading a restart) regroup all bins at once instead of moving each bin
+        # through the count groups one material at a time
+        regroup = len(bins) > len(self.counts)
+
+        new_bins = set()
+        for i, b in enumerate(map(tuple, bins.tolist()), self._num_materials):
+            if b not in self.counts:
+                self.counts[b] = 0
+                self._members[b] = np.empty(4, dtype=int)
+                new_bins.add(b)
+            count = self.counts[b]
+            if not regroup:
+                self._move_to_count_group(b, count, count + 1)
+            if count == len(self._members[b]):
+                self._members[b] = np.concatenate((self._members[b], np.empty(count, dtype=int)))
+            self._members[b][count] = i
+            self.counts[b] = count + 1
+        self._num_materials = end
+
+        if regroup:
+            self._group_by_count()
+
+        for b in new_bins:
+            self._update_frontier(b)
+        return new_bins
+
+    def _group_by_count(self):
+        self._count_groups = [[] for _ in range(max(self.counts.values(), default=0))]
+        self._count_group_index = {}
+        for b, count in self.counts.items():
+            self._count_group_index[b] = len(self._count_groups[count - 1])
+            self._count_groups[count - 1].append(b)
+        sizes = np.array([len(group) for group in self._count_groups], dtype=float)
+        self._count_group_sizes = FenwickTree.from_values(sizes)
+        self._count_group_weights = FenwickTree.from_values(sizes / np.arange(1, len(sizes) + 1))
+
+    def _move_to_count_group(self, b, old_count, new_count):
+        if old_count > 0:
+            # swap the last bin in the group into b's place
+            group = self._count_groups[old_count - 1]
+            i = self._count_group_index.pop(b)
+            last = group.pop()
+            if last != b:
+                group[i] = last
+                self._count_group_index[last] = i
+            self._count_group_sizes.add(old_count - 1, -1)
+            self._count_group_weights.add(old_count - 1, -1 / old_count)
+
+        while len(self._count_groups) < new_count:
+            self._count_groups.append([])
+        self._count_group_index[b] = len(self._count_groups[new_count - 1])
+        self._count_groups[new_count - 1].append(b)
+        self._count_group_sizes.add(new_count - 1, 1)
+        self._count_group_weights.add(new_count - 1, 1 / new_count)
+
+    def random_density_bins(self, num_bins):
+        """returns num_bins occupied bins drawn with replacement, weighted by 1 / count.
+
+        Only the least populated bins are eligible: those with a count no higher than the count
+        of the num_bins-th least populated bin.
+        """
+        sizes = self._count_group_sizes
+        if len(self.counts) <= num_bins:
+            max_count = len(self._count_groups)
+        else:
+            max_count = sizes.search([num_bins])[0] + 1
+
+        total_weight = self._count_group_weights.prefix_sum(max_count)
+        targets = (1 - np.random.random(num_bins)) * total_weight
+        counts = np.minimum(self._count_group_weights.search(targets), max_count - 1) + 1
+
+        # rounding residue in the weights can leave a little weight on groups that were emptied;
+        # draws that land on an empty group go to the nearest non-empty group below it instead
+        group_sizes = sizes.values[:max_count]
+        if (group_sizes[counts - 1] == 0).any():
+            non_empty = np.flatnonzero(group_sizes > 0) + 1
+            counts = non_empty[np.maximum(np.searchsorted(non_empty, counts, side="right") - 1, 0)]
+        groups = [self._count_groups[c - 1] for c in counts.tolist()]
+        return [group[i] for group, i in zip(groups, np.random.randint(0, [len(g) for g in groups]))]
+
+    def neighbors(self, b, r=None):
+        """returns the bins, inside the grid, within r (default: frontier_radius) of bin b."""
+        r = self.frontier_radius if r is None else r
+        ranges = [range(max(c - r, 0), min(c + r, n - 1) + 1) for c, n in zip(b, self.shape)]
+        return [n for n in product(*ranges) if n != b]
+
+    def has_empty_neighbor(self, b, r=None):
+        """returns True if any bin within r (default: frontier_radius) of bin b is empty."""
+        return any(n not in self.counts for n in self.neighbors(b, r))
+
+    def _update_frontier(self, b):
+        """updates the frontier for bin b having just become occupied: b may be on the frontier, and
+        occupied neighbors of b may have lost their last empty neighbor."""
+        if self.has_empty_neighbor(b):
+            self._frontier_index[b] = len(self._frontier_list)
+            self._frontier_list.append(b)
+        for n in self.neighbors(b):
+            if n in self._frontier_index and not self.has_empty_neighbor(n):
+                # swap the last frontier bin into n's place
+                i = self._frontier_index.pop(n)
+                last = self._frontier_list.pop()
+                if last != n:
+                    self._frontier_list[i] = last
+                    self._frontier_index[last] = i
+
+    def random_frontier_bins(self, num_bins):
+        """returns num_bins bins drawn uniformly, with replacement, from the frontier."""
+        return [self._frontier_list[i] for i in np.random.randint(0, len(self._frontier_list), num_bins)]
+
+    def frontier_bins(self, r=None):
+        """returns the occupied bins with an empty bin within r, sorted. If r is the frontier_radius,
+        this is the maintained frontier; otherwise it is found by dilating the grid's empty bins by
+        r, which needs a dense num_bins ** k array."""
+        if r is None or r == self.frontier_radius:
+            return sorted(self.frontier)
+        occupied = self.dense_counts() > 0
+        near_empty = binary_dilation(~occupied, structure=np.ones((3,) * self.num_dims, dtype=bool),
+                                     iterations=r)
+        return sorted(tuple(b) for b in np.argwhere(occupied & near_empty).tolist())
+
+    def materials_in(self, b):
+        """returns the indices of the materials in bin b, as a read-only view."""
+        if b not in self.counts:
+            return np.empty(0, dtype=int)
+        members = self._members[b][:self.counts[b]]
+        members.flags.writeable = False
+        return members
+
+    def random_members(self, bins):
+        """returns the index of a randomly chosen material from each of the bins, which must be
+        occupied."""
+        bins = [tuple(b) for b in bins]
+        choices = np.random.randint(0, [self.counts[b] for b in bins])
+        return np.array([self._members[b][i] for b, i in zip(bins, choices.tolist())], dtype=int)
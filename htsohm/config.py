@@ -10,6 +10,17 @@ def default_configuration():
         'void_fraction_subtype': 'raspa',
         'load_restart_path': False,
         'num_processes': 1,
+        'simulation_chunk_size': 1,
+        'evolution_mode': 'generational',
+        'neighbor_bin_radius': 1,
+        'atom_site_storage': 'rows',
+        'simulation_order': 'config',
+        'screening': False,
+        'screening_exploration_fraction': 0.1,
+        'screening_max_bin_count': 3,
+        'screening_neighbors': 5,
+        'screening_min_materials': 50,
+        'screening_max_attempts': 10,
         'initial_points_random_seed': int(time.time())
     }
 
@@ -26,11 +37,46 @@ def load_config_file(path):
     with open(path) as config_file:
          config.update(yaml.load(config_file))
 
+    set_properties(config)
     enforce_config_ok(config)
 
     return config
 
+def set_properties(config):
+    """Sets the properties that span the explored property space.
+
+    The properties can be set as a list of {name, range} dicts under 'properties', e.g. to add
+    surface area as a third property. Otherwise they default to void fraction and gas loading over
+    prop1range and prop2range. prop1range and prop2range default to the ranges of the first two
+    properties, for the output and analysis tools that only handle two properties.
+    """
+    if 'properties' in config:
+        for i, prop in enumerate(config['properties'][:2]):
+            config.setdefault('prop%drange' % (i + 1), prop['range'])
+    elif 'prop1range' in config and 'prop2range' in config:
+        config['properties'] = [{'name': 'void_fraction', 'range': config['prop1range']},
+                                {'name': 'gas_loading', 'range': config['prop2range']}]
+
 def enforce_config_ok(config):
+    from htsohm.simulation.backends import available_backends
+
     assert config['void_fraction_subtype'] in ["raspa", "geo", "zeo"]
     assert config['selector_type'] in ["simplices-or-hull", "density-bin", "neighbor-bin",
                                         "best", "specific", "random"]
+    assert config['evolution_mode'] in ["generational", "steady-state"]
+    assert config['atom_site_storage'] in ["rows", "packed"]
+    assert config['simulation_order'] in ["cost", "config"]
+    for simulation_config in config.get('simulations', {}).values():
+        assert (simulation_config['type'], simulation_config.get('backend', 'raspa')) in available_backends()
+    if config['selector_type'] == "simplices-or-hull":
+        assert len(config.get('properties', [])) <= 2
+    for prop in config.get('properties', []):
+        assert prop['name'] in ["void_fraction", "gas_loading", "surface_area", "number_density",
+                                "site_distribution"]
+    if config['screening']:
+        # the screening model is trained from the material csv columns, which have no surface area
+        # or zeo++ void fraction
+        assert config['void_fraction_subtype'] in ["raspa", "geo"]
+        assert all(prop['name'] != "surface_area" for prop in config.get('properties', []))
+        assert 0.0 <= config['screening_exploration_fraction'] <= 1.0
+        assert config['screening_max_attempts'] >= 1
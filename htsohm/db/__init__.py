@@ -42,8 +42,11 @@ def init_database(connection_string, backup=False):
     __engine__ = create_engine(connection_string)
     __session__ = sessionmaker(bind=__engine__)()
 
-    # Create tables in the engine, if they don't exist already.
+    # Create tables in the engine, if they don't exist already, and add the columns that databases
+    # created by older versions don't have yet.
     Base.metadata.create_all(__engine__)
+    for column in add_missing_columns(__engine__):
+        print("added column %s to the database" % column)
     Base.metadata.bind = __engine__
 
     return __engine__, __session__
@@ -66,3 +69,32 @@ def delete_extra_materials(delete_after_id):
     __engine__.execute("delete from structures where material_id > %d" % delete_after_id)
     __engine__.execute("delete from atom_types where structure_id > %d" % delete_after_id)
     __engine__.execute("delete from atom_sites where structure_id > %d" % delete_after_id)
+
+def delete_materials(material_ids, chunk_size=500):
+    """deletes the materials with the given ids, along with their simulation results and structures."""
+    material_ids = list(material_ids)
+    for i in range(0, len(material_ids), chunk_size):
+        ids = ",".join(str(int(material_id)) for material_id in material_ids[i:i + chunk_size])
+        structure_ids = "select id from structures where material_id in (%s)" % ids
+        __engine__.execute("delete from atom_sites where structure_id in (%s)" % structure_ids)
+        __engine__.execute("delete from atom_types where structure_id in (%s)" % structure_ids)
+        __engine__.execute("delete from structures where material_id in (%s)" % ids)
+        __engine__.execute("delete from gas_loadings where material_id in (%s)" % ids)
+        __engine__.execute("delete from surface_areas where material_id in (%s)" % ids)
+        __engine__.execute("delete from void_fractions where material_id in (%s)" % ids)
+        __engine__.execute("delete from materials where id in (%s)" % ids)
+
+def add_missing_columns(engine):
+    """adds any column of the models that is missing from the database's tables, e.g. columns added
+    since the database was created. Returns a list of the "table.column" names that were added."""
+    from sqlalchemy import inspect
+    inspector = inspect(engine)
+    added = []
+    for table in Base.metadata.sorted_tables:
+        existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing_columns:
+                column_type = column.type.compile(dialect=engine.dialect)
+                engine.execute('alter table %s add column %s %s' % (table.name, column.name, column_type))
+                added.append("%s.%s" % (table.name, column.name))
+    return added
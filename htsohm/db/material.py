@@ -18,6 +18,7 @@ class Material(Base):
 
     # structure properties
     number_density       = Column(Float)
+    site_distribution    = Column(Float)
 
     # relationships
     parent            = relationship("Material", remote_side=[id])
@@ -79,6 +80,25 @@ class Material(Base):
 
         return Material(structure=structure)
 
+    def get_property(self, name):
+        """returns the value of a property that spans the explored property space, by name.
+
+        Args:
+            name (str): one of "void_fraction", "gas_loading", "surface_area", "number_density" or
+                "site_distribution".
+        """
+        if name == "void_fraction":
+            return self.void_fraction[0].get_void_fraction()
+        elif name == "gas_loading":
+            return self.gas_loading[0].absolute_volumetric_loading
+        elif name == "surface_area":
+            return self.surface_area[0].volumetric_surface_area
+        elif name == "number_density":
+            return self.structure.number_density
+        elif name == "site_distribution":
+            return self.site_distribution
+        raise ValueError("unknown property: %s" % name)
+
     def clone(self):
         copy = super(Material, self).clone()
         copy.parent = self
@@ -1,12 +1,13 @@
 import math
 
-from sqlalchemy import Column, ForeignKey, Integer, String, Float
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, ForeignKey, Integer, String, Float, LargeBinary, inspect
+from sqlalchemy.orm import relationship, object_session
 
 from htsohm.db import Base
 from htsohm.db.atom_sites import AtomSite
 from htsohm.db.atom_types import AtomTypes
 from htsohm.max_pair_distance import max_pair_distance
+from htsohm.structure_arrays import StructureArrays, unpack_sites
 
 class Structure(Base):
     __tablename__ = "structures"
@@ -18,8 +19,11 @@ class Structure(Base):
     b = Column(Float)
     c = Column(Float)
 
-    atom_sites = relationship("AtomSite", backref="structure")
-    atom_types = relationship("AtomTypes", backref="structure")
+    # atom sites stored as PACKED_SITE_DTYPE records instead of AtomSite rows; see pack_sites.
+    packed_sites = Column(LargeBinary)
+
+    atom_site_rows = relationship("AtomSite", backref="structure")
+    atom_types = relationship("AtomTypes", backref="structure", order_by="AtomTypes.id")
 
     def exclude_cols(self):
         return ['id']
@@ -33,17 +37,71 @@ class Structure(Base):
         self.atom_types = atom_types
 
     def clone(self):
-        copy = super(Structure, self).clone()
-        if self.atom_types:
-            for lj in self.atom_types:
-                copy.atom_types.append(lj.clone())
+        return StructureArrays.from_structure(self).to_structure()
 
-        if self.atom_sites:
-            for atom_site in self.atom_sites:
-                atom_types = copy.atom_types[atom_site.atom_types.atom_type_index()]
-                copy.atom_sites.append(atom_site.clone(atom_types))
+    @property
+    def atom_sites(self):
+        """the structure's AtomSite rows.
+
+        If the sites are packed, the AtomSites are decoded from packed_sites on first access. They
+        aren't attached to the session, so changes to them are not saved; assign a list of sites to
+        atom_sites to store them as rows again.
+        """
+        if self.packed_sites is None:
+            return self.atom_site_rows
+        if getattr(self, "_unpacked_sites", None) is None:
+            self._unpacked_sites = [AtomSite(structure_id=self.id, atom_types=self.atom_types[t], x=x, y=y, z=z, q=q)
+                                    for x, y, z, q, t in unpack_sites(self.packed_sites).tolist()]
+        return self._unpacked_sites
+
+    @atom_sites.setter
+    def atom_sites(self, atom_sites):
+        self.packed_sites = None
+        self._unpacked_sites = None
+        self.atom_site_rows = atom_sites
+        self.reset_arrays()
+
+    def pack_sites(self):
+        """stores the atom sites in packed_sites instead of as AtomSite rows. Rows that were already
+        added to a session are removed from it (or deleted, if they were committed)."""
+        if self.packed_sites is not None:
+            return
+        if len(self.atom_types) > 0 and all(at.id is not None for at in self.atom_types):
+            # atom types are loaded in id order, which isn't always the order they were created in,
+            # and packed sites refer to atom types by their position
+            self.atom_types.sort(key=lambda at: at.id)
+            self.reset_arrays()
+        packed_sites = self.arrays.packed_sites()
+        for site in list(self.atom_site_rows):
+            session = object_session(site)
+            if session is not None and inspect(site).persistent:
+                session.delete(site)
+            elif session is not None:
+                session.expunge(site)
+        self.atom_site_rows = []
+        self.packed_sites = packed_sites
+        self._unpacked_sites = None
+
+    def unpack_sites(self):
+        """stores the atom sites as AtomSite rows again; the reverse of pack_sites."""
+        if self.packed_sites is not None:
+            self.atom_sites = self.atom_sites
 
-        return copy
+    @property
+    def arrays(self):
+        """StructureArrays view of this structure. It is built on first access and then reused, so
+        call `reset_arrays` if the structure's rows are modified afterwards."""
+        if getattr(self, "_arrays", None) is None:
+            if self.packed_sites is None:
+                self._arrays = StructureArrays.from_structure(self)
+            else:
+                self._arrays = StructureArrays.from_packed_sites((self.a, self.b, self.c), self.packed_sites,
+                                                                 [at.sigma for at in self.atom_types],
+                                                                 [at.epsilon for at in self.atom_types])
+        return self._arrays
+
+    def reset_arrays(self):
+        self._arrays = None
 
     def minimum_unit_cells(self, cutoff):
         return (math.ceil(2 * cutoff / self.a),
@@ -56,7 +114,7 @@ class Structure(Base):
 
     @property
     def site_distribution(self):
-        return max_pair_distance([(a.x, a.y, a.z) for a in self.atom_sites])
+        return max_pair_distance(self.arrays.frac)
 
     @property
     def number_density(self):
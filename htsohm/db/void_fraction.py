@@ -25,6 +25,7 @@ class VoidFraction(Base):
     # simulation output
     void_fraction = Column(Float) # raspa
     void_fraction_geo = Column(Float)
+    void_fraction_geo_error = Column(Float) # monte_carlo and octree geo methods only
     void_fraction_zeo = Column(Float)
 
     def get_void_fraction(self):
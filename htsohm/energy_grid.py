@@ -0,0 +1,130 @@
+from collections import OrderedDict
+from hashlib import sha1
+from itertools import product
+import os
+import uuid
+
+import numpy as np
+
+from htsohm.widom import lj_energies, lorentz_berthelot, supercell_atoms
+
+# energies are capped so that grid points inside atoms can be interpolated
+MAX_ENERGY = 1e7
+
+# recently used energy grids, keyed by structure hash; each worker process has its own cache
+__energy_grid_cache__ = OrderedDict()
+
+class EnergyGrid(object):
+    """Lennard-Jones energies of a probe, tabulated on a regular grid over an orthorhombic unit
+    cell.
+
+    Attributes:
+        lattice (np.ndarray): lattice constants (a, b, c) of the unit cell.
+        energies (np.ndarray): (nx, ny, nz) energies in K at the fractional coordinates
+            (i / nx, j / ny, k / nz); may be a read-only memory map of a cached .npy file.
+    """
+
+    def __init__(self, lattice, energies):
+        self.lattice = np.array(lattice, dtype=float)
+        self.energies = energies
+
+    @property
+    def shape(self):
+        return self.energies.shape
+
+    def interpolate(self, points, temperature=None):
+        """returns the energies at the cartesian points, trilinearly interpolated between the
+        grid points. Points outside the unit cell are wrapped into it.
+
+        The repulsive walls around atoms are too steep to interpolate linearly: interpolated
+        energies are too high near them unless the grid is very fine. If temperature is set, the
+        Boltzmann factors exp(-U / kT) are interpolated instead, which are bounded and smooth, and
+        the energies are calculated back from them.
+        """
+        f = (np.asarray(points, dtype=float).reshape(-1, 3) / self.lattice) % 1.0 * self.shape
+        i0 = np.floor(f).astype(int)
+        t = f - i0
+        i0 %= self.shape
+        i1 = (i0 + 1) % self.shape
+
+        values = np.zeros(len(f))
+        for corner in product((0, 1), repeat=3):
+            index = tuple(np.where(c, i1[:, d], i0[:, d]) for d, c in enumerate(corner))
+            weights = np.prod([t[:, d] if c else 1 - t[:, d] for d, c in enumerate(corner)], axis=0)
+            corner_energies = self.energies[index]
+            if temperature is not None:
+                values += weights * np.exp(-corner_energies / temperature)
+            else:
+                values += weights * corner_energies
+
+        if temperature is None:
+            return values
+        with np.errstate(divide="ignore"):
+            return -temperature * np.log(values)
+
+def structure_hash(structure_arrays, probe_sigma, probe_epsilon, cutoff, spacing):
+    """returns a hex digest that identifies the energy grid of a structure for a probe."""
+    sa = structure_arrays
+    h = sha1()
+    for a in (sa.lattice, sa.frac, sa.type_index.astype("<i8"), sa.sigma, sa.epsilon,
+              np.array([probe_sigma, probe_epsilon, cutoff, spacing])):
+        h.update(np.ascontiguousarray(a, dtype=a.dtype.newbyteorder("<")).tobytes())
+    return h.hexdigest()
+
+def calculate_energy_grid(structure_arrays, probe_sigma, probe_epsilon, cutoff, spacing):
+    """tabulates the Lennard-Jones energy of a probe in a structure.
+
+    Args:
+        structure_arrays (StructureArrays): the structure.
+        probe_sigma (float): sigma of the probe, in Angstrom.
+        probe_epsilon (float): epsilon of the probe, in K.
+        cutoff (float): Lennard-Jones cutoff, in Angstrom.
+        spacing (float): maximum distance between grid points along each axis, in Angstrom.
+
+    Returns:
+        EnergyGrid, with energies capped at MAX_ENERGY.
+    """
+    from htsohm.db import Structure
+    sa = structure_arrays
+    unit_cells = Structure(*sa.lattice).minimum_unit_cells(cutoff)
+    atoms, atom_index, box = supercell_atoms(sa.frac, sa.lattice, unit_cells)
+    sigma, epsilon = lorentz_berthelot(sa.site_sigma, sa.site_epsilon, probe_sigma, probe_epsilon)
+
+    shape = tuple(int(np.ceil(l / spacing)) for l in sa.lattice)
+    frac = np.stack(np.meshgrid(*[np.arange(n) / n for n in shape], indexing="ij"), axis=-1).reshape(-1, 3)
+    energies = lj_energies(frac * sa.lattice, atoms, box, sigma[atom_index], epsilon[atom_index], cutoff)
+    return EnergyGrid(sa.lattice, np.minimum(energies, MAX_ENERGY).reshape(shape))
+
+def load_energy_grid(structure_arrays, probe_sigma, probe_epsilon, cutoff, spacing, cache_dir=None,
+                     max_cached=4):
+    """returns the energy grid of a structure for a probe, calculating it only if it isn't cached.
+
+    The max_cached most recently used grids are kept in memory. If cache_dir is set, grids are also
+    saved there as <structure hash>.npy files, and loaded from there as read-only memory maps, so
+    that they are shared by all workers and later runs.
+    """
+    key = structure_hash(structure_arrays, probe_sigma, probe_epsilon, cutoff, spacing)
+    if key in __energy_grid_cache__:
+        __energy_grid_cache__.move_to_end(key)
+        return __energy_grid_cache__[key]
+
+    grid = None
+    if cache_dir is not None:
+        path = os.path.join(cache_dir, "%s.npy" % key)
+        if os.path.exists(path):
+            grid = EnergyGrid(structure_arrays.lattice, np.load(path, mmap_mode="r"))
+
+    if grid is None:
+        grid = calculate_energy_grid(structure_arrays, probe_sigma, probe_epsilon, cutoff, spacing)
+        if cache_dir is not None:
+            # write to a temporary file first, so other workers never load a partial grid
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = os.path.join(cache_dir, "%s.%s.tmp.npy" % (key, uuid.uuid4()))
+            np.save(tmp_path, grid.energies)
+            os.replace(tmp_path, path)
+            grid = EnergyGrid(structure_arrays.lattice, np.load(path, mmap_mode="r"))
+
+    __energy_grid_cache__[key] = grid
+    while len(__energy_grid_cache__) > max_cached:
+        __energy_grid_cache__.popitem(last=False)
+    return grid
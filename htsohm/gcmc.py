@@ -0,0 +1,265 @@
+from itertools import product
+import math
+
+import numpy as np
+
+BOLTZMANN_CONSTANT = 1.380649e-23 # J / K
+GAS_CONSTANT = 8.314462618 # J / (mol K)
+AVOGADRO_CONSTANT = 6.02214076e23
+
+def peng_robinson_fugacity_coefficient(temperature, pressure, critical_temperature, critical_pressure,
+                                       acentric_factor):
+    """returns the fugacity coefficient of a gas with the Peng-Robinson equation of state.
+
+    If the cubic equation has more than one real root, the one with the lowest fugacity, which is
+    the stable phase, is used.
+
+    Args:
+        temperature (float): temperature, in K.
+        pressure (float): pressure, in Pa.
+        critical_temperature (float): critical temperature, in K.
+        critical_pressure (float): critical pressure, in Pa.
+        acentric_factor (float): acentric factor.
+    """
+    kappa = 0.37464 + 1.54226 * acentric_factor - 0.26992 * acentric_factor ** 2
+    alpha = (1 + kappa * (1 - math.sqrt(temperature / critical_temperature))) ** 2
+    a = 0.45724 * GAS_CONSTANT ** 2 * critical_temperature ** 2 / critical_pressure * alpha
+    b = 0.07780 * GAS_CONSTANT * critical_temperature / critical_pressure
+    A = a * pressure / (GAS_CONSTANT * temperature) ** 2
+    B = b * pressure / (GAS_CONSTANT * temperature)
+
+    roots = np.roots([1, B - 1, A - 3 * B ** 2 - 2 * B, B ** 3 + B ** 2 - A * B])
+    ln_phi = [z - 1 - math.log(z - B) - A / (2 * math.sqrt(2) * B) *
+              math.log((z + (1 + math.sqrt(2)) * B) / (z + (1 - math.sqrt(2)) * B))
+              for z in roots.real[(abs(roots.imag) < 1e-10) & (roots.real > B)]]
+    return math.exp(min(ln_phi))
+
+def molecules_to_volumetric_loading(volume):
+    """returns the factor that converts molecules per unit cell to cm^3 (STP) / cm^3, for a unit
+    cell with the given volume in cubic Angstrom."""
+    stp_molar_volume = GAS_CONSTANT * 273.15 / 101325 * 1e6 # cm^3 / mol
+    return stp_molar_volume / AVOGADRO_CONSTANT / (volume * 1e-24)
+
+class CellList(object):
+    """positions of molecules in an orthorhombic periodic box, binned into cells that are at least
+    as wide as the cutoff, so that the molecules within the cutoff of a point are all in the
+    point's cell or the cells next to it.
+
+    Molecules are numbered 0 to len - 1; removing a molecule renumbers the last one.
+    """
+
+    def __init__(self, box, cutoff):
+        self.box = np.array(box, dtype=float)
+        self.num_cells = tuple(max(1, int(l // cutoff)) for l in self.box)
+        self.positions = np.empty((16, 3))
+        self.cell_of = []
+        self.cells = [[] for _ in range(np.prod(self.num_cells))]
+
+        # a set, because with fewer than three cells along an axis the neighbors wrap around to the
+        # same cells
+        self.neighbor_cells = []
+        for cell in product(*[range(n) for n in self.num_cells]):
+            self.neighbor_cells.append(sorted({self._flat_index([(c + o) % n for c, o, n in
+                                                                 zip(cell, offset, self.num_cells)])
+                                               for offset in product((-1, 0, 1), repeat=3)}))
+
+    def _flat_index(self, cell):
+        return (cell[0] * self.num_cells[1] + cell[1]) * self.num_cells[2] + cell[2]
+
+    def cell(self, position):
+        """returns the index of the cell containing the position."""
+        return self._flat_index([int(p / l * n) % n for p, l, n in zip(position, self.box, self.num_cells)])
+
+    def __len__(self):
+        return len(self.cell_of)
+
+    def add(self, position):
+        """adds a molecule and returns its index."""
+        index = len(self)
+        if index == len(self.positions):
+            self.positions = np.concatenate([self.positions, np.empty_like(self.positions)])
+        self.positions[index] = position
+        self.cell_of.append(self.cell(position))
+        self.cells[self.cell_of[index]].append(index)
+        return index
+
+    def remove(self, index):
+        """removes a molecule; the last molecule takes its index."""
+        last = len(self) - 1
+        self.cells[self.cell_of[index]].remove(index)
+        if index != last:
+            cell = self.cells[self.cell_of[last]]
+            cell[cell.index(last)] = index
+            self.positions[index] = self.positions[last]
+            self.cell_of[index] = self.cell_of[last]
+        self.cell_of.pop()
+
+    def move(self, index, position):
+        self.positions[index] = position
+        cell = self.cell(position)
+        if cell != self.cell_of[index]:
+            self.cells[self.cell_of[index]].remove(index)
+            self.cells[cell].append(index)
+            self.cell_of[index] = cell
+
+    def neighbors(self, position, exclude=None):
+        """returns the (n, 3) positions of the molecules in the cells around the position, except
+        the molecule with index exclude."""
+        indices = [i for c in self.neighbor_cells[self.cell(position)] for i in self.cells[c] if i != exclude]
+        return self.positions[indices]
+
+class GCMC(object):
+    """grand canonical Monte Carlo simulation of a single-site Lennard-Jones adsorbate in a rigid
+    framework.
+
+    Framework-adsorbate energies are interpolated from an energy grid of the adsorbate (see
+    `htsohm.energy_grid`), and adsorbate-adsorbate energies are summed over the molecules in the
+    neighboring cells of a cell list; both are cut and shifted at the cutoff. Like RASPA, every
+    cycle has max(20, N) moves, where N is the number of molecules, and each move is a translation,
+    reinsertion or swap (insertion or deletion) with equal probability.
+
+    Attributes:
+        molecules (CellList): positions of the adsorbed molecules in the supercell.
+        max_displacement (float): largest translation along each axis, in Angstrom; adjusted during
+            equilibration to accept about half of the translations.
+    """
+
+    def __init__(self, energy_grid, unit_cells, sigma, epsilon, temperature, fugacity, cutoff, rng=None):
+        """
+        Args:
+            energy_grid (EnergyGrid): framework energies of the adsorbate in the unit cell.
+            unit_cells (tuple): number of unit cells along each axis of the supercell.
+            sigma (float): sigma of the adsorbate, in Angstrom.
+            epsilon (float): epsilon of the adsorbate, in K.
+            temperature (float): temperature, in K.
+            fugacity (float): fugacity of the adsorbate, in Pa.
+            cutoff (float): Lennard-Jones cutoff, in Angstrom.
+            rng (np.random.Generator): random number generator. Default: None (unseeded).
+        """
+        self.lattice = energy_grid.lattice
+        self.box = self.lattice * unit_cells
+        self.sigma = sigma
+        self.epsilon = epsilon
+        self.temperature = temperature
+        self.cutoff = cutoff
+        self.rng = np.random.default_rng(rng)
+        self.molecules = CellList(self.box, cutoff)
+        self.max_displacement = 1.0
+        self.translations = [0, 0]
+        self.sigma6 = sigma ** 6
+        self.shift = 4 * epsilon * (self.sigma6 ** 2 / cutoff ** 12 - self.sigma6 / cutoff ** 6)
+
+        # the framework energies are interpolated as Boltzmann factors; see EnergyGrid.interpolate
+        self.boltzmann_factors = np.exp(-np.asarray(energy_grid.energies) / temperature)
+        # fugacity * volume / kT, the mean number of molecules in the supercell if it were empty
+        self.zeta = fugacity * np.prod(self.box) * 1e-30 / (BOLTZMANN_CONSTANT * temperature)
+
+    def framework_energy(self, position):
+        nx, ny, nz = self.boltzmann_factors.shape
+        x, y, z = [p / l % 1.0 * n for p, l, n in zip(position.tolist(), self.lattice.tolist(), (nx, ny, nz))]
+        i, j, k = int(x), int(y), int(z)
+        tx, ty, tz = x - i, y - j, z - k
+        i1, j1, k1 = (i + 1) % nx, (j + 1) % ny, (k + 1) % nz
+        i, j, k = i % nx, j % ny, k % nz
+
+        bf = self.boltzmann_factors
+        value = ((1 - tx) * ((1 - ty) * ((1 - tz) * bf[i, j, k] + tz * bf[i, j, k1]) +
+                             ty * ((1 - tz) * bf[i, j1, k] + tz * bf[i, j1, k1])) +
+                 tx * ((1 - ty) * ((1 - tz) * bf[i1, j, k] + tz * bf[i1, j, k1]) +
+                       ty * ((1 - tz) * bf[i1, j1, k] + tz * bf[i1, j1, k1])))
+        return -self.temperature * math.log(value) if value > 0 else math.inf
+
+    def adsorbate_energy(self, position, exclude=None):
+        # the same potential as `htsohm.widom.lj_energies`, for a single point; this is called for
+        # every move, and lj_energies' overhead would dominate for a few neighbors
+        d = self.molecules.neighbors(position, exclude) - position
+        d -= self.box * np.round(d / self.box)
+        r2 = np.einsum("ij,ij->i", d, d)
+        r2 = r2[r2 < self.cutoff ** 2]
+        if len(r2) == 0:
+            return 0.0
+        elif r2.min() == 0.0:
+            return math.inf
+        r6 = self.sigma6 / r2 ** 3
+        return float(4 * self.epsilon * (r6 * (r6 - 1)).sum()) - len(r2) * self.shift
+
+    def energy(self, position, exclude=None):
+        """returns the energy, in K, of a molecule at the position with the framework and with all
+        molecules but the one with index exclude."""
+        energy = self.framework_energy(position)
+        if energy == math.inf:
+            return energy
+        return energy + self.adsorbate_energy(position, exclude)
+
+    def accept(self, log_probability):
+        return log_probability >= 0 or math.log(1.0 - self.rng.random()) < log_probability
+
+    def translate(self):
+        n = len(self.molecules)
+        if n == 0:
+            return
+        index = int(self.rng.random() * n)
+        position = self.molecules.positions[index].copy()
+        new_position = (position + (self.rng.random(3) - 0.5) * 2 * self.max_displacement) % self.box
+        self.translations[0] += 1
+        delta = self.energy(new_position, index) - self.energy(position, index)
+        if self.accept(-delta / self.temperature):
+            self.molecules.move(index, new_position)
+            self.translations[1] += 1
+
+    def reinsert(self):
+        n = len(self.molecules)
+        if n == 0:
+            return
+        index = int(self.rng.random() * n)
+        position = self.molecules.positions[index].copy()
+        new_position = self.rng.random(3) * self.box
+        delta = self.energy(new_position, index) - self.energy(position, index)
+        if self.accept(-delta / self.temperature):
+            self.molecules.move(index, new_position)
+
+    def insert(self):
+        position = self.rng.random(3) * self.box
+        energy = self.energy(position)
+        if self.accept(math.log(self.zeta / (len(self.molecules) + 1)) - energy / self.temperature):
+            self.molecules.add(position)
+
+    def delete(self):
+        n = len(self.molecules)
+        if n == 0:
+            return
+        index = int(self.rng.random() * n)
+        energy = self.energy(self.molecules.positions[index], index)
+        if self.accept(math.log(n / self.zeta) + energy / self.temperature):
+            self.molecules.remove(index)
+
+    def cycle(self):
+        for _ in range(max(20, len(self.molecules))):
+            move = self.rng.random() * 3
+            if move < 1:
+                self.translate()
+            elif move < 2:
+                self.reinsert()
+            elif move < 2.5:
+                self.insert()
+            else:
+                self.delete()
+
+    def adjust_max_displacement(self):
+        attempts, accepted = self.translations
+        if attempts > 0:
+            self.max_displacement *= 1.05 if accepted / attempts > 0.5 else 0.95
+            self.max_displacement = min(max(self.max_displacement, 0.05), self.box.min() / 2)
+        self.translations = [0, 0]
+
+    def run(self, num_cycles, num_blocks=5, equilibrate=False):
+        """runs num_cycles cycles and returns the average number of molecules in the supercell in
+        each of num_blocks blocks of cycles. If equilibrate is set, the maximum displacement is
+        adjusted after every cycle."""
+        samples = np.empty(num_cycles)
+        for i in range(num_cycles):
+            self.cycle()
+            samples[i] = len(self.molecules)
+            if equilibrate:
+                self.adjust_max_displacement()
+        return [float(block.mean()) for block in np.array_split(samples, num_blocks)]
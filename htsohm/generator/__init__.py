@@ -1,2 +1,3 @@
 import htsohm.generator.random
 import htsohm.generator.mutate
+import htsohm.generator.mutate_arrays
@@ -0,0 +1,115 @@
+import numpy as np
+
+from htsohm.db import Material
+from htsohm.slog import slog
+
+def random_positions(x0, x1, mutation_strength):
+    """vectorized `htsohm.generator.mutate.random_position`: moves every coordinate in x0 towards
+    the corresponding coordinate in x1 by mutation_strength times the minimum-image distance
+    between them."""
+    x0 = np.asarray(x0, dtype=float)
+    x1 = np.asarray(x1, dtype=float)
+    diff = x0 - x1
+    dx = np.minimum(np.abs(diff), 1 - np.abs(diff))
+    return np.select(
+        [(x0 > x1) & (diff > 0.5), (x0 >= x1) & (diff <= 0.5), (x0 < x1) & (-diff >= 0.5)],
+        [(x0 + mutation_strength * dx) % 1., x0 - mutation_strength * dx, (x0 - mutation_strength * dx) % 1.],
+        default=x0 + mutation_strength * dx)
+
+def perturb_unweighted(curr_val, max_change, var_limits, rng):
+    """vectorized `htsohm.generator.mutate.perturb_unweighted`."""
+    curr_val = np.asarray(curr_val, dtype=float)
+    new_val = curr_val + rng.uniform(-max_change, max_change, curr_val.shape) / 2
+    return np.clip(new_val, var_limits[0], var_limits[1])
+
+def mutate_arrays(parent, config, rng, perturb):
+    """returns a mutated copy of the StructureArrays `parent`.
+
+    Applies each perturbation in `perturb` (a set of "num_atoms", "atom_type_assignments",
+    "atom_types", "lattice" and "atom_sites") the same way as
+    `htsohm.generator.mutate.mutate_material`, but with every random draw for a perturbation made
+    as a single numpy call on the numpy Generator `rng`.
+    """
+    cs = parent.copy()
+    ms = config["mutation_strength"]
+
+    num_atom_types_to_add = config["number_of_atom_types"] - len(cs.sigma)
+    if num_atom_types_to_add > 0:
+        cs.sigma = np.append(cs.sigma, rng.uniform(*config["sigma_limits"], num_atom_types_to_add))
+        cs.epsilon = np.append(cs.epsilon, rng.uniform(*config["epsilon_limits"], num_atom_types_to_add))
+
+    if perturb & {"num_atoms"} and rng.random() < ms:
+        if rng.random() < 0.5: # remove an atom
+            if len(cs) > config['num_atoms_limits'][0]:
+                keep = np.arange(len(cs)) != rng.integers(len(cs))
+                cs.frac, cs.charge, cs.type_index = cs.frac[keep], cs.charge[keep], cs.type_index[keep]
+        else: # add an atom
+            if len(cs) < config['num_atoms_limits'][1]:
+                cs.frac = np.append(cs.frac, rng.random((1, 3)), axis=0)
+                cs.charge = np.append(cs.charge, 0.0)
+                cs.type_index = np.append(cs.type_index, rng.integers(len(cs.sigma)))
+
+    if perturb & {"atom_type_assignments"}:
+        reassign = rng.random(len(cs)) < ms**2
+        cs.type_index[reassign] = rng.integers(len(cs.sigma), size=np.count_nonzero(reassign))
+
+    if perturb & {"atom_types"}:
+        sigl = config["sigma_limits"]
+        epsl = config["epsilon_limits"]
+        cs.sigma = perturb_unweighted(cs.sigma, ms * (sigl[1] - sigl[0]), sigl, rng)
+        cs.epsilon = perturb_unweighted(cs.epsilon, ms * (epsl[1] - epsl[0]), epsl, rng)
+
+    if perturb & {"lattice"}:
+        ll = config["lattice_constant_limits"]
+        if config["lattice_cubic"]:
+            cs.lattice[:] = perturb_unweighted(cs.lattice[0], ms * (ll[1] - ll[0]), ll, rng)
+        else:
+            cs.lattice = perturb_unweighted(cs.lattice, ms * (ll[1] - ll[0]), ll, rng)
+
+    if perturb & {"atom_sites"}:
+        cs.frac = random_positions(cs.frac, rng.random(cs.frac.shape), ms)
+
+    return cs
+
+def choose_perturbation(config, rng):
+    """returns the perturbation label for a child and the set of perturbations to apply."""
+    perturb = sorted(config["perturb"])
+    if config["perturb_type"] == "random":
+        perturbation = perturb[rng.integers(len(perturb))]
+        return perturbation, {perturbation}
+    return "all", set(perturb)
+
+def mutate_materials(parents, config, seed=None):
+    """returns a list of mutated children, one for each parent Material.
+
+    Each child gets its own random number generator, spawned from `seed`, so that a child can be
+    reproduced from the seed and its index in `parents` regardless of how the parents are split
+    across workers. The children's structures are only converted to ORM rows once all
+    perturbations have been applied.
+    """
+    child_seeds = np.random.SeedSequence(seed).spawn(len(parents))
+    return [mutate_material(parent, config, child_seed) for parent, child_seed in zip(parents, child_seeds)]
+
+def mutate_material(parent, config, seed=None):
+    """returns a mutated child of the parent Material; a drop-in replacement for
+    `htsohm.generator.mutate.mutate_material` that operates on the structure arrays.
+
+    seed: an int or numpy SeedSequence for the child's random number generator. Default: None
+        (unseeded).
+    """
+    rng = np.random.default_rng(seed)
+    perturbation, perturb = choose_perturbation(config, rng)
+
+    parent_arrays = parent.structure.arrays
+    child_arrays = mutate_arrays(parent_arrays, config, rng, perturb)
+
+    child = Material(parent=parent, structure=child_arrays.to_structure())
+    child.structure._arrays = child_arrays
+    child.perturbation = perturbation
+    child.number_density = child_arrays.number_density
+
+    slog("Parent id: %s; perturbing: %s [%s]" % (parent.id, perturbation, ", ".join(sorted(perturb))))
+    slog("PARENT UUID :\t{}\nCHILD UUID  :\t{}".format(parent.uuid, child.uuid))
+    slog("lattice constants: (%.2f, %.2f, %.2f) => (%.2f, %.2f, %.2f); number of atoms: %d => %d" %
+         (*parent_arrays.lattice, *child_arrays.lattice, len(parent_arrays), len(child_arrays)))
+    return child
@@ -4,18 +4,23 @@ from glob import glob
 import math
 from multiprocessing import Pool
 import os
+import queue
 import random
 import shutil
 import sys
+import time
 
 import numpy as np
 from sqlalchemy.orm import joinedload
 
 from htsohm import generator, load_config_file, db
-from htsohm.bins import calc_bins
-from htsohm.bin.output_csv import output_csv_from_db, csv_add_bin_column
+from htsohm.bins import calc_property_bins, BinGrid
+from htsohm.bin.output_csv import output_csv_from_db, csv_add_bin_column, property_column_index
 from htsohm.db import Material, VoidFraction
+from htsohm.screening import SurrogateScreener
 from htsohm.simulation.run_all import run_all_simulations
+from htsohm.simulation.simulate.void_fraction import precalculate_geo_void_fractions
+from htsohm.simulation.simulate.void_fraction import clear_precalculated_geo_void_fractions
 # from htsohm.figures import delaunay_figure
 import htsohm.select.triangulation as selector_tri
 import htsohm.select.density_bin as selector_bin
@@ -28,13 +33,28 @@ def print_block(string):
     print('{0}\n{1}\n{0}'.format('=' * 80, string))
 
 
-def empty_lists_2d(x,y):
-    return [[[] for j in range(x)] for i in range(y)]
-
-def dump_restart(path, box_d, box_r, bin_counts, bin_materials, bins, gen):
-    np.savez(path, box_d, box_r, bin_counts, bin_materials, bins, gen)
-
-def load_restart(path):
+def dump_restart(path, box_d, box_r, bin_grid, gen, keep=None):
+    """writes a restart file, for restarting at generation gen. If a keep mask is passed, only the
+    materials where keep is True are written."""
+    material_bins = bin_grid.material_bins
+    if keep is not None:
+        box_d, box_r, material_bins = box_d[keep], box_r[keep], material_bins[keep]
+    np.savez(path, box_d=box_d, box_r=box_r, material_bins=material_bins, gen=gen)
+
+def last_finished_generation(box_gen, start_gen, gen, children_per_generation):
+    """returns the last generation, up to gen, such that every generation from start_gen up to it
+    has all children_per_generation of its children in box_gen, the generation of each material.
+    Returns start_gen - 1 if start_gen hasn't finished."""
+    counts = np.bincount(box_gen[box_gen >= start_gen] - start_gen, minlength=gen - start_gen + 1)
+    for g in range(start_gen, gen + 1):
+        if counts[g - start_gen] < children_per_generation:
+            return g - 1
+    return gen
+
+def load_restart(path, num_bins, frontier_radius=1):
+    """loads a restart file and returns the box_d and box_r arrays, the BinGrid and the generation
+    to restart at. Restart files from before the BinGrid, which stored the bin counts, nested lists
+    of the materials in each bin and the set of occupied bins, are also supported."""
     if path == "auto":
         restart_files = glob("*.txt.npz")
         restart_files.sort(key=os.path.getmtime)
@@ -45,93 +65,308 @@ def load_restart(path):
             print("WARNING: more than one txt.npz file found in this directory. Using last one: %s" % path)
 
     npzfile = np.load(path, allow_pickle=True)
-    return [npzfile[v] if npzfile[v].size != 1 else npzfile[v].item() for v in npzfile.files]
-
-def load_restart_db(gen, num_bins, prop1range, prop2range, session):
-    mats = session.query(Material).options(joinedload("void_fraction"), joinedload("gas_loading")) \
+    if "material_bins" in npzfile.files:
+        bin_grid = BinGrid.from_material_bins(num_bins, npzfile["material_bins"],
+                                              frontier_radius=frontier_radius)
+        return npzfile["box_d"], npzfile["box_r"], bin_grid, npzfile["gen"].item()
+
+    box_d, box_r, _, bin_materials, _, gen = [npzfile[v] if npzfile[v].size != 1 else npzfile[v].item()
+                                              for v in npzfile.files]
+    material_bins = np.zeros((len(box_d), 2), dtype=int)
+    for i, row in enumerate(bin_materials):
+        for j, mats in enumerate(row):
+            material_bins[list(mats)] = (i, j)
+    bin_grid = BinGrid.from_material_bins(num_bins, material_bins, frontier_radius=frontier_radius)
+    return box_d, box_r, bin_grid, gen
+
+def load_restart_db(gen, num_bins, properties, session, frontier_radius=1):
+    mats = session.query(Material).options(joinedload("void_fraction"), joinedload("gas_loading"),
+                                           joinedload("surface_area")) \
                     .filter(Material.generation <= gen).all()
     box_d = np.array([m.id for m in mats])
-    box_r = np.array([(m.void_fraction[0].get_void_fraction(), m.gas_loading[0].absolute_volumetric_loading)
-                     for m in mats])
-
-    bin_counts = np.zeros((num_bins, num_bins))
-    bin_materials = empty_lists_2d(num_bins, num_bins)
+    box_r = np.array([[m.get_property(p["name"]) for p in properties] for m in mats])
 
-    bins = calc_bins(box_r, num_bins, prop1range=prop1range, prop2range=prop2range)
-    for i, (bx, by) in enumerate(bins):
-        bin_counts[bx,by] += 1
-        bin_materials[bx][by].append(i)
+    bins = calc_property_bins(box_r, [p["range"] for p in properties], num_bins)
+    bin_grid = BinGrid.from_material_bins(num_bins, bins, frontier_radius=frontier_radius)
 
     start_gen = gen + 1
-    return box_d, box_r, bin_counts, bin_materials, set(bins), start_gen
-
-def check_db_materials_for_restart(expected_num_materials, session, delete_excess=False):
-    """Checks for if there are enough or extra materials in the database."""
-    extra_materials = session.query(Material).filter(Material.id > expected_num_materials).all()
-    if len(extra_materials) > 0:
-        print("The database has an extra %d materials in it." % len(extra_materials))
+    return box_d, box_r, bin_grid, start_gen
+
+def check_db_materials_for_restart(box_d, session, delete_excess=False):
+    """Checks that the database has every material in box_d, and no others.
+
+    Materials are compared by id rather than by count, since in steady-state mode, materials are
+    committed in the order they finish, so ids don't follow generations."""
+    restart_ids = set(int(material_id) for material_id in box_d)
+    db_ids = set(material_id for (material_id,) in session.query(Material.id))
+    extra_ids = sorted(db_ids - restart_ids)
+    if len(extra_ids) > 0:
+        print("The database has an extra %d materials in it." % len(extra_ids))
         if (delete_excess):
-            print("deleting from materials where id > %d" % expected_num_materials)
-            db.delete_extra_materials(expected_num_materials)
+            print("deleting the materials that aren't in the restart")
+            db.delete_materials(extra_ids)
         else:
             print("Is this the right database and restart file?")
             sys.exit(1)
 
-    num_materials = session.query(Material).count()
-    if num_materials < expected_num_materials:
+    if len(restart_ids - db_ids) > 0:
         print("The database has fewer materials in it than the restart file indicated.")
         print("Is this the right database and restart file?")
         sys.exit(1)
 
 def init_worker(config):
     """initialization function for worker that inits the database and gets a worker-specific
-    session."""
-    global worker_session
+    session. Workers live for the whole run, so this is only called once per worker process."""
+    global worker_session, worker_config, worker_screener
     _, worker_session = db.init_database(config["database_connection_string"])
+    worker_config = config
+    worker_screener = SurrogateScreener.from_config(config) if config["screening"] else None
     return
 
-def simulate_generation_worker(parent_id):
-    """gets most of its parameters from the global worker_metadata set in the
-    parallel_simulate_generation method."""
-    generator, config, gen = worker_metadata
-    init_slog()
+def new_child(generator, parent_id, seed=None):
+    """creates a new material with the generator; if parent_id > 0, the material is a child of the
+    material with that id. If a seed is passed, the random module is seeded with it before the
+    material is generated, and reseeded randomly afterwards."""
+    if seed is not None:
+        random.seed(seed)
+
     if parent_id > 0:
         parent = worker_session.query(Material).get(int(parent_id))
-        material = generator(parent, config["structure_parameters"])
+        material = generator(parent, worker_config["structure_parameters"])
     else:
-        material = generator(config["structure_parameters"])
-
-    run_all_simulations(material, config)
+        material = generator(worker_config["structure_parameters"])
+
+    if seed is not None:
+        random.seed() # flush the seed so that only this material is seeded
+    return material
+
+def update_screener():
+    """trains the worker's screener on the materials added to the database since its last update.
+    This expunges the materials it reads, so it has to be called before any materials are loaded
+    for the task."""
+    if worker_screener is not None:
+        worker_screener.update_from_db(worker_session)
+
+def screen_child(generator, parent_id, material):
+    """returns the child if the worker's screener predicts it lands in an empty or rare bin (or
+    picks it for exploration). Otherwise, new children of the same parent are generated until one
+    passes, up to screening_max_attempts children in all; the last one is kept either way. Random
+    materials (parent_id 0) are never screened."""
+    if worker_screener is None or parent_id <= 0:
+        return material
+
+    num_screened = 0
+    while not worker_screener.screen(material) and num_screened + 1 < worker_config["screening_max_attempts"]:
+        num_screened += 1
+        material = new_child(generator, parent_id)
+    if num_screened > 0:
+        slog("Screened out %d children of parent %d" % (num_screened, parent_id))
+    return material
+
+def simulate_and_commit(material, gen):
+    """runs all simulations for the material and commits it to the worker's database session."""
+    run_all_simulations(material, worker_config)
     material.generation = gen
+    if worker_config["atom_site_storage"] == "packed":
+        material.structure.pack_sites()
     worker_session.add(material)
     worker_session.commit()
+    return (material.id, tuple(material.get_property(p["name"]) for p in worker_config["properties"]))
 
+def simulate_generation_worker(task):
+    """generates and simulates one child. The task is a tuple of (generator, generation, parent_id,
+    seed)."""
+    generator_method, gen, parent_id, seed = task
+    init_slog()
+    update_screener()
+    material = screen_child(generator_method, parent_id, new_child(generator_method, parent_id, seed))
+    result = simulate_and_commit(material, gen)
     print(get_slog())
-    return (material.id, (material.void_fraction[0].get_void_fraction(),
-                          material.gas_loading[0].absolute_volumetric_loading))
-
-def parallel_simulate_generation(generator, num_processes, parent_ids, config, gen, children_per_generation):
-    global worker_metadata
-    worker_metadata = (generator, config, gen)
+    return result
 
+def simulate_generation_chunk_worker(task):
+    """generates and simulates a chunk of children at once, so that calculations that can be
+    batched across materials (i.e. geometric void fractions) are only run once per chunk. The task
+    is a tuple of (generator, generation, parent_ids, seeds)."""
+    generator_method, gen, parent_ids, seeds = task
+    init_slog()
+    update_screener()
+    if generator_method == generator.mutate_arrays.mutate_material:
+        parents = [worker_session.query(Material).get(int(parent_id)) for parent_id in parent_ids]
+        materials = generator.mutate_arrays.mutate_materials(parents, worker_config["structure_parameters"])
+    else:
+        materials = [new_child(generator_method, parent_id, seed) for parent_id, seed in zip(parent_ids, seeds)]
+    materials = [screen_child(generator_method, parent_id, material)
+                 for parent_id, material in zip(parent_ids, materials)]
+    try:
+        for simulation_config in worker_config["simulations"].values():
+            if simulation_config["type"] == "void_fraction":
+                precalculate_geo_void_fractions(materials, simulation_config)
+
+        results = [simulate_and_commit(material, gen) for material in materials]
+    finally:
+        # workers are persistent; don't keep the results of this chunk around
+        clear_precalculated_geo_void_fractions()
+    print(get_slog())
+    return results
+
+def timed_worker(task):
+    """runs a worker on its task, for a task of (worker, worker_task), and returns the list of the
+    worker's results along with the time the worker spent on them."""
+    worker, worker_task = task
+    start_time = time.perf_counter()
+    results = worker(worker_task)
+    if worker == simulate_generation_worker:
+        results = [results]
+    return results, time.perf_counter() - start_time
+
+def generation_tasks(generator, gen, parent_ids, seeds, chunk_size):
+    """returns the tasks for timed_worker that generate and simulate a child for every parent id,
+    with chunk_size children per task."""
+    if chunk_size > 1:
+        return [(simulate_generation_chunk_worker,
+                    (generator, gen, parent_ids[i:i + chunk_size], seeds[i:i + chunk_size]))
+                    for i in range(0, len(parent_ids), chunk_size)]
+    else:
+        return [(simulate_generation_worker, (generator, gen, parent_id, seed))
+                    for parent_id, seed in zip(parent_ids, seeds)]
+
+def parallel_simulate_generation(pool, generator, parent_ids, config, gen, children_per_generation,
+                                 seed=None, utilization=None):
+    """generates and simulates one generation of children on the worker pool.
+
+    All generation-specific parameters are passed to the workers with each task, so the same pool
+    can be used for the entire run. If a seed is passed, each child is generated with its own seed
+    derived from it (only used for the initial random generation). If a CoreUtilization is passed,
+    the time the workers spent on the generation is added to it.
+    """
     if parent_ids is None:
         parent_ids = [0] * (children_per_generation) # should only be needed for random!
 
-    with Pool(processes=num_processes, initializer=init_worker, initargs=[config]) as pool:
-        results = pool.map(simulate_generation_worker, parent_ids)
+    if seed is None:
+        seeds = [None] * len(parent_ids)
+    else:
+        seeds = ["%d-%d" % (seed, i) for i in range(len(parent_ids))]
+
+    tasks = generation_tasks(generator, gen, parent_ids, seeds, config['simulation_chunk_size'])
+    results = []
+    for task_results, busy_time in pool.map(timed_worker, tasks):
+        results += task_results
+        if utilization is not None:
+            utilization.add_busy_time(busy_time)
 
     box_d, box_r = zip(*results)
     return (np.array(box_d), np.array(box_r))
 
-def select_parents(children_per_generation, box_d, box_r, bin_materials, config):
+def steady_state_simulate(pool, generator, choose_parent_ids, add_children, end_generation, config,
+                          start_gen, max_generations, tasks_in_flight, utilization=None):
+    """generates and simulates children without waiting for each generation to finish.
+
+    Up to tasks_in_flight tasks, of simulation_chunk_size children each, are kept running on the
+    pool. As soon as any task finishes, its children are passed to add_children(box_d, box_r, gen),
+    and a new task is dispatched with parents from choose_parent_ids(num_parents), which sees the
+    updated state.
+
+    The generation is kept as a logical counter, so that runs can be analyzed the same way as
+    generational runs: each child is stored with generation start_gen + the number of children
+    dispatched before it // children_per_generation, and end_generation(gen) is called every time
+    another children_per_generation children have finished. If end_generation returns True, no
+    new tasks are dispatched; once the tasks in flight have finished, end_generation is called a
+    last time for the partial generation. Tasks never span two logical generations.
+    """
+    children_per_generation = config['children_per_generation']
+    chunk_size = config['simulation_chunk_size']
+    max_children = (max_generations - start_gen + 1) * children_per_generation
+
+    finished = queue.Queue()
+    num_dispatched = 0
+    num_finished = 0
+    num_in_flight = 0
+
+    def _dispatch():
+        nonlocal num_dispatched, num_in_flight
+        gen = start_gen + num_dispatched // children_per_generation
+        num_children = min(chunk_size, children_per_generation - num_dispatched % children_per_generation)
+        parent_ids = choose_parent_ids(num_children)
+        if parent_ids is None:
+            parent_ids = [0] * num_children
+        [task] = generation_tasks(generator, gen, parent_ids, [None] * num_children, chunk_size)
+        pool.apply_async(timed_worker, (task,), callback=lambda result: finished.put((gen, result)),
+                         error_callback=finished.put)
+        num_dispatched += num_children
+        num_in_flight += 1
+
+    stop = False
+    while num_in_flight > 0 or (not stop and num_dispatched < max_children):
+        while not stop and num_in_flight < tasks_in_flight and num_dispatched < max_children:
+            _dispatch()
+
+        result = finished.get()
+        num_in_flight -= 1
+        if isinstance(result, BaseException):
+            raise result
+
+        task_gen, (task_results, busy_time) = result
+        if utilization is not None:
+            utilization.add_busy_time(busy_time)
+        box_d, box_r = zip(*task_results)
+        add_children(np.array(box_d), np.array(box_r), task_gen)
+
+        gens_finished = (num_finished + len(task_results)) // children_per_generation - \
+                            num_finished // children_per_generation
+        num_finished += len(task_results)
+        for i in range(gens_finished):
+            gen = start_gen + num_finished // children_per_generation - gens_finished + i
+            stop = end_generation(gen) or stop
+
+    if num_finished % children_per_generation != 0:
+        end_generation(start_gen + num_finished // children_per_generation)
+
+class CoreUtilization(object):
+    """tracks the fraction of the worker pool's core time that was spent generating and simulating
+    materials, over the whole run and since the end of the last generation. The busy time of the
+    last finished generation is kept in last_generation_busy_time.
+
+    A task's time is counted when it finishes, so in steady-state mode, where tasks run across
+    generation ends, the utilization of a single generation can be over 100%.
+    """
+
+    def __init__(self, num_processes):
+        self.num_processes = num_processes
+        self.start_time = self.generation_start_time = time.perf_counter()
+        self.busy_time = self.generation_busy_time = self.last_generation_busy_time = 0.0
+
+    def add_busy_time(self, seconds):
+        self.busy_time += seconds
+        self.generation_busy_time += seconds
+
+    def end_generation(self):
+        """returns the utilization since the end of the last generation."""
+        now = time.perf_counter()
+        utilization = self.generation_busy_time / ((now - self.generation_start_time) * self.num_processes)
+        self.generation_start_time = now
+        self.last_generation_busy_time = self.generation_busy_time
+        self.generation_busy_time = 0.0
+        return utilization
+
+    def total(self):
+        return self.busy_time / ((time.perf_counter() - self.start_time) * self.num_processes)
+
+def bins_per_cpu_hour(num_bins, busy_time):
+    """returns the number of bins found per hour of busy time, in seconds."""
+    return num_bins / (busy_time / 3600) if busy_time > 0 else 0.0
+
+def select_parents(children_per_generation, box_d, box_r, bin_grid, config, triangulation=None):
     if config['generator_type'] == 'random':
         return (None, [])
     elif config['selector_type'] == 'simplices-or-hull':
-        return selector_tri.choose_parents(children_per_generation, box_d, box_r, config['simplices_or_hull'])
+        return selector_tri.choose_parents(children_per_generation, box_d, box_r, config['simplices_or_hull'],
+                                           triangulation)
     elif config['selector_type'] == 'density-bin':
-        return selector_bin.choose_parents(children_per_generation, box_d, box_r, bin_materials)
+        return selector_bin.choose_parents(children_per_generation, box_d, box_r, bin_grid)
     elif config['selector_type'] == 'neighbor-bin':
-        return selector_neighbor_bin.choose_parents(children_per_generation, box_d, box_r, bin_materials)
+        return selector_neighbor_bin.choose_parents(children_per_generation, box_d, box_r, bin_grid,
+                                                    config['neighbor_bin_radius'])
     elif config['selector_type'] == 'best':
         return selector_best.choose_parents(children_per_generation, box_d, box_r)
     elif config['selector_type'] == 'specific':
@@ -140,15 +375,6 @@ def select_parents(children_per_generation, box_d, box_r, bin_materials, config)
 
 def htsohm_run(config_path, restart_generation=-1, override_db_errors=False, num_processes=1, max_generations=None):
 
-    def _update_bins_counts_materials(all_bins, bins, start_index):
-        nonlocal bin_counts, bin_materials
-        for i, (bx, by) in enumerate(all_bins):
-            bin_counts[bx,by] += 1
-            bin_materials[bx][by].append(i + start_index)
-        new_bins = set(all_bins) - bins
-        return new_bins, bins.union(new_bins)
-
-
     config = load_config_file(config_path)
     os.makedirs(config['output_dir'], exist_ok=True)
     print(config)
@@ -156,8 +382,12 @@ def htsohm_run(config_path, restart_generation=-1, override_db_errors=False, num
     children_per_generation = config['children_per_generation']
     prop1range = config['prop1range']
     prop2range = config['prop2range']
+    properties = config['properties']
+    prop_ranges = [p['range'] for p in properties]
     VoidFraction.set_column_for_void_fraction(config['void_fraction_subtype'])
     num_bins = config['number_of_convergence_bins']
+    # the bin grid keeps the frontier for the neighbor-bin selector's radius
+    neighbor_bin_radius = config['neighbor_bin_radius']
     benchmarks = config['benchmarks']
     next_benchmark = benchmarks.pop(0)
     last_benchmark_reached = False
@@ -172,110 +402,173 @@ def htsohm_run(config_path, restart_generation=-1, override_db_errors=False, num
     print('{:%Y-%m-%d %H:%M:%S}'.format(datetime.now()))
     if restart_generation >= 0:
         print("Restarting from database using generation: %s" % restart_generation)
-        box_d, box_r, bin_counts, bin_materials, bins, start_gen = load_restart_db(
-            restart_generation, num_bins, prop1range, prop2range, session)
+        box_d, box_r, bin_grid, start_gen = load_restart_db(
+            restart_generation, num_bins, properties, session, frontier_radius=neighbor_bin_radius)
 
         print("Restarting at generation %d\nThere are currently %d materials" % (start_gen, len(box_r)))
-        check_db_materials_for_restart(len(box_r), session, delete_excess=override_db_errors)
+        check_db_materials_for_restart(box_d, session, delete_excess=override_db_errors)
     elif load_restart_path:
         print("Restarting from file: %s" % load_restart_path)
-        box_d, box_r, bin_counts, bin_materials, bins, start_gen = load_restart(load_restart_path)
+        box_d, box_r, bin_grid, start_gen = load_restart(load_restart_path, num_bins,
+                                                      frontier_radius=neighbor_bin_radius)
         print("Restarting at generation %d\nThere are currently %d materials" % (start_gen, len(box_r)))
-        check_db_materials_for_restart(len(box_r), session, delete_excess=override_db_errors)
-    else:
-        if session.query(Material).count() > 0:
-            print("ERROR: cannot have existing materials in the database for a new run")
-            sys.exit(1)
+        check_db_materials_for_restart(box_d, session, delete_excess=override_db_errors)
+    elif session.query(Material).count() > 0:
+        print("ERROR: cannot have existing materials in the database for a new run")
+        sys.exit(1)
 
-        # generate initial generation of random materials
-        print("applying random seed to initial points: %d" % config['initial_points_random_seed'])
-        random.seed(config['initial_points_random_seed'])
-        box_d, box_r = parallel_simulate_generation(generator.random.new_material, num_processes, None,
-                        config, gen=0, children_per_generation=config['children_per_generation'])
-        random.seed() # flush the seed so that only the initial points are set, not generated points
+    # the worker pool, and each worker's database session, are kept for the entire run. The pool is
+    # only created once the database checks have passed, and is terminated if the run fails.
+    with Pool(processes=num_processes, initializer=init_worker, initargs=[config]) as pool:
+        if restart_generation < 0 and not load_restart_path:
+            # generate initial generation of random materials
+            print("applying random seed to initial points: %d" % config['initial_points_random_seed'])
+            box_d, box_r = parallel_simulate_generation(pool, generator.random.new_material, None, config,
+                            gen=0, children_per_generation=config['children_per_generation'],
+                            seed=config['initial_points_random_seed'])
+
+            # setup initial bins
+            bin_grid = BinGrid.from_material_bins(num_bins, calc_property_bins(box_r, prop_ranges, num_bins),
+                                                  frontier_radius=neighbor_bin_radius)
+
+            output_path = os.path.join(config['output_dir'], "binplot_0.png")
+            # delaunay_figure(box_r, num_bins, output_path, bins=bin_grid.dense_counts(), \
+            #                     title="Starting random materials", show_triangulation=False, show_hull=False, \
+            #                     prop1range=prop1range, prop2range=prop2range)
+
+            start_gen = 1
+
+        # generation of every material; materials from before a restart are all counted as finished
+        box_gen = np.full(len(box_d), start_gen - 1)
+
+        if config['generator_type'] == 'random':
+            generator_method = generator.random.new_material
+        elif config['generator_type'] == 'mutate':
+            generator_method = generator.mutate.mutate_material
+        elif config['generator_type'] == 'mutate_arrays':
+            generator_method = generator.mutate_arrays.mutate_material
+
+        # the triangulation for the simplices-or-hull selector is kept up to date as children are added
+        triangulation = None
+        if config['selector_type'] == 'simplices-or-hull' and config['generator_type'] != 'random':
+            triangulation = selector_tri.IncrementalTriangulation(box_r, config['simplices_or_hull'])
+
+        def _add_children(new_box_d, new_box_r, gen):
+            nonlocal box_d, box_r, box_gen
+            new_bins = bin_grid.add(calc_property_bins(new_box_r, prop_ranges, num_bins))
+            if triangulation is not None:
+                triangulation.add_points(new_box_r)
+            box_d = np.append(box_d, new_box_d, axis=0)
+            box_r = np.append(box_r, new_box_r, axis=0)
+            box_gen = np.append(box_gen, np.full(len(new_box_d), gen))
+            return new_bins
+
+        def _end_generation(gen):
+            """reports on the exploration so far, dumps the restart file and returns True if the run
+            should stop."""
+            nonlocal next_benchmark, last_benchmark_reached, generation_start_bins
+            benchmark_just_reached = False
+
+            # evaluate algorithm effectiveness
+            bin_fraction_explored = len(bin_grid.occupied) / bin_grid.size
+            print_block('GENERATION %s: %5.2f%% (core utilization: %5.2f%%)' %
+                (gen, bin_fraction_explored * 100, utilization.end_generation() * 100))
+            new_bins = len(bin_grid.occupied) - generation_start_bins
+            generation_start_bins = len(bin_grid.occupied)
+            print("new bins: %d; bins per CPU hour: %5.2f (run: %5.2f)" %
+                (new_bins, bins_per_cpu_hour(new_bins, utilization.last_generation_busy_time),
+                 bins_per_cpu_hour(len(bin_grid.occupied) - run_start_bins, utilization.busy_time)))
+            while bin_fraction_explored >= next_benchmark:
+                benchmark_just_reached = True
+                print_block("%s: %5.2f%% exploration accomplished at generation %d" %
+                    ('{:%Y-%m-%d %H:%M:%S}'.format(datetime.now()), bin_fraction_explored * 100, gen))
+                if benchmarks:
+                    next_benchmark = benchmarks.pop(0)
+                else:
+                    last_benchmark_reached = True
+
+            # if config['bin_graph_on'] and (
+            #     (benchmark_just_reached or gen == config['max_generations']) or \
+            #     (config['bin_graph_every'] > 0  and gen % config['bin_graph_every'] == 0)):
+            #
+            #     output_path = os.path.join(config['output_dir'], "binplot_%d.png" % gen)
+            #     delaunay_figure(box_r, num_bins, output_path, children=new_box_r, parents=parents_r,
+            #                     bins=bin_grid.dense_counts(), new_bins=new_bins,
+            #                     title="Generation %d: %d/%d (+%d) %5.2f%% (+%5.2f %%)" %
+            #                         (gen, len(bin_grid.occupied), num_bins ** 2, len(new_bins),
+            #                         100*float(len(bin_grid.occupied)) / num_bins ** 2, 100*float(len(new_bins)) / num_bins ** 2 ),
+            #                     patches=None, prop1range=prop1range, prop2range=prop2range, \
+            #                     perturbation_methods=["all"]*children_per_generation, show_triangulation=False, show_hull=False)
+            #
+            # if config['tri_graph_on'] and (
+            #     (benchmark_just_reached or gen == config['max_generations']) or \
+            #     (config['tri_graph_every'] > 0  and gen % config['tri_graph_every'] == 0)):
+            #
+            #     output_path = os.path.join(config['output_dir'], "triplot_%d.png" % gen)
+            #     delaunay_figure(box_r, num_bins, output_path, children=new_box_r, parents=parents_r,
+            #                     bins=bin_grid.dense_counts(), new_bins=new_bins,
+            #                     title="Generation %d: %d/%d (+%d) %5.2f%% (+%5.2f %%)" %
+            #                         (gen, len(bin_grid.occupied), num_bins ** 2, len(new_bins),
+            #                         100*float(len(bin_grid.occupied)) / num_bins ** 2, 100*float(len(new_bins)) / num_bins ** 2 ),
+            #                     patches=None, prop1range=prop1range, prop2range=prop2range, \
+            #                     perturbation_methods=["all"]*children_per_generation)
+
+            # in steady-state mode, children of later generations can finish before every child of this
+            # generation has, so the restart file only has the generations that have all finished
+            restart_path = os.path.join(config['output_dir'], "restart.txt.npz")
+            finished_gen = last_finished_generation(box_gen, start_gen, gen, children_per_generation)
+            dump_restart(restart_path, box_d, box_r, bin_grid, finished_gen + 1, keep=box_gen <= finished_gen)
+            if benchmark_just_reached or gen == max_generations:
+                shutil.move(restart_path, os.path.join(config['output_dir'], "restart%d.txt.npz" % gen))
+
+            return last_benchmark_reached
+
+        # bins found per CPU hour of the workers, the figure of merit for screening children; the
+        # initial random generation isn't counted
+        run_start_bins = generation_start_bins = len(bin_grid.occupied)
+        utilization = CoreUtilization(num_processes)
+        if config['evolution_mode'] == 'steady-state':
+            # parents for each task are drawn from a full generation's worth of parents, so that
+            # selectors that pick the top-n candidates select the same way as in a generational run
+            def _choose_parent_ids(num_parents):
+                parents_d, _ = select_parents(children_per_generation, box_d, box_r, bin_grid, config, triangulation)
+                if parents_d is None:
+                    return None
+                return [parents_d[i] for i in np.random.choice(len(parents_d), num_parents, replace=False)]
+
+            tasks_in_flight = config.get('steady_state_tasks_in_flight', num_processes)
+            steady_state_simulate(pool, generator_method, _choose_parent_ids, _add_children,
+                                  _end_generation, config, start_gen, max_generations, tasks_in_flight,
+                                  utilization=utilization)
+        else:
+            for gen in range(start_gen, max_generations + 1):
+                # mutate materials and simulate properties
+                parents_d, parents_r = select_parents(children_per_generation, box_d, box_r, bin_grid, config, triangulation)
+                new_box_d, new_box_r = parallel_simulate_generation(pool, generator_method, parents_d,
+                                        config, gen=gen, children_per_generation=config['children_per_generation'],
+                                        utilization=utilization)
 
-        # setup initial bins
-        bin_counts = np.zeros((num_bins, num_bins))
-        bin_materials = empty_lists_2d(num_bins, num_bins)
-        all_bins = calc_bins(box_r, num_bins, prop1range=prop1range, prop2range=prop2range)
-        new_bins, bins = _update_bins_counts_materials(all_bins, set(), 0)
+                # track bins
+                new_bins = _add_children(new_box_d, new_box_r, gen)
 
-        output_path = os.path.join(config['output_dir'], "binplot_0.png")
-        # delaunay_figure(box_r, num_bins, output_path, bins=bin_counts, \
-        #                     title="Starting random materials", show_triangulation=False, show_hull=False, \
-        #                     prop1range=prop1range, prop2range=prop2range)
+                if _end_generation(gen):
+                    break
 
-        start_gen = 1
+        print("core utilization: %5.2f%%" % (utilization.total() * 100))
+        print("bins per CPU hour: %5.2f" % bins_per_cpu_hour(len(bin_grid.occupied) - run_start_bins, utilization.busy_time))
 
-    if config['generator_type'] == 'random':
-        generator_method = generator.random.new_material
-    elif config['generator_type'] == 'mutate':
-        generator_method = generator.mutate.mutate_material
-
-    for gen in range(start_gen, max_generations + 1):
-        benchmark_just_reached = False
-
-        # mutate materials and simulate properties
-        parents_d, parents_r = select_parents(children_per_generation, box_d, box_r, bin_materials, config)
-        new_box_d, new_box_r = parallel_simulate_generation(generator_method, num_processes, parents_d,
-                                config, gen=gen, children_per_generation=config['children_per_generation'])
-
-        # track bins
-        all_bins = calc_bins(new_box_r, num_bins, prop1range=prop1range, prop2range=prop2range)
-        new_bins, bins = _update_bins_counts_materials(all_bins, bins, gen * children_per_generation)
-
-        # evaluate algorithm effectiveness
-        bin_fraction_explored = len(bins) / num_bins ** 2
-        print_block('GENERATION %s: %5.2f%%' % (gen, bin_fraction_explored * 100))
-        while bin_fraction_explored >= next_benchmark:
-            benchmark_just_reached = True
-            print_block("%s: %5.2f%% exploration accomplished at generation %d" %
-                ('{:%Y-%m-%d %H:%M:%S}'.format(datetime.now()), bin_fraction_explored * 100, gen))
-            if benchmarks:
-                next_benchmark = benchmarks.pop(0)
-            else:
-                last_benchmark_reached = True
-
-        # if config['bin_graph_on'] and (
-        #     (benchmark_just_reached or gen == config['max_generations']) or \
-        #     (config['bin_graph_every'] > 0  and gen % config['bin_graph_every'] == 0)):
-        #
-        #     output_path = os.path.join(config['output_dir'], "binplot_%d.png" % gen)
-        #     delaunay_figure(box_r, num_bins, output_path, children=new_box_r, parents=parents_r,
-        #                     bins=bin_counts, new_bins=new_bins,
-        #                     title="Generation %d: %d/%d (+%d) %5.2f%% (+%5.2f %%)" %
-        #                         (gen, len(bins), num_bins ** 2, len(new_bins),
-        #                         100*float(len(bins)) / num_bins ** 2, 100*float(len(new_bins)) / num_bins ** 2 ),
-        #                     patches=None, prop1range=prop1range, prop2range=prop2range, \
-        #                     perturbation_methods=["all"]*children_per_generation, show_triangulation=False, show_hull=False)
-        #
-        # if config['tri_graph_on'] and (
-        #     (benchmark_just_reached or gen == config['max_generations']) or \
-        #     (config['tri_graph_every'] > 0  and gen % config['tri_graph_every'] == 0)):
-        #
-        #     output_path = os.path.join(config['output_dir'], "triplot_%d.png" % gen)
-        #     delaunay_figure(box_r, num_bins, output_path, children=new_box_r, parents=parents_r,
-        #                     bins=bin_counts, new_bins=new_bins,
-        #                     title="Generation %d: %d/%d (+%d) %5.2f%% (+%5.2f %%)" %
-        #                         (gen, len(bins), num_bins ** 2, len(new_bins),
-        #                         100*float(len(bins)) / num_bins ** 2, 100*float(len(new_bins)) / num_bins ** 2 ),
-        #                     patches=None, prop1range=prop1range, prop2range=prop2range, \
-        #                     perturbation_methods=["all"]*children_per_generation)
-
-        box_d = np.append(box_d, new_box_d, axis=0)
-        box_r = np.append(box_r, new_box_r, axis=0)
-
-        restart_path = os.path.join(config['output_dir'], "restart.txt.npz")
-        dump_restart(restart_path, box_d, box_r, bin_counts, bin_materials, bins, gen + 1)
-        if benchmark_just_reached or gen == max_generations:
-            shutil.move(restart_path, os.path.join(config['output_dir'], "restart%d.txt.npz" % gen))
-
-        if last_benchmark_reached:
-            break
+        pool.close()
+        pool.join()
 
     with open("pm.csv", 'w', newline='') as f:
         output_csv_from_db(session, output_file=f)
 
+    bin_columns = []
+    for prop in properties:
+        column = property_column_index(prop['name'], config['void_fraction_subtype'])
+        if column is None:
+            print("WARNING: %s is not a column of pm.csv, so it is not binned in pm-binned.csv" % prop['name'])
+        else:
+            bin_columns.append((column, *prop['range'], num_bins))
     with open("pm-binned.csv", 'w', newline='') as f:
-        # column 8 is void_fraction_geo, 9 is methane loading
-        csv_add_bin_column("pm.csv", [(8, *prop1range, num_bins), (9, *prop2range, num_bins)], output_file=f)
+        csv_add_bin_column("pm.csv", bin_columns, output_file=f)
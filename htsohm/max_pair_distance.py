@@ -14,7 +14,28 @@ def minimum_distance_v(v1, v2):
 def minimum_distance_point(p1, p2):
     return [minimum_distance_v(v1, v2) for (v1, v2) in zip(p1, p2)]
 
-def max_pair_distance(points):
+def max_pair_distance(points, chunk_size=1024):
+    """returns the longest minimum-image distance between any two points.
+
+    Points are in fractional coordinates. The pair distances are computed with numpy, one chunk of
+    `chunk_size` points at a time against all following points, so that no more than about
+    chunk_size * len(points) distances are in memory at once. The distance along each axis is the
+    same as for `minimum_distance_v`.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    if len(points) < 2:
+        return 0.0
+
+    max_distance = 0.0
+    for start in range(0, len(points) - 1, chunk_size):
+        vdiff = np.abs(points[start:start + chunk_size, None, :] - points[None, start:, :])
+        vdiff = np.where(vdiff < 0.5, vdiff, 1 - vdiff)
+        max_distance = max(max_distance, ((vdiff ** 2).sum(axis=2) ** 0.5).max())
+    return max_distance
+
+def max_pair_distance_loop(points):
+    """returns the longest minimum-image distance between any two points, checking every pair in a
+    python loop. This is the original implementation of `max_pair_distance`."""
     if len(points) == 1:
         return 0.0
     pairs = np.array([minimum_distance_point(p1, p2) for p1, p2 in itertools.combinations(points, 2)])
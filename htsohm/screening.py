@@ -0,0 +1,135 @@
+import random
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from htsohm.bins import BinGrid, calc_property_bins
+from htsohm.bin.output_csv import MATERIAL_COLUMNS, material_row_chunks
+
+# structure descriptors the surrogate model predicts properties from, as material csv columns
+DESCRIPTOR_COLUMNS = ["number_density", "epsilon_density", "a", "b", "c"]
+
+# material csv column of each property that can be screened for; void_fraction depends on the
+# void_fraction_subtype. Properties of the structure itself aren't predicted, but calculated.
+PROPERTY_COLUMNS = {"gas_loading": "absolute_volumetric_loading", "number_density": "number_density",
+                    "site_distribution": "site_distribution"}
+STRUCTURE_PROPERTIES = {"number_density": lambda s: s.arrays.number_density,
+                        "site_distribution": lambda s: s.site_distribution}
+
+def structure_descriptors(material):
+    """returns the DESCRIPTOR_COLUMNS of a material, from its structure."""
+    sa = material.structure.arrays
+    return [sa.number_density, sa.epsilon_density, *sa.lattice.tolist()]
+
+class SurrogateScreener(object):
+    """predicts where in the property space children will land, so that children that would land
+    in crowded bins can be discarded before they are simulated.
+
+    Simulated properties are predicted by k-nearest-neighbors regression over the materials that
+    were already simulated, from their structure descriptors (see DESCRIPTOR_COLUMNS), each scaled
+    to unit variance. The number density and site distribution are calculated from the child's
+    structure instead. The training set and the bin counts are updated incrementally from the
+    database, with `update_from_db`.
+
+    Attributes:
+        properties (list): {name, range} of every property that spans the property space.
+        bin_grid (BinGrid): bins of the training materials.
+        last_id (int): id of the last material read from the database.
+    """
+
+    def __init__(self, properties, num_bins, void_fraction_column="void_fraction", num_neighbors=5,
+                 max_bin_count=3, exploration_fraction=0.1, min_materials=50):
+        """
+        Args:
+            properties (list): {name, range} of every property that spans the property space.
+            num_bins (int): number of bins along each property axis.
+            void_fraction_column (str): material csv column of the void fraction property.
+            num_neighbors (int): number of neighbors the predictions are averaged over.
+            max_bin_count (int): children predicted to land in bins with more materials than this
+                are screened out.
+            exploration_fraction (float): fraction of the children that would be screened out that
+                are simulated anyway, in case the prediction is wrong.
+            min_materials (int): no children are screened out until the model has been trained
+                on this many materials.
+        """
+        columns = dict(PROPERTY_COLUMNS, void_fraction=void_fraction_column)
+        for prop in properties:
+            if prop["name"] not in columns:
+                raise ValueError("can't screen for %s; only for %s" % (prop["name"], ", ".join(sorted(columns))))
+
+        self.properties = properties
+        self.num_bins = num_bins
+        self.num_neighbors = num_neighbors
+        self.max_bin_count = max_bin_count
+        self.exploration_fraction = exploration_fraction
+        self.min_materials = min_materials
+        self.target_columns = [columns[prop["name"]] for prop in properties]
+
+        self.descriptors = np.empty((0, len(DESCRIPTOR_COLUMNS)))
+        self.targets = np.empty((0, len(properties)))
+        self.bin_grid = BinGrid(num_bins, num_dims=len(properties))
+        self.last_id = 0
+        self._tree = None
+
+    @classmethod
+    def from_config(cls, config):
+        void_fraction_column = "void_fraction_geo" if config["void_fraction_subtype"] == "geo" else "void_fraction"
+        return cls(config["properties"], config["number_of_convergence_bins"], void_fraction_column,
+                   num_neighbors=config["screening_neighbors"],
+                   max_bin_count=config["screening_max_bin_count"],
+                   exploration_fraction=config["screening_exploration_fraction"],
+                   min_materials=config["screening_min_materials"])
+
+    def __len__(self):
+        return len(self.targets)
+
+    def add(self, descriptors, targets):
+        """adds materials to the training set, with (n, len(DESCRIPTOR_COLUMNS)) descriptors and
+        (n, len(properties)) property values."""
+        descriptors = np.asarray(descriptors, dtype=float).reshape(-1, len(DESCRIPTOR_COLUMNS))
+        targets = np.asarray(targets, dtype=float).reshape(-1, len(self.properties))
+        self.descriptors = np.concatenate([self.descriptors, descriptors])
+        self.targets = np.concatenate([self.targets, targets])
+        self.bin_grid.add(calc_property_bins(targets, [p["range"] for p in self.properties], self.num_bins))
+        self._tree = None
+
+    def update_from_db(self, session, chunk_size=10000):
+        """adds the materials that were added to the database since the last update. Materials
+        without a value for every property, or every descriptor, are skipped."""
+        names = [name for name, _ in MATERIAL_COLUMNS]
+        descriptor_index = [names.index(c) for c in DESCRIPTOR_COLUMNS]
+        target_index = [names.index(c) for c in self.target_columns]
+        for rows in material_row_chunks(session, self.last_id + 1, chunk_size):
+            self.last_id = rows[-1][0]
+            rows = [r for r in rows if all(r[i] is not None for i in descriptor_index + target_index)]
+            if len(rows) > 0:
+                self.add([[r[i] for i in descriptor_index] for r in rows],
+                         [[r[i] for i in target_index] for r in rows])
+
+    def predict(self, material):
+        """returns the predicted values of the properties of a material."""
+        descriptors = np.array(structure_descriptors(material))
+        if self._tree is None:
+            self._scale = self.descriptors.std(axis=0)
+            self._scale[self._scale == 0] = 1.0
+            self._tree = cKDTree(self.descriptors / self._scale)
+
+        k = min(self.num_neighbors, len(self))
+        _, neighbors = self._tree.query(descriptors / self._scale, k=k)
+        predicted = self.targets[np.atleast_1d(neighbors)].mean(axis=0)
+        for i, prop in enumerate(self.properties):
+            if prop["name"] in STRUCTURE_PROPERTIES:
+                predicted[i] = STRUCTURE_PROPERTIES[prop["name"]](material.structure)
+        return predicted
+
+    def screen(self, material, rng=random):
+        """returns True if the material should be simulated: if it is predicted to land in a bin
+        with at most max_bin_count materials, or is picked for exploration, or if the model hasn't
+        been trained on enough materials yet."""
+        if len(self) < max(self.min_materials, 1):
+            return True
+        predicted = self.predict(material)
+        b = tuple(calc_property_bins(predicted, [p["range"] for p in self.properties], self.num_bins)[0])
+        if self.bin_grid.counts.get(b, 0) <= self.max_bin_count:
+            return True
+        return rng.random() < self.exploration_fraction
@@ -1,27 +1,30 @@
-
 from random import random
 
 import numpy as np
 from numpy.random import choice
-from scipy.spatial import Delaunay
+from scipy.spatial import ConvexHull, Delaunay, QhullError
+
+def hull_point_weights(hull_edges, box_range):
+    """returns the indices of the points on the hull, and the weight of each, where the weight of a
+    point is the total length of the hull edges it is on."""
+    lengths = np.sqrt(((box_range[hull_edges[:, 0]] - box_range[hull_edges[:, 1]]) ** 2).sum(axis=1))
+    weights = np.bincount(hull_edges[:, 0], lengths, minlength=len(box_range)) + \
+              np.bincount(hull_edges[:, 1], lengths, minlength=len(box_range))
+    hull_point_indices = np.unique(hull_edges)
+    return hull_point_indices, weights[hull_point_indices]
 
 def choose_parents_hull(triang, box_range, num_parents):
-    hull_point_indices = np.unique(triang.convex_hull.flatten())
-    point_weights = {i:0.0 for i in hull_point_indices}
-    
-    for edge in triang.convex_hull:
-        distance = np.sqrt(np.sum((box_range[edge[0]] - box_range[edge[1]]) ** 2))
-        point_weights[edge[0]] += distance
-        point_weights[edge[1]] += distance
-
-    point_weight_arr = [[point_weights[i], i] for i in point_weights.keys()]
-    point_weight_arr.sort(key=lambda x: x[0])
-    point_weight_arr = np.array(point_weight_arr)[-num_parents:]
-
-    total_weight = point_weight_arr[:,0].sum()
-    point_weight_arr[:, 0] /= total_weight
-
-    parent_indices = choice(point_weight_arr[:,1], num_parents, p=point_weight_arr[:,0])
+    return choose_parents_from_hull_edges(triang.convex_hull, box_range, num_parents)
+
+def choose_parents_from_hull_edges(hull_edges, box_range, num_parents):
+    hull_point_indices, point_weights = hull_point_weights(hull_edges, box_range)
+
+    # the num_parents points with the highest weights, ties going to the higher index
+    best = np.lexsort((hull_point_indices, point_weights))[-num_parents:]
+    hull_point_indices = hull_point_indices[best]
+    point_weights = point_weights[best] / point_weights[best].sum()
+
+    parent_indices = choice(hull_point_indices, num_parents, p=point_weights)
     parent_indices.sort()
     parent_indices = [int(i) for i in parent_indices]
 
@@ -30,25 +33,100 @@ def choose_parents_hull(triang, box_range, num_parents):
 def triangle_area(p1, p2, p3):
     return (p1[0]*(p2[1] - p3[1]) + p2[0]*(p3[1] - p1[1]) + p3[0]*(p1[1] - p2[1])) / 2
 
+def triangle_areas(simplices, box_range):
+    """returns the area of every triangle in simplices; vectorized version of triangle_area,
+    without the sign for the orientation of the triangle."""
+    p1, p2, p3 = (box_range[simplices[:, i]] for i in range(3))
+    return np.abs(triangle_area(p1.T, p2.T, p3.T))
+
 def choose_parents_simplices(triang, box_range, num_parents, num_best_triangles):
-    areas = [[triangle_area(box_range[p1], box_range[p2], box_range[p3]), p1, p2, p3] for p1, p2, p3 in triang.simplices]
+    areas = triangle_areas(triang.simplices, box_range)
     num_best_triangles = min(len(areas), num_best_triangles) # necessary for small generations
-    areas.sort()
-    areas = np.array(areas[-num_best_triangles:])
-    total_area = areas[:,0].sum()
-    areas[:,0] /= total_area
-    triangle_indices = choice(range(num_best_triangles), num_parents, p=areas[:,0])
-    parent_indices = [int(areas[t, choice([0,1,2]) + 1]) for t in triangle_indices]
-    return parent_indices
+    best = np.argsort(areas, kind="stable")[-num_best_triangles:]
+    areas = areas[best] / areas[best].sum()
+    triangles = triang.simplices[best[choice(num_best_triangles, num_parents, p=areas)]]
+    parent_indices = triangles[np.arange(num_parents), choice(3, num_parents)]
+    return [int(i) for i in parent_indices]
+
+class IncrementalTriangulation(object):
+    """triangulation of the materials in property space, kept up to date as materials are added
+    instead of being rebuilt from every material for each selection.
+
+    In 'simplices' mode, this is a Delaunay triangulation built with Qhull in incremental mode.
+    Incremental mode can't use Qhull's Qz option, without which inputs with many cocircular points
+    (e.g. materials on a regular grid) can fail; these are triangulated from scratch, with Qz,
+    until a triangulation in incremental mode succeeds again.
+    In 'hull' mode only the convex hull is needed, so only the points on the hull are kept: each
+    update builds the hull of the previous hull's points and the new points, and its size does not
+    grow with the number of materials. Points that lie on a hull edge (e.g. the many materials with
+    a loading of exactly 0) are kept as hull points, splitting the edge, as in the boundary of a
+    Delaunay triangulation of all points.
+    """
+
+    def __init__(self, box_range, simplices_or_hull):
+        if simplices_or_hull not in ['simplices', 'hull']:
+            raise(Exception("simplices_or_hull must be defined as 'simplices' or 'hull'"))
+        self.simplices_or_hull = simplices_or_hull
+        box_range = np.asarray(box_range, dtype=float)
+        self.num_points = len(box_range)
+        if simplices_or_hull == 'simplices':
+            self._triangulate(box_range)
+        else:
+            self._update_hull(box_range, np.arange(len(box_range)))
+
+    def _triangulate(self, points):
+        try:
+            self.triang = Delaunay(points, incremental=True)
+            self.incremental = True
+        except QhullError:
+            self.triang = Delaunay(points, qhull_options="Qbb Qc Qz")
+            self.incremental = False
+
+    def _update_hull(self, points, indices):
+        hull = ConvexHull(points)
+        # points on the hull's boundary, i.e. on the line of any of its edges, in index order; of
+        # duplicate points, only the first is kept
+        distances = points @ hull.equations[:, :-1].T + hull.equations[:, -1]
+        on_hull = np.flatnonzero(distances.max(axis=1) >= -1e-12 * np.abs(points).max())
+        on_hull = on_hull[np.argsort(indices[on_hull])]
+        on_hull = on_hull[np.sort(np.unique(points[on_hull], axis=0, return_index=True)[1])]
+        self.hull_points = points[on_hull]
+        self.hull_indices = indices[on_hull]
+        # hull edges, as indices into hull_points: consecutive points by angle around the hull
+        offsets = self.hull_points - points[hull.vertices].mean(axis=0)
+        order = np.argsort(np.arctan2(offsets[:, 1], offsets[:, 0]))
+        self.hull_edges = np.column_stack((order, np.roll(order, -1)))
+
+    def add_points(self, box_range):
+        box_range = np.asarray(box_range, dtype=float)
+        indices = np.arange(self.num_points, self.num_points + len(box_range))
+        self.num_points += len(box_range)
+        if self.simplices_or_hull == 'simplices':
+            points = np.concatenate((self.triang.points, box_range))
+            if self.incremental:
+                try:
+                    self.triang.add_points(box_range)
+                    return
+                except QhullError:
+                    pass
+            self._triangulate(points)
+        else:
+            self._update_hull(np.concatenate((self.hull_points, box_range)),
+                              np.concatenate((self.hull_indices, indices)))
 
+    def choose_parents(self, num_parents):
+        """returns the indices of num_parents parents."""
+        if self.simplices_or_hull == 'simplices':
+            return choose_parents_simplices(self.triang, self.triang.points, num_parents, num_parents)
+        else:
+            parent_indices = choose_parents_from_hull_edges(self.hull_edges, self.hull_points, num_parents)
+            return sorted(int(i) for i in self.hull_indices[parent_indices])
 
-def choose_parents(num_parents, box_d, box_range, simplices_or_hull):
-    triang = Delaunay(box_range)
-    if simplices_or_hull == 'simplices':
-        parent_indices = choose_parents_simplices(triang, box_range, num_parents, num_parents)
-    elif simplices_or_hull == 'hull':
-        parent_indices = choose_parents_hull(triang, box_range, num_parents)
-    else:
-        raise(Exception("simplices_or_hull must be defined as 'simplices' or 'hull'"))
+def choose_parents(num_parents, box_d, box_range, simplices_or_hull, triangulation=None):
+    """chooses parents from the triangulation of the materials in box_range. If an up to date
+    IncrementalTriangulation is passed, it is used instead of triangulating box_range again."""
+    if triangulation is None:
+        triangulation = IncrementalTriangulation(box_range, simplices_or_hull)
+    parent_indices = triangulation.choose_parents(num_parents)
 
     return [box_d[i] for i in parent_indices], [box_range[i] for i in parent_indices]
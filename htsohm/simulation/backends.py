@@ -0,0 +1,109 @@
+from importlib import import_module
+
+# entry point group for simulation backends from other packages. Entry points are named
+# "<simulation type>.<backend>", e.g.
+#   entry_points={"htsohm.simulation_backends": ["gas_loading.surrogate = mypackage.surrogate"]}
+# selects mypackage.surrogate for gas_loading simulations with `backend: surrogate`.
+ENTRY_POINT_GROUP = "htsohm.simulation_backends"
+
+# modules of the built-in backends, by (simulation type, backend). The simulate modules handle both
+# of their backends, based on the simulation config's `backend`.
+BUILTIN_BACKENDS = {
+    ("void_fraction", "raspa"):     "htsohm.simulation.simulate.void_fraction",
+    ("void_fraction", "native"):    "htsohm.simulation.simulate.void_fraction",
+    ("gas_loading", "raspa"):       "htsohm.simulation.simulate.gas_loading",
+    ("gas_loading", "native"):      "htsohm.simulation.simulate.gas_loading",
+    ("surface_area", "raspa"):      "htsohm.simulation.simulate.surface_area",
+}
+
+# loaded backends, by (simulation type, backend)
+__backends__ = {}
+
+def _entry_points():
+    # imported here so that the entry point machinery is only loaded when backends are looked up
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        # python < 3.8
+        from importlib_metadata import entry_points
+    eps = entry_points()
+    if hasattr(eps, "select"):
+        return eps.select(group=ENTRY_POINT_GROUP)
+    return eps.get(ENTRY_POINT_GROUP, [])
+
+def available_backends():
+    """returns the names of the built-in and installed backends, as a set of (simulation type,
+    backend) tuples."""
+    names = set(BUILTIN_BACKENDS)
+    for ep in _entry_points():
+        names.add(tuple(ep.name.split(".", 1)))
+    return names
+
+def get_backend(simulation_config):
+    """returns the backend for a simulation config, selected by its `type` and `backend` (default:
+    "raspa").
+
+    A backend is any object (usually a module) with these functions:
+        prepare(material, simulation_config, config) -> job: writes input files or sets up the
+            simulation; the job is passed on to execute and parse.
+        execute(job) -> output: runs the simulation.
+        parse(job, output): adds the results to the material and cleans up.
+        estimate_cost(material, simulation_config) -> float: rough estimate of the CPU seconds the
+            simulation takes.
+    and, optionally:
+        skip(material, simulation_config) -> bool: sets the results without running the
+            simulation, and returns True, if earlier results already decide them.
+        DEPENDS_ON: simulation types that have to run first.
+
+    Built-in backends take precedence over entry points with the same name.
+    """
+    key = (simulation_config["type"], simulation_config.get("backend", "raspa"))
+    if key not in __backends__:
+        if key in BUILTIN_BACKENDS:
+            __backends__[key] = import_module(BUILTIN_BACKENDS[key])
+        else:
+            eps = [ep for ep in _entry_points() if tuple(ep.name.split(".", 1)) == key]
+            if len(eps) == 0:
+                raise ValueError("no %s backend for %s simulations; available backends: %s" %
+                                 (key[1], key[0], ", ".join(sorted(".".join(n) for n in available_backends()))))
+            __backends__[key] = eps[0].load()
+    return __backends__[key]
+
+def estimated_cost(material, simulation_config):
+    """returns the simulation config's `estimated_cost`, if it is set, or else the backend's
+    estimate of the CPU seconds the simulation takes."""
+    if "estimated_cost" in simulation_config:
+        return simulation_config["estimated_cost"]
+    return get_backend(simulation_config).estimate_cost(material, simulation_config)
+
+def schedule_simulations(material, simulation_configs):
+    """returns the simulation configs in the order they should be run: cheapest first, except that
+    a simulation never runs before a simulation of a type that it depends on. Simulations with the
+    same cost keep their order.
+    """
+    pending = [(config, estimated_cost(material, config)) for config in simulation_configs]
+    scheduled = []
+    while len(pending) > 0:
+        pending_types = [config["type"] for config, _ in pending]
+        ready = [i for i, (config, _) in enumerate(pending)
+                 if not any(t in pending_types and t != config["type"]
+                            for t in getattr(get_backend(config), "DEPENDS_ON", []))]
+        if len(ready) == 0:
+            # circular dependencies: run in config order
+            ready = list(range(len(pending)))
+        i = min(ready, key=lambda i: pending[i][1])
+        scheduled.append(pending.pop(i)[0])
+    return scheduled
+
+def run_simulation(material, simulation_config, config):
+    """runs a simulation with its backend, unless the backend decides to skip it.
+
+    Returns:
+        True if the simulation was run, False if it was skipped.
+    """
+    backend = get_backend(simulation_config)
+    if hasattr(backend, "skip") and backend.skip(material, simulation_config):
+        return False
+    job = backend.prepare(material, simulation_config, config)
+    backend.parse(job, backend.execute(job))
+    return True
@@ -1,9 +1,53 @@
 import os
 
+# Lennard-Jones pseudo atoms of the adsorbates: name, epsilon [K], sigma [Angstrom]
+ADSORBATE_LJ_ATOMS = [
+        ['N_n2',    36.0,       3.31],
+        ['C_co2',   27.0,       2.80],
+        ['O_co2',   79.0,       3.05],
+        ['CH4_sp3', 158.5,      3.72],
+        ['He',      10.9,       2.64],
+        ['H_com',   36.7,       2.958],
+        ['Kr',      167.06,     3.924],
+        ['Xe',      110.704,    3.690]
+]
+
+# the pseudo atom of each adsorbate (TraPPE molecule definition) that is a single LJ site
+SINGLE_SITE_ADSORBATES = {'helium': 'He', 'methane': 'CH4_sp3', 'krypton': 'Kr', 'xenon': 'Xe'}
+
+def adsorbate_lj_parameters(adsorbate):
+    """returns the (epsilon [K], sigma [Angstrom]) of a single-site adsorbate, by molecule name
+    (e.g. "helium") or pseudo atom name (e.g. "He")."""
+    name = SINGLE_SITE_ADSORBATES.get(adsorbate, adsorbate)
+    for atom_name, epsilon, sigma in ADSORBATE_LJ_ATOMS:
+        if atom_name == name:
+            return epsilon, sigma
+    raise ValueError("%s is not a single-site Lennard-Jones adsorbate; use one of %s" %
+                     (adsorbate, ", ".join(sorted(SINGLE_SITE_ADSORBATES))))
+
+# critical temperature [K], critical pressure [Pa] and acentric factor of the single-site
+# adsorbates, which RASPA uses to calculate their fugacity with the Peng-Robinson equation of state
+ADSORBATE_CRITICAL_CONSTANTS = {
+        'helium':   (5.2,       228000.0,   -0.39),
+        'methane':  (190.564,   4599200.0,  0.01142),
+        'krypton':  (209.48,    5525000.0,  0.0),
+        'xenon':    (289.733,   5842000.0,  0.0)
+}
+
+def adsorbate_critical_constants(adsorbate):
+    """returns the (critical temperature [K], critical pressure [Pa], acentric factor) of a
+    single-site adsorbate, by molecule name (e.g. "methane") or pseudo atom name (e.g. "CH4_sp3")."""
+    for name, atom_name in SINGLE_SITE_ADSORBATES.items():
+        if adsorbate in (name, atom_name):
+            return ADSORBATE_CRITICAL_CONSTANTS[name]
+    raise ValueError("%s is not a single-site Lennard-Jones adsorbate; use one of %s" %
+                     (adsorbate, ", ".join(sorted(SINGLE_SITE_ADSORBATES))))
+
 def write_mol_file(material, simulation_path):
     """Writes .mol file for structural information."""
 
     s = material.structure
+    sa = s.arrays
 
     file_name = os.path.join(simulation_path, "{}.mol".format(material.uuid))
     with open(file_name, "w") as mol_file:
@@ -11,13 +55,12 @@ def write_mol_file(material, simulation_path):
                 " Molecule_name: {}\n".format(material.uuid) +
                 "\n" +
                 "  Coord_Info: Listed Cartesian None\n" +
-                "        {}\n".format(len(s.atom_sites)))
-        for i in range(len(s.atom_sites)):
-            a = s.atom_sites[i]
-            mol_file.write(
-                    "{:6} {:10.4f} {:10.4f} {:10.4f}  {:5} {:10.8f}  0  0\n".format(
-                        i + 1, round(a.x * s.a, 4), round(a.y * s.b, 4), round(a.z * s.c, 4),
-                        str(a.atom_types.atom_type_index()), round(a.q, 8)))
+                "        {}\n".format(len(sa)))
+        mol_file.write("".join([
+            "{:6} {:10.4f} {:10.4f} {:10.4f}  {:5} {:10.8f}  0  0\n".format(
+                i + 1, round(x, 4), round(y, 4), round(z, 4), str(t), round(q, 8))
+            for i, ((x, y, z), t, q) in enumerate(zip(sa.cartesian.tolist(), sa.type_index.tolist(),
+                                                     sa.charge.tolist()))]))
         mol_file.write(
                 "\n" +
                 "\n" +
@@ -33,17 +76,6 @@ def write_mol_file(material, simulation_path):
 
 def write_mixing_rules(structure, simulation_path):
     """Writes .def file for forcefield information."""
-    adsorbate_LJ_atoms = [
-            ['N_n2',    36.0,       3.31],
-            ['C_co2',   27.0,       2.80],
-            ['O_co2',   79.0,       3.05],
-            ['CH4_sp3', 158.5,      3.72],
-            ['He',      10.9,       2.64],
-            ['H_com',   36.7,       2.958],
-            ['Kr',      167.06,     3.924],
-            ['Xe',      110.704,    3.690]
-    ]
-
     adsorbate_none_atoms = ['N_com', 'H_h2']
 
     file_name = os.path.join(simulation_path, 'force_field_mixing_rules.def')
@@ -59,11 +91,11 @@ def write_mixing_rules(structure, simulation_path):
             "IMPORTANT: define shortest matches first, so" +
             " that more specific ones overwrites these\n"
         )
-        for lj in structure.atom_types:
+        sa = structure.arrays
+        for i, (epsilon, sigma) in enumerate(zip(sa.epsilon.tolist(), sa.sigma.tolist())):
             mixing_rules_file.write(
-                "{0:12} lennard-jones {1:8f} {2:8f}\n".format(lj.atom_type_index(),
-                    round(lj.epsilon, 4), round(lj.sigma, 4)))
-        for at in adsorbate_LJ_atoms:
+                "{0:12} lennard-jones {1:8f} {2:8f}\n".format(i, round(epsilon, 4), round(sigma, 4)))
+        for at in ADSORBATE_LJ_ATOMS:
             mixing_rules_file.write(
                 "{0:12} lennard-jones {1:8f} {2:8f}\n".format(at[0], at[1], at[2])
             )
@@ -94,10 +126,10 @@ def write_pseudo_atoms(structure, simulation_path):
             "%s\n" % (len(structure.atom_types) + 10) +
             "#type  print   as  chem    oxidation   mass    charge  polarization    B-factor    radii   " +
                  "connectivity  anisotropic anisotrop-type  tinker-type\n")
-        for a in structure.atom_types:
+        for i in range(len(structure.arrays.sigma)):
             pseudo_atoms_file.write(
                 "{0:7}  yes  C   C   0   12.0       0.0  0.0  1.0  1.0    0  0  absolute  0\n".format(
-                    str(a.atom_type_index())))
+                    str(i)))
         pseudo_atoms_file.write(
             "N_n2     yes  N   N   0   14.00674   -0.4048   0.0  1.0  0.7    0  0  relative  0\n" +
             "N_com    no   N   -   0    0.0        0.8096   0.0  1.0  0.7    0  0  relative  0\n" +
@@ -1,7 +1,7 @@
-
 from datetime import datetime
+import time
 
-from htsohm.simulation import simulate
+from htsohm.simulation.backends import estimated_cost, run_simulation, schedule_simulations
 from htsohm.slog import slog
 
 def run_all_simulations(material, config):
@@ -13,14 +13,27 @@ def run_all_simulations(material, config):
     Depending on properties specified in config, adds simulated data for helium
     void fraction, gas loading, heat of adsorption, surface area, and
     corresponding bins to row in database corresponding to the input-material.
+    Structure properties that are expensive to derive (the site distribution) are also stored
+    on the material, so that they don't need to be recalculated when exporting.
+
+    Each simulation is run by the backend for its type and `backend` (see
+    `htsohm.simulation.backends`). Simulations run in config order by default. If
+    `simulation_order` is "cost", the cheapest simulations run first instead, so that expensive
+    ones can be skipped when earlier results already decide them.
     """
     slog("-----------------------------------------------")
-    for simulation_number in config["simulations"]:
+    material.site_distribution = material.structure.site_distribution
+    simulation_configs = list(config["simulations"].values())
+    if config.get("simulation_order", "config") == "cost":
+        simulation_configs = schedule_simulations(material, simulation_configs)
 
-        simulation_config = config["simulations"][simulation_number]
+    for simulation_config in simulation_configs:
         slog('Time             : {:%Y-%m-%d %H:%M:%S}'.format(datetime.now()))
-        slog("Simulation type  : {}".format(simulation_config["type"]))
-        getattr(simulate, simulation_config["type"]).run(material, simulation_config, config)
+        slog("Simulation type  : {} ({})".format(simulation_config["type"], simulation_config.get("backend", "raspa")))
+        slog("Estimated cost   : %5.2f seconds" % estimated_cost(material, simulation_config))
+        tbegin = time.perf_counter()
+        if run_simulation(material, simulation_config, config):
+            slog("Simulation time  : %5.2f seconds" % (time.perf_counter() - tbegin))
         slog("--")
 
     slog('{:%Y-%m-%d %H:%M:%S}'.format(datetime.now()))
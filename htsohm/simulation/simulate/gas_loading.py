@@ -7,14 +7,18 @@ import subprocess
 import shutil
 from string import Template
 import sys
+import time
 from uuid import uuid4
 
 import numpy as np
 
 from htsohm.simulation.raspa import write_mol_file, write_mixing_rules
 from htsohm.simulation.raspa import write_pseudo_atoms, write_force_field
+from htsohm.simulation.raspa import adsorbate_lj_parameters, adsorbate_critical_constants
 from htsohm.simulation.templates import load_and_subs_template
 from htsohm.db import GasLoading
+from htsohm.energy_grid import load_energy_grid
+from htsohm.gcmc import GCMC, molecules_to_volumetric_loading, peng_robinson_fugacity_coefficient
 from htsohm.slog import slog
 
 def write_raspa_file(filename, material, simulation_config, restart):
@@ -114,25 +118,115 @@ def pressure_string(p):
     else:
         return str(p)
 
-def run(material, simulation_config, config):
-    """Runs gas loading simulation.
+def start_native_gcmc(material, simulation_config):
+    """Sets up an in-process GCMC simulation of a single-site adsorbate, instead of RASPA, and runs
+    its `initialization_cycles` cycles.
+
+    Uses the same config keys as the RASPA simulation: `adsorbate`, `temperature`, `pressure` and
+    `cutoff`. The fugacity is calculated with the Peng-Robinson equation of state, like RASPA does.
+    Framework energies are interpolated from an energy grid with `energy_grid_spacing` (default:
+    0.4 Angstrom), cached in `energy_grid_cache_dir` if that is set (see
+    `htsohm.energy_grid.load_energy_grid`).
 
     Args:
-        material_id (Material): material record.
+        material (Material): material record.
+        simulation_config (dict): gas loading simulation config.
 
     Returns:
-        results (dict): gas loading simulation results.
+        GCMC simulation (see `htsohm.gcmc.GCMC`).
+    """
+    adsorbate = simulation_config["adsorbate"]
+    temperature = simulation_config["temperature"]
+    pressure = simulation_config["pressure"]
+    epsilon, sigma = adsorbate_lj_parameters(adsorbate)
+    fugacity = pressure * peng_robinson_fugacity_coefficient(temperature, pressure,
+                                                            *adsorbate_critical_constants(adsorbate))
+
+    energy_grid = load_energy_grid(material.structure.arrays, sigma, epsilon, simulation_config["cutoff"],
+                                   simulation_config.get("energy_grid_spacing", 0.4),
+                                   simulation_config.get("energy_grid_cache_dir"))
+    gcmc = GCMC(energy_grid, material.structure.minimum_unit_cells(simulation_config["cutoff"]),
+                sigma, epsilon, temperature, fugacity, simulation_config["cutoff"])
+    gcmc.run(simulation_config["initialization_cycles"], equilibrate=True)
+    return gcmc
+
+# the RASPA input file uses the material's helium void fraction, and `skip` uses the void fraction
+DEPENDS_ON = ["void_fraction"]
+
+def estimate_cost(material, simulation_config):
+    """Returns a rough estimate of the CPU seconds the simulation takes without restarts, for
+    scheduling cheap simulations first.
+
+    Every cycle has at least 20 moves. RASPA sums the energy of each move over the framework atoms
+    in the supercell, at about 2e-7 seconds per atom; the native engine takes about 2e-4 seconds
+    per move, plus the time to calculate the energy grid.
+    """
+    cycles = simulation_config["initialization_cycles"] + simulation_config["simulation_cycles"]
+    if simulation_config.get("backend", "raspa") == "native":
+        return cycles * 20 * 2e-4
+    unit_cells = material.structure.minimum_unit_cells(simulation_config["cutoff"])
+    num_atoms = len(material.structure.atom_sites) * unit_cells[0] * unit_cells[1] * unit_cells[2]
+    return cycles * 20 * 2e-7 * num_atoms
+
+def skip(material, simulation_config):
+    """Records a zero loading without running the simulation, if the simulation config sets
+    `skip_below_void_fraction` and the material's void fraction is lower than that; adsorbates
+    can't get into materials without pore space.
 
+    Returns:
+        True if the simulation was skipped.
+    """
+    if "skip_below_void_fraction" not in simulation_config or len(material.void_fraction) == 0:
+        return False
+    void_fraction = material.void_fraction[0].get_void_fraction()
+    if void_fraction is None or void_fraction >= simulation_config["skip_below_void_fraction"]:
+        return False
+
+    slog("Skipping gas loading: void fraction %f < %f" % (void_fraction, simulation_config["skip_below_void_fraction"]))
+    material.gas_loading.append(GasLoading(adsorbate=simulation_config["adsorbate"],
+                                           pressure=simulation_config["pressure"],
+                                           temperature=simulation_config["temperature"], cycles=0,
+                                           absolute_volumetric_loading=0.0,
+                                           absolute_volumetric_loading_error=0.0))
+    return True
+
+def prepare(material, simulation_config, config):
+    """Prepares a gas loading simulation: writes the RASPA input files, for the first run and for
+    restarts, if RASPA is used or `keep_configs` is set.
+
+    Returns:
+        job (dict): the material, the configs and the output directory, for `execute` and `parse`.
     """
     adsorbate = simulation_config["adsorbate"]
     output_dir = "output_{}_{}".format(material.uuid, uuid4())
-    os.makedirs(output_dir, exist_ok=True)
     raspa_config = "./{}_loading.input".format(adsorbate)
     raspa_restart_config = "./{}_loading_restart.input".format(adsorbate)
 
     # RASPA input-files
-    write_output_files(material, simulation_config, output_dir, restart=False, filename=os.path.join(output_dir, raspa_config))
-    write_output_files(material, simulation_config, output_dir, restart=True, filename=os.path.join(output_dir, raspa_restart_config))
+    if simulation_config.get("backend", "raspa") == "raspa" or config['keep_configs']:
+        os.makedirs(output_dir, exist_ok=True)
+        write_output_files(material, simulation_config, output_dir, restart=False, filename=os.path.join(output_dir, raspa_config))
+        write_output_files(material, simulation_config, output_dir, restart=True, filename=os.path.join(output_dir, raspa_restart_config))
+    return {"material": material, "simulation_config": simulation_config, "config": config,
+            "output_dir": output_dir}
+
+def execute(job):
+    """Runs the gas loading simulation of a prepared job.
+
+    The loading is simulated with RASPA, or in-process if the simulation config sets `backend:
+    native` (see `start_native_gcmc`). Either way, the simulation is continued for another
+    `simulation_cycles` cycles, up to `max_restarts` times, until the error of the loading is below
+    `restart_err_threshold`; RASPA's output is parsed after every run to decide whether to restart.
+
+    Returns:
+        GasLoading record.
+    """
+    material, simulation_config = job["material"], job["simulation_config"]
+    adsorbate = simulation_config["adsorbate"]
+    backend = simulation_config.get("backend", "raspa")
+    output_dir = job["output_dir"]
+    raspa_config = "./{}_loading.input".format(adsorbate)
+    raspa_restart_config = "./{}_loading_restart.input".format(adsorbate)
 
     # Run simulations
     slog("Adsorbate        : {}".format(adsorbate))
@@ -143,22 +237,34 @@ def run(material, simulation_config, config):
     total_unit_cells = unit_cells[0] * unit_cells[1] * unit_cells[2]
     all_atom_blocks = []
 
-    process = subprocess.run(["simulate", "-i", raspa_config], check=True, cwd=output_dir, capture_output=True, text=True)
-    slog(process.stdout)
+    tbegin = time.perf_counter()
+    if backend == "native":
+        gcmc = start_native_gcmc(material, simulation_config)
+        atoms_uc_to_vv = molecules_to_volumetric_loading(material.structure.volume)
+    else:
+        process = subprocess.run(["simulate", "-i", raspa_config], check=True, cwd=output_dir, capture_output=True, text=True)
+        slog(process.stdout)
     for i in range(simulation_config['max_restarts'] + 1):
 
-        data_files = glob(os.path.join(output_dir, "Output", "System_0", "*.data"))
-        if len(data_files) != 1:
-            raise Exception("ERROR: There should only be one data file in the output directory for %s. Check code!" % output_dir)
-        output_file = data_files[0]
+        if backend == "native":
+            gas_loading = GasLoading(adsorbate=adsorbate, pressure=simulation_config["pressure"],
+                                     temperature=simulation_config["temperature"])
+            atom_blocks = gcmc.run(simulation_config["simulation_cycles"])
+        else:
+            data_files = glob(os.path.join(output_dir, "Output", "System_0", "*.data"))
+            if len(data_files) != 1:
+                raise Exception("ERROR: There should only be one data file in the output directory for %s. Check code!" % output_dir)
+            output_file = data_files[0]
+
+            # Parse output
+            gas_loading, atom_blocks, atoms_uc_to_vv = parse_output(output_file, material, simulation_config)
 
-        # Parse output
-        gas_loading, atom_blocks, atoms_uc_to_vv = parse_output(output_file, material, simulation_config)
         atom_blocks = [a * atoms_uc_to_vv / total_unit_cells for a in atom_blocks]
         slog("new blocks for averaging [v/v]: ", atom_blocks)
         slog("atoms_uc_to_vv = %f" % atoms_uc_to_vv)
-        slog("reported V/V: %f" % gas_loading.absolute_volumetric_loading)
-        slog("reported err: %f" % gas_loading.absolute_volumetric_loading_error)
+        if backend == "raspa":
+            slog("reported V/V: %f" % gas_loading.absolute_volumetric_loading)
+            slog("reported err: %f" % gas_loading.absolute_volumetric_loading_error)
 
 
         all_atom_blocks += atom_blocks
@@ -181,16 +287,17 @@ def run(material, simulation_config, config):
         slog("calculated V/V: %f" % gas_loading.absolute_volumetric_loading)
         slog("calculated error: %f" % error_vv)
 
-        slog("Copying restart to RestartInitial...")
-        # remove old RestartInitial directory and copy the current one to there
-        shutil.rmtree(os.path.join(output_dir, "RestartInitial"), ignore_errors=True)
-        shutil.copytree(os.path.join(output_dir, "Restart"), os.path.join(output_dir, "RestartInitial"))
+        if backend == "raspa":
+            slog("Copying restart to RestartInitial...")
+            # remove old RestartInitial directory and copy the current one to there
+            shutil.rmtree(os.path.join(output_dir, "RestartInitial"), ignore_errors=True)
+            shutil.copytree(os.path.join(output_dir, "Restart"), os.path.join(output_dir, "RestartInitial"))
 
-        slog("Moving backup RASPA outputs to restart index")
-        shutil.move(os.path.join(output_dir, "Output"), os.path.join(output_dir, "Output-%d" % i))
-        shutil.move(os.path.join(output_dir, "Restart"), os.path.join(output_dir, "Restart-%d" % i))
-        shutil.move(os.path.join(output_dir, "Movies"), os.path.join(output_dir, "Movies-%d" % i))
-        shutil.move(os.path.join(output_dir, "VTK"), os.path.join(output_dir, "VTK-%d" % i))
+            slog("Moving backup RASPA outputs to restart index")
+            shutil.move(os.path.join(output_dir, "Output"), os.path.join(output_dir, "Output-%d" % i))
+            shutil.move(os.path.join(output_dir, "Restart"), os.path.join(output_dir, "Restart-%d" % i))
+            shutil.move(os.path.join(output_dir, "Movies"), os.path.join(output_dir, "Movies-%d" % i))
+            shutil.move(os.path.join(output_dir, "VTK"), os.path.join(output_dir, "VTK-%d" % i))
 
         gas_loading.cycles = simulation_config['simulation_cycles'] * (i + 1)
         if (gas_loading.absolute_volumetric_loading_error < simulation_config['restart_err_threshold']):
@@ -205,14 +312,37 @@ def run(material, simulation_config, config):
         else:
             slog("\n--")
             slog("restart # %d" % i)
-            process = subprocess.run(["simulate", "-i", raspa_restart_config], check=True, cwd=output_dir, capture_output=True, text=True)
-            slog(process.stdout)
+            if backend == "raspa":
+                process = subprocess.run(["simulate", "-i", raspa_restart_config], check=True, cwd=output_dir, capture_output=True, text=True)
+                slog(process.stdout)
 
+    slog("%s gas loading simulation time: %5.2f seconds" % (backend.upper(), time.perf_counter() - tbegin))
+    if backend == "native":
+        slog("NATIVE {} LOADING : {} v/v (STP)".format(adsorbate, gas_loading.absolute_volumetric_loading))
+        if material.parent:
+            slog("(parent LOADING : {} v/v (STP))".format(material.parent.gas_loading[0].absolute_volumetric_loading))
+    return gas_loading
 
+def parse(job, gas_loading):
+    """Adds the gas loading of an executed job to the material and removes the output directory
+    unless `keep_configs` is set."""
+    job["material"].gas_loading.append(gas_loading)
 
+    if not job["config"]['keep_configs']:
+        shutil.rmtree(job["output_dir"], ignore_errors=True)
+    sys.stdout.flush()
 
-    material.gas_loading.append(gas_loading)
+def run(material, simulation_config, config):
+    """Runs gas loading simulation.
 
-    if not config['keep_configs']:
-        shutil.rmtree(output_dir, ignore_errors=True)
-    sys.stdout.flush()
+    Args:
+        material_id (Material): material record.
+
+    RASPA input files are only written for the native backend if `keep_configs` is set.
+
+    Returns:
+        results (dict): gas loading simulation results.
+
+    """
+    job = prepare(material, simulation_config, config)
+    parse(job, execute(job))
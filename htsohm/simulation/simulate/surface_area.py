@@ -84,42 +84,67 @@ def parse_output(output_file, material, simulation_config):
 
     material.surface_area.append(surface_area)
 
-def run(material, simulation_config, config):
-    """Runs surface area simulation.
+def estimate_cost(material, simulation_config):
+    """Returns a rough estimate of the CPU seconds the simulation takes, for scheduling cheap
+    simulations first: RASPA samples about 1e-6 seconds per framework atom per cycle."""
+    return simulation_config["simulation_cycles"] * len(material.structure.atom_sites) * 1e-6
 
-    Args:
-        material (Material): material record.
+def prepare(material, simulation_config, config):
+    """Prepares a surface area simulation: writes the RASPA input files.
 
     Returns:
-        results (dict): surface area simulation results.
-
+        job (dict): the material, the configs and the output directory, for `execute` and `parse`.
     """
     output_dir = "output_{}_{}".format(material.uuid, uuid4())
     slog("Output directory :\t{}".format(output_dir))
     os.makedirs(output_dir, exist_ok=True)
 
     # Write simulation input-files
-    write_output_files(filename, material, simulation_config)
+    write_output_files(material, simulation_config, output_dir)
+    return {"material": material, "simulation_config": simulation_config, "config": config,
+            "output_dir": output_dir}
 
-    # Run simulations
+def execute(job):
+    """Runs RASPA for a prepared job, until it writes its output file. RASPA runs that fail with
+    a FileNotFoundError or KeyError are logged and retried.
+
+    Returns:
+        path of the RASPA output file.
+    """
+    material, simulation_config = job["material"], job["simulation_config"]
     while True:
         try:
             slog("Probe            : {}".format(simulation_config["adsorbate"]))
             filename = "output_{}_2.2.2_298.000000_0.data".format(material.uuid)
-            output_file = os.path.join(output_dir, "Output", "System_0", filename)
+            output_file = os.path.join(job["output_dir"], "Output", "System_0", filename)
 
             while not Path(output_file).exists():
                 process = subprocess.run(["simulate", "-i", "./SurfaceArea.input"], check=True,
-                        cwd=output_dir, capture_output=True, text=True)
+                        cwd=job["output_dir"], capture_output=True, text=True)
                 slog(process.stdout)
-
-            # Parse output
-            parse_output(output_file, material, simulation_config)
-            if not config['keep_configs']:
-                shutil.rmtree(output_dir, ignore_errors=True)
-            sys.stdout.flush()
         except (FileNotFoundError, KeyError) as err:
             slog(err)
             slog(err.args)
             continue
-        break
+        return output_file
+
+def parse(job, output_file):
+    """Parses the RASPA output of an executed job into the material's surface area and removes the
+    output directory unless `keep_configs` is set."""
+    parse_output(output_file, job["material"], job["simulation_config"])
+    if not job["config"]['keep_configs']:
+        shutil.rmtree(job["output_dir"], ignore_errors=True)
+    sys.stdout.flush()
+
+def run(material, simulation_config, config):
+    """Runs surface area simulation.
+
+    Args:
+        material (Material): material record.
+
+    Returns:
+        results (dict): surface area simulation results.
+
+    """
+    job = prepare(material, simulation_config, config)
+    parse(job, execute(job))
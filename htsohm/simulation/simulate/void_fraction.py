@@ -1,4 +1,5 @@
 
+from collections import Counter, OrderedDict
 from glob import glob
 import math
 import os
@@ -12,13 +13,29 @@ from uuid import uuid4
 from string import Template
 from pathlib import Path
 
+import numpy as np
+
 from htsohm.simulation.raspa import write_mol_file, write_mixing_rules
-from htsohm.simulation.raspa import write_pseudo_atoms, write_force_field
+from htsohm.simulation.raspa import write_pseudo_atoms, write_force_field, adsorbate_lj_parameters
 from htsohm.simulation.templates import load_and_subs_template
 from htsohm.db import VoidFraction
-from htsohm.void_fraction import calculate_void_fraction
+from htsohm.energy_grid import load_energy_grid
+from htsohm.void_fraction import calculate_void_fraction, calculate_void_fraction_loop
+from htsohm.void_fraction import calculate_void_fractions, structure_atoms
+from htsohm.void_fraction import estimate_void_fraction_mc, estimate_void_fraction_octree
+from htsohm.void_fraction import coverage_grid, update_coverage_grid, void_fraction_from_coverage
+from htsohm.widom import widom_void_fraction
 from htsohm.slog import slog
 
+# coverage grids of recently simulated materials, keyed by material uuid; used for incremental
+# geometric void fraction calculations. Each worker process has its own cache.
+__coverage_cache__ = OrderedDict()
+# total size, in bytes, of the coverage grids in __coverage_cache__
+__coverage_cache_bytes__ = 0
+
+# geometric void fractions calculated ahead of time for a batch of materials, keyed by material uuid
+__precalculated_geo__ = {}
+
 def write_raspa_file(filename, material, simulation_config):
     """Writes RASPA input file for calculating helium void fraction.
 
@@ -80,23 +97,256 @@ def parse_output(output_file, material, void_fraction):
             void_fraction.void_fraction = float(line.split()[4])
 
 
-def run(material, simulation_config, config):
-    """Runs void fraction simulation.
+def calculate_widom_void_fraction(material, simulation_config):
+    """Calculates the helium void fraction of a material in-process, by Widom insertion of the
+    adsorbate, instead of with RASPA.
+
+    Uses the same config keys as the RASPA simulation: `adsorbate`, `temperature`, `cutoff` and
+    `simulation_cycles`. The probe is inserted `widom_insertions_per_cycle` (default 200) times per
+    cycle into a supercell of `Structure.minimum_unit_cells(cutoff)` unit cells. If
+    `energy_grid_spacing` is set, the probe's energies are interpolated from an energy grid with
+    that spacing (see `htsohm.energy_grid.load_energy_grid`), cached in `energy_grid_cache_dir`
+    if that is set.
 
     Args:
         material (Material): material record.
+        simulation_config (dict): void fraction simulation config.
 
     Returns:
-        results (dict): void fraction simulation results.
+        tuple of the void fraction (float) and its standard error (float).
+    """
+    probe_epsilon, probe_sigma = adsorbate_lj_parameters(simulation_config["adsorbate"])
+    num_insertions = simulation_config["simulation_cycles"] * simulation_config.get("widom_insertions_per_cycle", 200)
+    energy_grid = None
+    if "energy_grid_spacing" in simulation_config:
+        energy_grid = load_energy_grid(material.structure.arrays, probe_sigma, probe_epsilon,
+                                       simulation_config["cutoff"], simulation_config["energy_grid_spacing"],
+                                       simulation_config.get("energy_grid_cache_dir"))
+    return widom_void_fraction(material.structure.arrays, probe_sigma, probe_epsilon,
+                               simulation_config["temperature"], simulation_config["cutoff"],
+                               material.structure.minimum_unit_cells(simulation_config["cutoff"]),
+                               num_insertions, energy_grid=energy_grid)
+
+def calculate_geo_void_fraction(material, simulation_config):
+    """Calculates the geometric void fraction of a material.
+
+    Args:
+        material (Material): material record.
+        simulation_config (dict): void fraction simulation config. Uses the optional keys
+            `geo_method` ("grid", "monte_carlo" or "octree"; default "grid") and
+            `geo_points_per_angstrom` (default 10). Grid calculations also use `geo_engine`
+            ("numpy" or "loop"), `geo_occupancy` ("float", "bool" or "bits"),
+            `geo_max_memory_mb`, `geo_strategy` ("atom", "point" or "auto") and `geo_incremental`
+            (see `calculate_geo_void_fraction_incremental`). The monte_carlo and octree methods use
+            `geo_target_error` (default 0.001); monte_carlo uses `geo_max_samples` and octree uses
+            `geo_max_depth`.
+
+    Returns:
+        tuple of the void fraction (float) and its error (float), or None for the error if the grid
+        method is used.
+    """
+    atoms, box = structure_atoms(material.structure)
+    probe_r = simulation_config["probe_radius"]
+    points_per_angstrom = simulation_config.get("geo_points_per_angstrom", 10)
+    target_error = simulation_config.get("geo_target_error", 0.001)
+
+    geo_method = simulation_config.get("geo_method", "grid")
+    if geo_method == "monte_carlo":
+        mc_options = {}
+        if "geo_max_samples" in simulation_config:
+            mc_options["max_samples"] = simulation_config["geo_max_samples"]
+        return estimate_void_fraction_mc(atoms, box, probe_r, target_error, **mc_options)
+    elif geo_method == "octree":
+        octree_options = {}
+        if "geo_max_depth" in simulation_config:
+            octree_options["max_depth"] = simulation_config["geo_max_depth"]
+        return estimate_void_fraction_octree(atoms, box, probe_r, target_error, **octree_options)
+
+    if material.uuid in __precalculated_geo__:
+        return __precalculated_geo__.pop(material.uuid), None
+
+    if "geo_incremental" in simulation_config and simulation_config["geo_incremental"]:
+        return calculate_geo_void_fraction_incremental(material, atoms, box, simulation_config), None
+
+    if "geo_engine" in simulation_config and simulation_config["geo_engine"] == "loop":
+        return calculate_void_fraction_loop(atoms, box, points_per_angstrom, probe_r), None
+
+    geo_options = {}
+    if "geo_occupancy" in simulation_config:
+        geo_options["occupancy"] = simulation_config["geo_occupancy"]
+    if "geo_max_memory_mb" in simulation_config:
+        geo_options["max_memory"] = simulation_config["geo_max_memory_mb"] * 2**20
+    if "geo_strategy" in simulation_config:
+        geo_options["strategy"] = simulation_config["geo_strategy"]
+    return calculate_void_fraction(atoms, box, points_per_angstrom, probe_r, **geo_options), None
+
+def precalculate_geo_void_fractions(materials, simulation_config):
+    """Calculates the geometric void fractions of a batch of materials at once.
+
+    The results are kept until `calculate_geo_void_fraction` is called for each material, or until
+    `clear_precalculated_geo_void_fractions` is called. Only
+    plain grid calculations are batched; if the simulation config doesn't calculate geometric void
+    fractions, or uses another method, the incremental mode or the loop engine, nothing is done.
+
+    Args:
+        materials (list): Material records.
+        simulation_config (dict): void fraction simulation config.
+    """
+    if not ("do_geo" in simulation_config and simulation_config["do_geo"]) or \
+            simulation_config.get("geo_method", "grid") != "grid" or \
+            simulation_config.get("geo_incremental", False) or \
+            simulation_config.get("geo_engine", "numpy") == "loop":
+        return
+
+    max_memory = None
+    if "geo_max_memory_mb" in simulation_config:
+        max_memory = simulation_config["geo_max_memory_mb"] * 2**20
+
+    tbegin = time.perf_counter()
+    void_fractions = calculate_void_fractions([m.structure for m in materials],
+                        simulation_config.get("geo_points_per_angstrom", 10),
+                        simulation_config["probe_radius"], max_memory)
+    for material, void_fraction in zip(materials, void_fractions):
+        __precalculated_geo__[material.uuid] = void_fraction
+    slog("GEOMETRIC void fractions for %d materials: %5.2f seconds" % (len(materials), time.perf_counter() - tbegin))
+
+def clear_precalculated_geo_void_fractions():
+    """Discards precalculated geometric void fractions that were never used, e.g. because a
+    simulation of the batch failed."""
+    __precalculated_geo__.clear()
+
+def cache_coverage(uuid, coverage, simulation_config):
+    """Stores a material's coverage grid in the worker cache, evicting the least recently used
+    grids once the cache is larger than `geo_cache_mb` (default: 256 MB). If `geo_cache_dir` is
+    set, the grid is also saved there as a compressed npz file, so that it is available to other
+    workers and later runs."""
+    global __coverage_cache_bytes__
+    if uuid in __coverage_cache__:
+        __coverage_cache_bytes__ -= __coverage_cache__[uuid]["counts"].nbytes
+    __coverage_cache__[uuid] = coverage
+    __coverage_cache__.move_to_end(uuid)
+    __coverage_cache_bytes__ += coverage["counts"].nbytes
+
+    max_bytes = simulation_config.get("geo_cache_mb", 256) * 2**20
+    while __coverage_cache_bytes__ > max_bytes:
+        _, evicted = __coverage_cache__.popitem(last=False)
+        __coverage_cache_bytes__ -= evicted["counts"].nbytes
+
+    if "geo_cache_dir" in simulation_config:
+        os.makedirs(simulation_config["geo_cache_dir"], exist_ok=True)
+        np.savez_compressed(os.path.join(simulation_config["geo_cache_dir"], "%s.npz" % uuid),
+                            counts=coverage["counts"], atoms=np.array(coverage["atoms"]).reshape(-1, 4),
+                            grid=np.array(coverage["grid"]))
+
+def load_coverage(uuid, simulation_config):
+    """Returns a material's coverage grid from the worker cache or from `geo_cache_dir`, or None
+    if it is in neither."""
+    if uuid in __coverage_cache__:
+        __coverage_cache__.move_to_end(uuid)
+        return __coverage_cache__[uuid]
+
+    if "geo_cache_dir" in simulation_config:
+        path = os.path.join(simulation_config["geo_cache_dir"], "%s.npz" % uuid)
+        if os.path.exists(path):
+            with np.load(path) as npz:
+                return {"counts": npz["counts"], "atoms": [tuple(a) for a in npz["atoms"]],
+                        "grid": tuple(npz["grid"])}
+    return None
+
+def calculate_geo_void_fraction_incremental(material, atoms, box, simulation_config):
+    """Calculates the geometric void fraction of a material from its parent's coverage grid.
+
+    Mutated children usually differ from their parent by only a few atom sites. If the parent's
+    coverage grid (see `htsohm.void_fraction.coverage_grid`) is cached and the lattice and probe
+    radius are unchanged, the child's grid is derived from the parent's by removing the parent's
+    atoms that are not in the child and adding the child's atoms that are not in the parent.
+    Otherwise, the grid is calculated from scratch. Either way, the child's grid is cached for its
+    own children. Results are the same as for the atom-centric strategy.
+
+    Args:
+        material (Material): material record.
+        atoms (list): tuples (x, y, z, d) of the material's atoms, in cartesian coordinates.
+        box (tuple): lattice constants of the material.
+        simulation_config (dict): void fraction simulation config.
+
+    Returns:
+        void fraction (float).
+    """
+    points_per_angstrom = simulation_config.get("geo_points_per_angstrom", 10)
+    grid = (*box, points_per_angstrom, simulation_config["probe_radius"])
+
+    parent = None
+    if material.parent:
+        parent = load_coverage(material.parent.uuid, simulation_config)
 
+    counts = None
+    if parent is not None and parent["grid"] == grid:
+        removed = list((Counter(parent["atoms"]) - Counter(atoms)).elements())
+        added = list((Counter(atoms) - Counter(parent["atoms"])).elements())
+        if len(removed) + len(added) < len(atoms):
+            slog("Incremental geometric void fraction: -%d / +%d atoms" % (len(removed), len(added)))
+            counts = parent["counts"].copy()
+            update_coverage_grid(counts, box, points_per_angstrom, simulation_config["probe_radius"],
+                                 added=added, removed=removed)
+
+    if counts is None:
+        counts = coverage_grid(atoms, box, points_per_angstrom, simulation_config["probe_radius"])
+
+    cache_coverage(material.uuid, {"counts": counts, "atoms": atoms, "grid": grid}, simulation_config)
+    return void_fraction_from_coverage(counts)
+
+def estimate_cost(material, simulation_config):
+    """Returns a rough estimate of the CPU seconds the simulation takes, for scheduling cheap
+    simulations first.
+
+    The helium void fraction costs about 1e-7 seconds per framework atom in the supercell per
+    insertion, or 1e-6 seconds per insertion with an energy grid; RASPA inserts the probe 20 times
+    per cycle. Geometric void fractions are cheap in comparison.
     """
+    cost = 0.0
+    if "do_raspa" in simulation_config and simulation_config["do_raspa"]:
+        unit_cells = material.structure.minimum_unit_cells(simulation_config["cutoff"])
+        num_atoms = len(material.structure.atom_sites) * unit_cells[0] * unit_cells[1] * unit_cells[2]
+        if simulation_config.get("backend", "raspa") == "native":
+            insertions = simulation_config["simulation_cycles"] * simulation_config.get("widom_insertions_per_cycle", 200)
+            per_insertion = 1e-6 if "energy_grid_spacing" in simulation_config else 1e-7 * num_atoms
+        else:
+            insertions = simulation_config["simulation_cycles"] * 20
+            per_insertion = 1e-7 * num_atoms
+        cost += insertions * per_insertion
+    if "do_geo" in simulation_config and simulation_config["do_geo"]:
+        cost += 0.1
+    return cost
+
+def prepare(material, simulation_config, config):
+    """Prepares a void fraction simulation: writes the RASPA input files, if RASPA is used or
+    `keep_configs` is set.
+
+    Returns:
+        job (dict): the material, the configs and the output directory, for `execute` and `parse`.
+    """
+    backend = simulation_config.get("backend", "raspa")
     output_dir = "output_{}_{}".format(material.uuid, uuid4())
-    slog("Output directory : {}".format(output_dir))
-    os.makedirs(output_dir, exist_ok=True)
+    if backend == "raspa" or config['keep_configs']:
+        slog("Output directory : {}".format(output_dir))
+        os.makedirs(output_dir, exist_ok=True)
+        write_output_files(material, simulation_config, output_dir)
+    return {"material": material, "simulation_config": simulation_config, "config": config,
+            "output_dir": output_dir}
+
+def execute(job):
+    """Runs the void fraction simulations of a prepared job.
 
-    write_output_files(material, simulation_config, output_dir)
+    The helium void fraction (`do_raspa`) is simulated with RASPA, or in-process if the
+    simulation config sets `backend: native` (see `calculate_widom_void_fraction`).
+
+    Returns:
+        tuple of the VoidFraction record, with the in-process results set, and the path of the
+        RASPA output file, or None if RASPA wasn't run.
+    """
+    material, simulation_config = job["material"], job["simulation_config"]
+    backend = simulation_config.get("backend", "raspa")
 
-    # Run simulations
     slog("Probe            : {}".format(simulation_config["adsorbate"]))
     if "do_geo" in simulation_config:
         slog("Probe radius [geo]: {}".format(simulation_config["probe_radius"]))
@@ -105,38 +355,69 @@ def run(material, simulation_config, config):
     void_fraction = VoidFraction()
     void_fraction.adsorbate = simulation_config["adsorbate"]
     void_fraction.temperature = simulation_config["temperature"]
+    output_file = None
 
-    if "do_raspa" in simulation_config and simulation_config["do_raspa"]:
+    if "do_raspa" in simulation_config and simulation_config["do_raspa"] and backend == "native":
+        tbegin = time.perf_counter()
+        void_fraction.void_fraction, error = calculate_widom_void_fraction(material, simulation_config)
+        slog("NATIVE void fraction simulation time: %5.2f seconds" % (time.perf_counter() - tbegin))
+        slog("NATIVE VOID FRACTION : {} +/- {}".format(void_fraction.void_fraction, error))
+        if material.parent:
+            slog("(parent VOID FRACTION : {})".format(material.parent.void_fraction[0].void_fraction))
+    elif "do_raspa" in simulation_config and simulation_config["do_raspa"]:
         tbegin = time.perf_counter()
+        output_dir = job["output_dir"]
         process = subprocess.run(["simulate", "-i", "./void_fraction.input"], check=True, cwd=output_dir, capture_output=True, text=True)
 
         data_files = glob(os.path.join(output_dir, "Output", "System_0", "*.data"))
         if len(data_files) != 1:
             raise Exception("ERROR: There should only be one data file in the output directory for %s. Check code!" % output_dir)
         output_file = data_files[0]
-
-        # Parse output
-        parse_output(output_file, material, void_fraction)
         slog("RASPA void fraction simulation time: %5.2f seconds" % (time.perf_counter() - tbegin))
-        slog("RASPA VOID FRACTION : {}".format(void_fraction.void_fraction))
-        if material.parent:
-            slog("(parent VOID FRACTION : {})".format(material.parent.void_fraction[0].void_fraction))
-
 
     # run geometric void fraction
     if "do_geo" in simulation_config and simulation_config["do_geo"]:
         tbegin = time.perf_counter()
-        atoms = [(a.x * material.structure.a, a.y * material.structure.b, a.z * material.structure.c, a.atom_types.sigma) for a in material.structure.atom_sites]
-        box = (material.structure.a, material.structure.b, material.structure.c)
-        void_fraction.void_fraction_geo = calculate_void_fraction(atoms, box, probe_r=simulation_config["probe_radius"])
+        void_fraction.void_fraction_geo, void_fraction.void_fraction_geo_error = \
+            calculate_geo_void_fraction(material, simulation_config)
         slog("GEOMETRIC void fraction: %f" % void_fraction.void_fraction_geo)
+        if void_fraction.void_fraction_geo_error is not None:
+            slog("GEOMETRIC void fraction error: %f" % void_fraction.void_fraction_geo_error)
         slog("GEOMETRIC void fraction simulation time: %5.2f   seconds" % (time.perf_counter() - tbegin))
     if "do_zeo" in simulation_config:
         pass
         # run zeo void fraction here
 
+    return void_fraction, output_file
+
+def parse(job, output):
+    """Parses the RASPA output of an executed job, if there is one, adds the void fraction to the
+    material and removes the output directory unless `keep_configs` is set."""
+    material = job["material"]
+    void_fraction, output_file = output
+    if output_file is not None:
+        parse_output(output_file, material, void_fraction)
+        slog("RASPA VOID FRACTION : {}".format(void_fraction.void_fraction))
+        if material.parent:
+            slog("(parent VOID FRACTION : {})".format(material.parent.void_fraction[0].void_fraction))
+
     material.void_fraction.append(void_fraction)
 
-    if not config['keep_configs']:
-        shutil.rmtree(output_dir, ignore_errors=True)
+    if not job["config"]['keep_configs']:
+        shutil.rmtree(job["output_dir"], ignore_errors=True)
     sys.stdout.flush()
+
+def run(material, simulation_config, config):
+    """Runs void fraction simulation.
+
+    Args:
+        material (Material): material record.
+
+    RASPA input files are only written for the native backend if `keep_configs` is set.
+
+    Returns:
+        results (dict): void fraction simulation results.
+
+    """
+    job = prepare(material, simulation_config, config)
+    parse(job, execute(job))
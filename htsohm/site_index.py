@@ -0,0 +1,36 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+class PeriodicSiteIndex(object):
+    """periodic spatial index over atom sites in an orthorhombic box.
+
+    Wraps a `scipy.spatial.cKDTree` built with `boxsize`, so that all distances are minimum-image
+    distances. Sites can be passed in any units (i.e. cartesian coordinates with the box given in
+    angstroms, or fractional coordinates with a box of (1, 1, 1)), as long as the points and box
+    match.
+    """
+
+    def __init__(self, points, box):
+        self.box = np.array(box, dtype=float)
+        self.points = np.array(points, dtype=float).reshape(-1, 3)
+        self.tree = cKDTree(self.wrap(self.points), boxsize=self.box)
+
+    def __len__(self):
+        return len(self.points)
+
+    def wrap(self, points):
+        """returns points wrapped into the box [0, box)."""
+        wrapped = np.mod(np.asarray(points, dtype=float).reshape(-1, 3), self.box)
+        # np.mod can round tiny negative numbers up to exactly the box length
+        wrapped[wrapped >= self.box] = 0.0
+        return wrapped
+
+    def nearest(self, points, distance_upper_bound=np.inf):
+        """returns the minimum-image distance to the nearest site, and the index of that site, for
+        every point. Points without a site within `distance_upper_bound` get a distance of inf and
+        an index of len(self)."""
+        return self.tree.query(self.wrap(points), k=1, distance_upper_bound=distance_upper_bound)
+
+    def within(self, points, r):
+        """returns a list of the indices of all sites within distance r of each point."""
+        return self.tree.query_ball_point(self.wrap(points), r)
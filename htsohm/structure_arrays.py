@@ -0,0 +1,119 @@
+import numpy as np
+
+# the layout of each atom site in Structure.packed_sites: little-endian so that a database can be
+# read on any platform.
+PACKED_SITE_DTYPE = np.dtype([("x", "<f8"), ("y", "<f8"), ("z", "<f8"), ("q", "<f8"), ("type_index", "<i4")])
+
+def unpack_sites(packed_sites):
+    """returns the (n,) PACKED_SITE_DTYPE array of the atom sites packed in packed_sites."""
+    return np.frombuffer(packed_sites, dtype=PACKED_SITE_DTYPE)
+
+class StructureArrays(object):
+    """compact, array-backed view of a Structure.
+
+    Holds the lattice constants, the fractional coordinates, charge and atom type index of every
+    atom site, and the sigma and epsilon of every atom type as numpy arrays. This is built once per
+    structure (see `Structure.arrays`) and used wherever the structure is read in bulk, so that the
+    atom sites don't have to be walked as ORM objects each time. Use `to_structure` to convert back
+    to ORM rows when the structure needs to be committed.
+
+    Attributes:
+        lattice (np.ndarray): lattice constants (a, b, c).
+        frac (np.ndarray): (n, 3) fractional coordinates of the atom sites.
+        charge (np.ndarray): (n,) charge of each atom site.
+        type_index (np.ndarray): (n,) index of each atom site's atom type.
+        sigma (np.ndarray): (num_atom_types,) sigma of each atom type.
+        epsilon (np.ndarray): (num_atom_types,) epsilon of each atom type.
+    """
+
+    def __init__(self, lattice, frac, charge, type_index, sigma, epsilon):
+        self.lattice = np.array(lattice, dtype=float)
+        self.frac = np.array(frac, dtype=float).reshape(-1, 3)
+        self.charge = np.array(charge, dtype=float)
+        self.type_index = np.array(type_index, dtype=int)
+        self.sigma = np.array(sigma, dtype=float)
+        self.epsilon = np.array(epsilon, dtype=float)
+
+    @classmethod
+    def from_structure(cls, structure):
+        s = structure
+        type_indices = {id(at): i for i, at in enumerate(s.atom_types)}
+        return cls(lattice=(s.a, s.b, s.c),
+                   frac=[(a.x, a.y, a.z) for a in s.atom_sites],
+                   charge=[a.q for a in s.atom_sites],
+                   type_index=[type_indices[id(a.atom_types)] for a in s.atom_sites],
+                   sigma=[at.sigma for at in s.atom_types],
+                   epsilon=[at.epsilon for at in s.atom_types])
+
+    @classmethod
+    def from_packed_sites(cls, lattice, packed_sites, sigma, epsilon):
+        sites = unpack_sites(packed_sites)
+        return cls(lattice=lattice,
+                   frac=np.column_stack((sites["x"], sites["y"], sites["z"])),
+                   charge=sites["q"],
+                   type_index=sites["type_index"],
+                   sigma=sigma,
+                   epsilon=epsilon)
+
+    def packed_sites(self):
+        """returns the atom sites as bytes, packed as PACKED_SITE_DTYPE records."""
+        sites = np.empty(len(self), dtype=PACKED_SITE_DTYPE)
+        sites["x"], sites["y"], sites["z"] = self.frac.T
+        sites["q"] = self.charge
+        sites["type_index"] = self.type_index
+        return sites.tobytes()
+
+    def to_structure(self):
+        """returns a new Structure, with AtomTypes and AtomSite rows, equivalent to this view."""
+        from htsohm.db import AtomSite, AtomTypes, Structure
+
+        a, b, c = self.lattice.tolist()
+        atom_types = [AtomTypes(sigma=sig, epsilon=eps)
+                      for sig, eps in zip(self.sigma.tolist(), self.epsilon.tolist())]
+        atom_sites = [AtomSite(atom_types=atom_types[t], x=x, y=y, z=z, q=q)
+                      for (x, y, z), q, t in zip(self.frac.tolist(), self.charge.tolist(),
+                                                  self.type_index.tolist())]
+        return Structure(a=a, b=b, c=c, atom_sites=atom_sites, atom_types=atom_types)
+
+    def copy(self):
+        return StructureArrays(self.lattice, self.frac, self.charge, self.type_index, self.sigma,
+                               self.epsilon)
+
+    def __len__(self):
+        return len(self.frac)
+
+    @property
+    def cartesian(self):
+        """(n, 3) cartesian coordinates of the atom sites."""
+        return self.frac * self.lattice
+
+    @property
+    def site_sigma(self):
+        """(n,) sigma of each atom site."""
+        return self.sigma[self.type_index]
+
+    @property
+    def site_epsilon(self):
+        """(n,) epsilon of each atom site."""
+        return self.epsilon[self.type_index]
+
+    def void_fraction_atoms(self):
+        """returns the atom sites as a list of tuples (x, y, z, d) in cartesian coordinates, as used
+        by `htsohm.void_fraction.calculate_void_fraction`."""
+        return np.column_stack((self.cartesian, self.site_sigma)).tolist()
+
+    @property
+    def volume(self):
+        return float(np.prod(self.lattice))
+
+    @property
+    def number_density(self):
+        return len(self) / self.volume
+
+    @property
+    def total_epsilon(self):
+        return float(self.site_epsilon.sum())
+
+    @property
+    def epsilon_density(self):
+        return self.total_epsilon / self.volume
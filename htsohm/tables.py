@@ -0,0 +1,122 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+COLUMNAR_EXTENSIONS = {".parquet": "parquet", ".pq": "parquet", ".feather": "feather", ".arrow": "feather"}
+
+def import_pyarrow():
+    """returns the pyarrow module; pyarrow is only needed for parquet and feather files, so it is
+    not a hard dependency of htsohm."""
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("reading or writing parquet and feather files requires pyarrow; install it "
+                          "with `pip install pyarrow`") from None
+    return pyarrow
+
+def table_format(path):
+    """returns "parquet", "feather" or "csv", based on the extension of path."""
+    return COLUMNAR_EXTENSIONS.get(os.path.splitext(path)[1].lower(), "csv")
+
+def find_table(stem):
+    """returns the path of the table named stem, preferring a parquet or feather file over a csv.
+
+    Args:
+        stem (str): path without an extension, e.g. "reference" for reference.parquet,
+            reference.feather or reference.csv.
+    """
+    for ext in (".parquet", ".feather", ".csv"):
+        if os.path.exists(stem + ext):
+            return stem + ext
+    raise FileNotFoundError("no parquet, feather or csv file found for %s" % stem)
+
+def column_names(path):
+    """returns the column names of a csv, parquet or feather file without reading its rows."""
+    fmt = table_format(path)
+    if fmt == "parquet":
+        import_pyarrow()
+        import pyarrow.parquet as pq
+        return pq.read_schema(path).names
+    elif fmt == "feather":
+        pa = import_pyarrow()
+        return pa.ipc.open_file(path).schema.names
+    return pd.read_csv(path, nrows=0).columns.tolist()
+
+def read_table(path, columns=None, max_rows=None):
+    """reads a csv, parquet or feather file into a pandas DataFrame.
+
+    Args:
+        path (str): path of the file; the format is chosen by its extension.
+        columns (list): names or positions of the columns to read, in the order they should be
+            returned. Parquet and feather files only read these columns from disk. Default: None
+            (all columns).
+        max_rows (int): read at most this many rows. Default: None (all rows).
+    Returns:
+        pandas DataFrame.
+    """
+    if columns is not None and any(isinstance(c, (int, np.integer)) for c in columns):
+        names = column_names(path)
+        columns = [names[c] if isinstance(c, (int, np.integer)) else c for c in columns]
+
+    fmt = table_format(path)
+    if fmt == "csv":
+        df = pd.read_csv(path, usecols=columns, nrows=max_rows)
+        return df if columns is None else df[columns]
+
+    import_pyarrow()
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        table = pq.read_table(path, columns=columns)
+    else:
+        import pyarrow.feather as feather
+        table = feather.read_table(path, columns=columns, memory_map=True)
+    if columns is not None:
+        table = table.select(columns)
+    if max_rows is not None:
+        table = table.slice(0, max_rows)
+    return table.to_pandas()
+
+def load_columns(path, usecols, max_rows=None, dtype=float):
+    """reads columns of a csv, parquet or feather file into a numpy array, like
+    `np.loadtxt(path, delimiter=',', skiprows=1, usecols=usecols, max_rows=max_rows)`.
+
+    Args:
+        usecols (int, str or sequence): position or name of one column, for a 1d array, or of
+            several columns, for a 2d array with the columns in the given order.
+    """
+    if table_format(path) == "csv" and all(isinstance(c, (int, np.integer)) for c in np.atleast_1d(usecols)):
+        return np.loadtxt(path, delimiter=',', skiprows=1, usecols=usecols, max_rows=max_rows, dtype=dtype)
+
+    columns = [usecols] if np.ndim(usecols) == 0 else list(usecols)
+    values = read_table(path, columns, max_rows).to_numpy(dtype=dtype)
+    return values[:, 0] if np.ndim(usecols) == 0 else values
+
+def write_table(path, columns, row_chunks):
+    """writes rows to a parquet or feather file, one chunk at a time.
+
+    Each chunk is written as a parquet row group or feather record batch, so only one chunk has
+    to be held in memory.
+
+    Args:
+        path (str): output path; the format is chosen by its extension.
+        columns (list): (name, numpy dtype) of each column. Any value may be None, which is written
+            as null.
+        row_chunks (iterable): lists of rows, each a sequence with a value for every column.
+    """
+    fmt = table_format(path)
+    if fmt == "csv":
+        raise ValueError("%s is not a parquet (.parquet, .pq) or feather (.feather, .arrow) path" % path)
+
+    pa = import_pyarrow()
+    schema = pa.schema([(name, pa.from_numpy_dtype(np.dtype(dtype))) for name, dtype in columns])
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(path, schema)
+    else:
+        writer = pa.ipc.new_file(path, schema)
+
+    with writer:
+        for rows in row_chunks:
+            arrays = [pa.array(v, type=field.type) for v, field in zip(zip(*rows), schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
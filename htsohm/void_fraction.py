@@ -1,10 +1,159 @@
-
 import itertools
 from math import sqrt, ceil
 
 import numpy as np
 
-def calculate_void_fraction(atoms, box, points_per_angstrom=10, probe_r=0.0):
+from htsohm.site_index import PeriodicSiteIndex
+
+# number of bytes needed to store one grid point for each of the occupancy representations
+OCCUPANCY_BYTES_PER_POINT = {"float": 8, "bool": 1, "bits": 1/8}
+
+# number of set bits in each possible byte value; used to count points in a bit-packed grid
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+# grid points whose distance to a sphere surface is within this tolerance (in angstroms) are
+# rechecked with the exact floating point operations of the atom-centric strategy.
+_BOUNDARY_TOLERANCE = 1e-9
+
+# relative cost of querying one grid point against the spatial index (per log2 of the number of
+# atoms) vs. testing one grid point in an atom's neighborhood block; used by the "auto" strategy.
+# Measured at 1.5-4 for 20-200 atoms in a 15 angstrom box; rounded up, so that the atom strategy
+# is kept unless the point strategy is clearly cheaper.
+_POINT_QUERY_COST = 5.0
+
+def grid_shape(box, points_per_angstrom):
+    """returns the number of grid points along each side of the box and the spacing between them."""
+    xi_max = ceil(box[0] * points_per_angstrom)
+    yi_max = ceil(box[1] * points_per_angstrom)
+    zi_max = ceil(box[2] * points_per_angstrom)
+    return (xi_max, yi_max, zi_max), (box[0] / xi_max, box[1] / yi_max, box[2] / zi_max)
+
+def slab_thickness(shape, occupancy="float", max_memory=None):
+    """returns the number of x-planes of the grid that can be filled at once without the occupancy
+    grid using more than `max_memory` bytes. Always returns at least one plane."""
+    if max_memory is None:
+        return shape[0]
+    if occupancy == "bits":
+        plane_bytes = shape[1] * ceil(shape[2] / 8)
+    else:
+        plane_bytes = shape[1] * shape[2] * OCCUPANCY_BYTES_PER_POINT[occupancy]
+    return int(min(max(max_memory // plane_bytes, 1), shape[0]))
+
+def occupancy_grid(shape, occupancy="float"):
+    """returns an empty occupancy grid of the given shape.
+
+    occupancy: one of "float" (one float64 per point), "bool" (one byte per point) or "bits" (one
+        bit per point, packed along the z-axis into bytes).
+    """
+    if occupancy == "float":
+        return np.zeros(shape)
+    elif occupancy == "bool":
+        return np.zeros(shape, dtype=bool)
+    elif occupancy == "bits":
+        return np.zeros((shape[0], shape[1], ceil(shape[2] / 8)), dtype=np.uint8)
+    raise ValueError("occupancy must be one of 'float', 'bool' or 'bits': %s" % occupancy)
+
+def mark_occupied(grid, indices, occupancy="float"):
+    """marks the points at `indices` (a tuple of index arrays, one per axis) as occupied."""
+    if occupancy == "bits":
+        # the bits of points in the same byte are OR'ed together first, so that each byte is only
+        # updated once; np.bitwise_or.at would be unbuffered and much slower
+        ix, iy, iz = indices
+        if len(ix) == 0:
+            return
+        byte = np.ravel_multi_index((ix, iy, iz >> 3), grid.shape)
+        order = np.argsort(byte, kind="stable")
+        byte, bits = byte[order], (128 >> (iz[order] & 7)).astype(np.uint8)
+        starts = np.flatnonzero(np.r_[True, byte[1:] != byte[:-1]])
+        grid.flat[byte[starts]] |= np.bitwise_or.reduceat(bits, starts)
+    else:
+        grid[indices] = 1
+
+def count_occupied(grid, occupancy="float"):
+    """returns the number of occupied points in an occupancy grid."""
+    if occupancy == "bits":
+        return int(_POPCOUNT[grid].sum(dtype=np.int64))
+    return np.count_nonzero(grid)
+
+def atom_block(x, y, z, r, shape, spacing, x_range=None):
+    """returns the periodic grid indices covered by a sphere of radius r centered at (x, y, z).
+
+    The neighborhood of the atom is evaluated as one block with broadcast distance computations,
+    using the same lattice index ranges and the same floating point operations (in the same order)
+    as `calculate_void_fraction_loop`, so that the covered points are identical.
+
+    If `x_range` is passed as a tuple (x_start, x_end), only points with x-indices in
+    [x_start, x_end) are returned; this is used for filling the grid in slabs.
+
+    Returns a tuple of three index arrays (one per axis) that can be used to index a grid with
+    dimensions `shape`. The same point may appear more than once if the sphere crosses a boundary
+    onto itself.
+    """
+    xi_max, yi_max, zi_max = shape
+    dx, dy, dz = spacing
+
+    delt_i = ceil(r / dx)
+    xi = int(x // dx); yi = int(y // dy); zi = int(z // dz)
+
+    # limit the lattice_indices to only crossing a boundary once in each direction
+    lxi = np.arange(max(xi - delt_i, -xi_max), min(xi + delt_i + 1, 2*xi_max))
+    lyi = np.arange(max(yi - delt_i, -yi_max), min(yi + delt_i + 1, 2*yi_max))
+    lzi = np.arange(max(zi - delt_i, -zi_max), min(zi + delt_i + 1, 2*zi_max))
+    if x_range is not None:
+        lxi = lxi[(lxi % xi_max >= x_range[0]) & (lxi % xi_max < x_range[1])]
+
+    dist2 = ((lxi * dx - x) ** 2)[:, None, None] + ((lyi * dy - y) ** 2)[None, :, None]
+    dist2 = dist2 + ((lzi * dz - z) ** 2)[None, None, :]
+    ix, iy, iz = np.nonzero(np.sqrt(dist2) < r)
+
+    return (lxi[ix] % xi_max, lyi[iy] % yi_max, lzi[iz] % zi_max)
+
+def atom_blocks(centers, radii, shape, spacings, max_block_points=2**20):
+    """returns the periodic grid indices covered by many spheres at once, as `atom_block` does for
+    one sphere.
+
+    Spheres are grouped by block size, ceil(r / dx), and the blocks of a group are evaluated
+    together with broadcast distance computations. Lattice indices outside of the ranges used by
+    `atom_block` are masked out, and the floating point operations are the same (in the same
+    order), so that the covered points are identical.
+
+    centers: (n, 3) array of sphere centers.
+    radii: (n,) array of sphere radii.
+    shape: grid dimensions.
+    spacings: (n, 3) array of the grid spacing of each sphere, so that spheres of structures with
+        the same grid shape but different boxes can be evaluated together.
+    max_block_points: the maximum number of points evaluated at once, which limits memory use.
+
+    Yields tuples (sphere_indices, ix, iy, iz) of equal-length index arrays, one for every covered
+    point.
+    """
+    shape = np.array(shape)
+    delt = np.ceil(radii / spacings[:, 0]).astype(int)
+    cells = np.floor_divide(centers, spacings).astype(int)
+    for delt_i in np.unique(delt):
+        offsets = np.arange(-delt_i, delt_i + 1)
+        chunk_size = max(max_block_points // len(offsets) ** 3, 1)
+        group = np.flatnonzero(delt == delt_i)
+        for start in range(0, len(group), chunk_size):
+            spheres = group[start:start + chunk_size]
+            lattice = cells[spheres, :, None] + offsets
+            # limit the lattice_indices to only crossing a boundary once in each direction
+            in_range = (lattice >= -shape[:, None]) & (lattice < 2 * shape[:, None])
+
+            d2 = (lattice * spacings[spheres, :, None] - centers[spheres, :, None]) ** 2
+            dist2 = d2[:, 0, :, None, None] + d2[:, 1, None, :, None]
+            dist2 = dist2 + d2[:, 2, None, None, :]
+            covered = np.sqrt(dist2, out=dist2) < radii[spheres, None, None, None]
+            if not in_range.all():
+                covered &= in_range[:, 0, :, None, None] & in_range[:, 1, None, :, None]
+                covered &= in_range[:, 2, None, None, :]
+
+            s, i, j, k = np.nonzero(covered)
+            yield (spheres[s], lattice[s, 0, i] % shape[0], lattice[s, 1, j] % shape[1],
+                   lattice[s, 2, k] % shape[2])
+
+def calculate_void_fraction(atoms, box, points_per_angstrom=10, probe_r=0.0, occupancy="float",
+                            max_memory=None, strategy="atom"):
     """calculates a geometric void fraction, given the atom coordinates and diameter and the box
     size.
 
@@ -13,6 +162,9 @@ def calculate_void_fraction(atoms, box, points_per_angstrom=10, probe_r=0.0):
     the probe radius `probe_r` and the atom radius (atom diameter / 2) are marked as filled. The
     void fraction is simply the ratio of filled cubes to total cubes.
 
+    This is the vectorized version of `calculate_void_fraction_loop`; each atom's neighborhood is
+    marked as a single numpy block and the results are bit-identical.
+
     atoms: an array of tuples (x, y, z, d) containing the atom coordinates x, y, z and the
         atom diameter d.
     box: a tuple containing the length of each side of the box. The box is assumed to start
@@ -21,6 +173,311 @@ def calculate_void_fraction(atoms, box, points_per_angstrom=10, probe_r=0.0):
         discretization of the box. The larger the number, the longer the calculations will take to
         perform, and the more accurate the result will be. Default: 10.
     probe_r: the radius of the probe. Default: 0.0 angstroms.
+    occupancy: how each grid point is stored; one of "float", "bool" or "bits". See
+        `occupancy_grid`. Default: "float".
+    max_memory: if set, the grid is split into slabs along the x-axis that are filled and counted
+        independently, so that no more than `max_memory` bytes are allocated for the grid at once.
+        Default: None (the entire grid is allocated).
+    strategy: "atom" marks the neighborhood of each atom on the grid; "point" tests each grid point
+        against only its nearest atoms using a periodic spatial index (see
+        `calculate_void_fraction_points`); "auto" picks whichever is estimated to be cheaper from
+        the atom count and grid size. Default: "atom".
+    """
+    shape, spacing = grid_shape(box, points_per_angstrom)
+    if strategy == "auto":
+        strategy = choose_strategy(atoms, shape, spacing, probe_r)
+    if strategy == "point":
+        return calculate_void_fraction_points(atoms, box, points_per_angstrom, probe_r, max_memory)
+    elif strategy != "atom":
+        raise ValueError("strategy must be one of 'atom', 'point' or 'auto': %s" % strategy)
+
+    slab = slab_thickness(shape, occupancy, max_memory)
+
+    num_filled = 0
+    for x_start in range(0, shape[0], slab):
+        x_end = min(x_start + slab, shape[0])
+        lattice_fill = occupancy_grid((x_end - x_start, shape[1], shape[2]), occupancy)
+        for x, y, z, d in atoms:
+            ix, iy, iz = atom_block(x, y, z, d/2 + probe_r, shape, spacing, x_range=(x_start, x_end))
+            mark_occupied(lattice_fill, (ix - x_start, iy, iz), occupancy)
+        num_filled += count_occupied(lattice_fill, occupancy)
+
+    return 1 - num_filled / (shape[0] * shape[1] * shape[2])
+
+def structure_atoms(structure):
+    """returns a tuple (atoms, box) for a Structure or StructureArrays, where atoms is a list of
+    tuples (x, y, z, d) in cartesian coordinates, as used by `calculate_void_fraction`."""
+    if hasattr(structure, "arrays"):
+        structure = structure.arrays
+    atoms = [tuple(a) for a in structure.void_fraction_atoms()]
+    return atoms, tuple(structure.lattice.tolist())
+
+def calculate_void_fractions(structures, points_per_angstrom=10, probe_r=0.0, max_memory=None):
+    """calculates geometric void fractions for many structures at once.
+
+    Structures are grouped by grid shape. Each group shares one scratch grid of shape
+    (num_structures, xi_max, yi_max, zi_max), which is allocated once and reused for as many
+    batches as needed to stay within `max_memory` bytes. The atoms of all structures in a batch are
+    filled in together by `atom_blocks`, and the filled points of every structure in a batch are
+    counted in one reduction. Results are identical to calling `calculate_void_fraction` for each
+    structure.
+
+    structures: a list of Structure or StructureArrays objects, or of tuples (atoms, box) with atoms
+        and box as for `calculate_void_fraction`.
+    points_per_angstrom, probe_r: see `calculate_void_fraction`.
+    max_memory: the maximum number of bytes to use for each scratch grid. At least one structure is
+        always processed at a time. Default: None (all structures in a group at once).
+
+    Returns a list of void fractions, in the same order as `structures`.
+    """
+    structures = [s if isinstance(s, tuple) else structure_atoms(s) for s in structures]
+
+    shape_groups = {}
+    for i, (atoms, box) in enumerate(structures):
+        shape, spacing = grid_shape(box, points_per_angstrom)
+        shape_groups.setdefault(shape, []).append(i)
+
+    void_fractions = [None] * len(structures)
+    for shape, indices in shape_groups.items():
+        num_points = shape[0] * shape[1] * shape[2]
+        batch_size = len(indices)
+        if max_memory is not None:
+            batch_size = int(min(max(max_memory // num_points, 1), batch_size))
+        scratch = np.zeros((batch_size, *shape), dtype=bool)
+
+        for batch_start in range(0, len(indices), batch_size):
+            batch = indices[batch_start:batch_start + batch_size]
+            scratch[:] = False
+
+            # the atoms of every structure in the batch, with the spacing of their structure
+            atom_structure = np.concatenate([np.full(len(structures[i][0]), k, dtype=int)
+                                             for k, i in enumerate(batch)])
+            if len(atom_structure) > 0:
+                centers = np.concatenate([np.array(structures[i][0], dtype=float).reshape(-1, 4)
+                                          for i in batch])
+                spacings = np.array([grid_shape(structures[i][1], points_per_angstrom)[1]
+                                     for i in batch])[atom_structure]
+                radii = centers[:, 3] / 2 + probe_r
+                for a, ix, iy, iz in atom_blocks(centers[:, :3], radii, shape, spacings):
+                    scratch[atom_structure[a], ix, iy, iz] = True
+
+            num_filled = np.count_nonzero(scratch[:len(batch)].reshape(len(batch), -1), axis=1)
+            for i, n in zip(batch, num_filled):
+                void_fractions[i] = 1 - int(n) / num_points
+
+    return void_fractions
+
+def choose_strategy(atoms, shape, spacing, probe_r=0.0):
+    """returns "atom" or "point", depending on which strategy should take less time to calculate a
+    void fraction for these atoms on a grid with this shape and spacing."""
+    if len(atoms) == 0:
+        return "atom"
+    radii = [d/2 + probe_r for _, _, _, d in atoms]
+    atom_cost = sum([(2 * ceil(r / spacing[0]) + 1) ** 3 for r in radii])
+    point_cost = _POINT_QUERY_COST * shape[0] * shape[1] * shape[2] * len(set(radii)) * \
+                    max(np.log2(len(atoms)), 1)
+    return "atom" if atom_cost <= point_cost else "point"
+
+def _exactly_covered(point_indices, atom, r, shape, spacing):
+    """returns True if the grid point is within distance r of any periodic image of the atom,
+    using the same floating point operations as the atom-centric strategy."""
+    dist2 = 0.0
+    for gi, v, n, dv in zip(point_indices, atom, shape, spacing):
+        dist2 = dist2 + min([(li * dv - v) ** 2 for li in (gi - n, gi, gi + n)])
+    return sqrt(dist2) < r
+
+def radius_groups(atoms, box, probe_r=0.0):
+    """returns a list of tuples (r, index), one for each distinct radius r = d/2 + probe_r, where
+    index is a `PeriodicSiteIndex` over the atoms with that radius."""
+    centers = np.array([(x, y, z) for x, y, z, _ in atoms], dtype=float).reshape(-1, 3)
+    radii = np.array([d/2 + probe_r for _, _, _, d in atoms], dtype=float)
+    return [(r, PeriodicSiteIndex(centers[radii == r], box)) for r in np.unique(radii)]
+
+def points_covered(points, groups):
+    """returns a boolean array that is True for every point that is inside an atom of any of the
+    radius groups (see `radius_groups`)."""
+    covered = np.zeros(len(points), dtype=bool)
+    for r, index in groups:
+        dist, _ = index.nearest(points, distance_upper_bound=r)
+        covered |= dist < r
+    return covered
+
+def calculate_void_fraction_points(atoms, box, points_per_angstrom=10, probe_r=0.0, max_memory=None):
+    """calculates a geometric void fraction by testing each grid point against only its nearest
+    atoms.
+
+    Atoms are grouped by radius and each group is put in a `PeriodicSiteIndex`. The grid points
+    are queried against every index in batches of x-planes; a point is filled if its nearest atom
+    in any group is closer than that group's radius. Points lying on a sphere surface (to within
+    floating point tolerance) are rechecked using the same operations as the atom-centric strategy,
+    so both strategies fill the same points for atoms in a cubic grid. Unlike the atom-centric
+    strategy, the cost of this method does not grow with the amount of overlap between atoms.
+
+    The arguments are the same as for `calculate_void_fraction`; `max_memory` bounds the memory
+    used for each batch of grid point coordinates.
+    """
+    shape, spacing = grid_shape(box, points_per_angstrom)
+    if len(atoms) == 0:
+        return 1.0
+
+    groups = radius_groups(atoms, box, probe_r)
+
+    # each point in a batch needs its coordinates, indices, nearest distance and nearest index
+    batch = slab_thickness(shape, "float", None if max_memory is None else max_memory / 10)
+
+    num_filled = 0
+    for x_start in range(0, shape[0], batch):
+        x_end = min(x_start + batch, shape[0])
+        indices = np.indices((x_end - x_start, shape[1], shape[2])).reshape(3, -1).T
+        indices[:, 0] += x_start
+        points = indices * np.array(spacing)
+
+        filled = np.zeros(len(points), dtype=bool)
+        for r, index in groups:
+            dist, _ = index.nearest(points, distance_upper_bound=r + _BOUNDARY_TOLERANCE)
+            filled |= dist < r - _BOUNDARY_TOLERANCE
+            for p in np.nonzero(~filled & (dist < r + _BOUNDARY_TOLERANCE))[0]:
+                near_atoms = index.within(points[p], r + _BOUNDARY_TOLERANCE)[0]
+                filled[p] = any([_exactly_covered(indices[p], index.points[a], r, shape, spacing)
+                                 for a in near_atoms])
+        num_filled += np.count_nonzero(filled)
+
+    return 1 - num_filled / (shape[0] * shape[1] * shape[2])
+
+def estimate_void_fraction_mc(atoms, box, probe_r=0.0, target_error=0.001, batch_size=10000,
+                              max_samples=10000000, seed=None):
+    """estimates a geometric void fraction by sampling random points in the box.
+
+    Points are sampled in batches of `batch_size` and tested against a `PeriodicSiteIndex` of the
+    atoms. Sampling stops once the standard error of the estimate is no more than `target_error`,
+    or once `max_samples` points have been sampled. Unlike the grid methods, the cost depends only
+    on the requested precision and not on the size of the box.
+
+    atoms, box, probe_r: see `calculate_void_fraction`.
+    seed: seed for the random number generator. Default: None (unseeded).
+
+    Returns a tuple (void fraction, standard error).
+    """
+    if len(atoms) == 0:
+        return 1.0, 0.0
+
+    rng = np.random.RandomState(seed)
+    groups = radius_groups(atoms, box, probe_r)
+
+    num_void = 0
+    num_samples = 0
+    while num_samples < max_samples:
+        points = rng.random_sample((batch_size, 3)) * np.array(box, dtype=float)
+        num_void += batch_size - np.count_nonzero(points_covered(points, groups))
+        num_samples += batch_size
+
+        # the +1 / +2 keeps the error estimate from collapsing to zero if no points so far have
+        # been void (or all of them have).
+        p = (num_void + 1) / (num_samples + 2)
+        std_error = sqrt(p * (1 - p) / num_samples)
+        if std_error <= target_error:
+            break
+
+    return num_void / num_samples, std_error
+
+def estimate_void_fraction_octree(atoms, box, probe_r=0.0, target_error=0.001, max_depth=10,
+                                  max_cells=2**22):
+    """estimates a geometric void fraction by adaptively refining cells that straddle atom surfaces.
+
+    The box is initially divided into cells roughly the size of the smallest atom radius. A cell is
+    filled if it is entirely inside any atom and void if it is entirely outside all atoms (as
+    determined from the distance between the cell center and the nearest atom of each radius).
+    Cells that are neither are subdivided into eight, until the volume of undecided cells is small
+    enough to meet `target_error`, `max_depth` subdivisions have been made, or subdividing again
+    would give more than `max_cells` cells. Only the cells along atom surfaces are ever refined, so
+    large empty or filled regions are handled cheaply.
+
+    atoms, box, probe_r: see `calculate_void_fraction`.
+
+    Returns a tuple (void fraction, error), where the void fraction assumes that half of the volume
+    of undecided cells is filled, and the error is half the fraction of the volume that is
+    undecided, i.e. the true geometric void fraction is within [void fraction - error,
+    void fraction + error].
+    """
+    if len(atoms) == 0:
+        return 1.0, 0.0
+
+    box = np.array(box, dtype=float)
+    groups = radius_groups(atoms, box, probe_r)
+
+    cells_per_side = np.ceil(box / min([r for r, _ in groups])).astype(int)
+    half_size = box / cells_per_side / 2
+    centers = (np.indices(cells_per_side).reshape(3, -1).T + 0.5) * 2 * half_size
+
+    filled_volume = 0.0
+    for depth in range(max_depth + 1):
+        cell_volume = np.prod(2 * half_size)
+        half_diagonal = sqrt((half_size ** 2).sum())
+
+        inside = np.zeros(len(centers), dtype=bool)
+        outside = np.ones(len(centers), dtype=bool)
+        for r, index in groups:
+            dist, _ = index.nearest(centers)
+            inside |= dist + half_diagonal < r
+            outside &= dist - half_diagonal >= r
+
+        filled_volume += np.count_nonzero(inside) * cell_volume
+        centers = centers[~inside & ~outside]
+        undecided_volume = len(centers) * cell_volume
+        if undecided_volume / (2 * np.prod(box)) <= target_error or depth == max_depth or \
+                8 * len(centers) > max_cells:
+            break
+
+        # subdivide each undecided cell into eight cells
+        half_size = half_size / 2
+        offsets = (np.indices((2, 2, 2)).reshape(3, -1).T * 2 - 1) * half_size
+        centers = (centers[:, None, :] + offsets[None, :, :]).reshape(-1, 3)
+
+    volume = np.prod(box)
+    return 1 - (filled_volume + undecided_volume / 2) / volume, undecided_volume / (2 * volume)
+
+def coverage_grid(atoms, box, points_per_angstrom=10, probe_r=0.0):
+    """returns a grid with the number of atoms covering each grid point.
+
+    Uses the same grid and the same covered points as `calculate_void_fraction`, but instead of
+    marking points as filled, each atom adds one to the count of every point it covers. This lets
+    the grid be updated when atoms are added or removed; see `update_coverage_grid`.
+    """
+    shape, _ = grid_shape(box, points_per_angstrom)
+    counts = np.zeros(shape, dtype=np.uint16)
+    update_coverage_grid(counts, box, points_per_angstrom, probe_r, added=atoms)
+    return counts
+
+def update_coverage_grid(counts, box, points_per_angstrom=10, probe_r=0.0, added=[], removed=[]):
+    """updates a coverage grid in place by adding and removing atoms.
+
+    counts: a grid created by `coverage_grid` using the same box, points_per_angstrom and probe_r.
+    added: an array of tuples (x, y, z, d) of atoms to add.
+    removed: an array of tuples (x, y, z, d) of atoms to remove. Each of these atoms must have been
+        previously added to the grid.
+    """
+    shape, spacing = grid_shape(box, points_per_angstrom)
+    def _covered_points(x, y, z, d):
+        # an atom only counts once for a point, even if it covers it through more than one image
+        return np.unique(np.ravel_multi_index(atom_block(x, y, z, d/2 + probe_r, shape, spacing), shape))
+
+    flat_counts = counts.reshape(-1)
+    for x, y, z, d in removed:
+        flat_counts[_covered_points(x, y, z, d)] -= 1
+    for x, y, z, d in added:
+        flat_counts[_covered_points(x, y, z, d)] += 1
+
+def void_fraction_from_coverage(counts):
+    """returns the void fraction for a coverage grid, i.e. the fraction of uncovered points."""
+    return 1 - np.count_nonzero(counts) / counts.size
+
+def calculate_void_fraction_loop(atoms, box, points_per_angstrom=10, probe_r=0.0):
+    """calculates a geometric void fraction, checking every grid point near each atom in a python
+    loop.
+
+    This is the original, unvectorized implementation; it is kept as a reference for
+    `calculate_void_fraction`, which returns the same value for the same atoms, box, resolution and
+    probe radius.
     """
 
     xi_max = ceil(box[0] * points_per_angstrom)
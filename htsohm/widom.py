@@ -0,0 +1,101 @@
+import numpy as np
+
+def lorentz_berthelot(sigma, epsilon, probe_sigma, probe_epsilon):
+    """returns the (sigma, epsilon) of the interactions between a probe and atoms with the given
+    sigma and epsilon: the arithmetic mean of the sigmas and geometric mean of the epsilons."""
+    return (np.asarray(sigma) + probe_sigma) / 2, np.sqrt(np.asarray(epsilon) * probe_epsilon)
+
+def supercell_atoms(frac, lattice, unit_cells):
+    """replicates atoms into a supercell of unit_cells unit cells.
+
+    Args:
+        frac (np.ndarray): (n, 3) fractional coordinates of the atoms in the unit cell.
+        lattice (array-like): lattice constants (a, b, c) of the orthorhombic unit cell.
+        unit_cells (tuple): number of unit cells along each axis.
+
+    Returns:
+        tuple of the (n * prod(unit_cells), 3) cartesian coordinates of the atoms in the supercell,
+        the index of the unit cell atom each one is a copy of, and the supercell's box lengths.
+    """
+    frac = np.asarray(frac, dtype=float).reshape(-1, 3)
+    shifts = np.array(np.meshgrid(*[np.arange(n) for n in unit_cells], indexing="ij")).reshape(3, -1).T
+    positions = ((frac[np.newaxis, :, :] + shifts[:, np.newaxis, :]) * lattice).reshape(-1, 3)
+    atom_index = np.tile(np.arange(len(frac)), len(shifts))
+    return positions, atom_index, np.asarray(lattice, dtype=float) * unit_cells
+
+def lj_energies(points, atoms, box, sigma, epsilon, cutoff, max_pairs=2**22):
+    """returns the Lennard-Jones energy of a probe at each point.
+
+    Uses the minimum image convention in the orthorhombic box, so every box length should be at
+    least twice the cutoff (see `Structure.minimum_unit_cells`). The potential is cut and shifted
+    at the cutoff, as in the force field written for RASPA.
+
+    Args:
+        points (np.ndarray): (m, 3) cartesian coordinates of the probe.
+        atoms (np.ndarray): (n, 3) cartesian coordinates of the atoms.
+        box (array-like): box lengths.
+        sigma (np.ndarray): (n,) sigma of the probe's interaction with each atom.
+        epsilon (np.ndarray): (n,) epsilon of the probe's interaction with each atom, in K.
+        cutoff (float): interactions with atoms further than the cutoff are ignored.
+        max_pairs (int): points are processed in chunks of at most max_pairs point-atom pairs.
+
+    Returns:
+        (m,) energies in K; inf where the probe overlaps an atom.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    box = np.asarray(box, dtype=float)
+    sigma6 = np.asarray(sigma, dtype=float) ** 6
+    epsilon = np.asarray(epsilon, dtype=float)
+    shift = 4 * epsilon * (sigma6 ** 2 / cutoff ** 12 - sigma6 / cutoff ** 6)
+
+    energies = np.empty(len(points))
+    chunk_size = max(1, max_pairs // max(len(atoms), 1))
+    for start in range(0, len(points), chunk_size):
+        d = points[start:start + chunk_size, np.newaxis, :] - atoms[np.newaxis, :, :]
+        d -= box * np.round(d / box)
+        r2 = (d ** 2).sum(axis=2)
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            r6 = sigma6 / r2 ** 3
+            pair_energies = np.where(r2 < cutoff ** 2, 4 * epsilon * (r6 ** 2 - r6) - shift, 0.0)
+        pair_energies[r2 == 0.0] = np.inf
+        energies[start:start + chunk_size] = pair_energies.sum(axis=1)
+    return energies
+
+def widom_void_fraction(structure_arrays, probe_sigma, probe_epsilon, temperature, cutoff, unit_cells,
+                        num_insertions, num_blocks=5, rng=None, energy_grid=None):
+    """estimates the helium void fraction of a structure by Widom insertion.
+
+    The void fraction is the average Boltzmann factor, exp(-U / kT), of a probe inserted at random
+    positions in the supercell, where U is the Lennard-Jones energy of the probe, with
+    Lorentz-Berthelot mixing between the probe and each atom type.
+
+    Args:
+        structure_arrays (StructureArrays): the structure.
+        probe_sigma (float): sigma of the probe, in Angstrom.
+        probe_epsilon (float): epsilon of the probe, in K.
+        temperature (float): temperature, in K.
+        cutoff (float): Lennard-Jones cutoff, in Angstrom.
+        unit_cells (tuple): number of unit cells along each axis of the supercell.
+        num_insertions (int): number of probe insertions.
+        num_blocks (int): number of blocks the insertions are split into to estimate the error.
+        rng (np.random.Generator): random number generator. Default: None (unseeded).
+        energy_grid (EnergyGrid): if set, the energies are interpolated from this grid of the
+            probe's energies (see `htsohm.energy_grid`) instead of summed over the atoms.
+
+    Returns:
+        tuple of the void fraction (float) and its standard error (float).
+    """
+    rng = np.random.default_rng(rng)
+    sa = structure_arrays
+    atoms, atom_index, box = supercell_atoms(sa.frac, sa.lattice, unit_cells)
+    sigma, epsilon = lorentz_berthelot(sa.site_sigma, sa.site_epsilon, probe_sigma, probe_epsilon)
+
+    points = rng.random((num_insertions, 3)) * box
+    if energy_grid is not None:
+        energies = energy_grid.interpolate(points, temperature)
+    else:
+        energies = lj_energies(points, atoms, box, sigma[atom_index], epsilon[atom_index], cutoff)
+    boltzmann_factors = np.exp(-energies / temperature)
+
+    block_averages = [block.mean() for block in np.array_split(boltzmann_factors, num_blocks)]
+    return float(boltzmann_factors.mean()), float(np.std(block_averages, ddof=1) / np.sqrt(num_blocks))
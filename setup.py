@@ -17,6 +17,7 @@ setup(
         'pandas',
         'pyyaml',
         'matplotlib',
+        'importlib_metadata; python_version < "3.8"',
     ],
     entry_points={
           'console_scripts': [
@@ -31,6 +32,8 @@ setup(
               'psm-atoms-csv = htsohm.bin.output_csv:output_atom_sites_csv',
               'psm-material-csv = htsohm.bin.output_csv:output_material_csv',
               'psm-csv-add-bin = htsohm.bin.output_csv:csv_add_bin',
+              'psm-export = htsohm.bin.export:export',
+              'psm-migrate-db = htsohm.bin.migrate_db:migrate_db',
               'psm-dof-analysis = htsohm.bin.dof_analysis:dof_analysis',
               'psm-setup-one-atom-sweep = htsohm.bin.one_atom_sweep_setup:sweep_setup',
               'psm-setup-cube-pore-sweep = htsohm.bin.cube_pore_sweep_setup:sweep_setup',
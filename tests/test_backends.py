@@ -0,0 +1,105 @@
+from types import SimpleNamespace
+
+import pytest
+
+from htsohm.db import AtomSite, AtomTypes, Material, Structure, VoidFraction
+from htsohm.simulation import backends
+from htsohm.simulation.backends import available_backends, get_backend, schedule_simulations
+from htsohm.simulation.run_all import run_all_simulations
+from htsohm.simulation.simulate import gas_loading, void_fraction
+from htsohm.slog import init_slog
+
+class FakeEntryPoint(object):
+    def __init__(self, name, backend):
+        self.name = name
+        self.backend = backend
+
+    def load(self):
+        return self.backend
+
+def fake_backend(calls, cost=1.0):
+    def prepare(material, simulation_config, config):
+        calls.append(("prepare", simulation_config["type"]))
+        return {"material": material}
+    def execute(job):
+        calls.append(("execute",))
+        return 42.0
+    def parse(job, output):
+        calls.append(("parse", output))
+        job["material"].site_distribution = output
+    return SimpleNamespace(prepare=prepare, execute=execute, parse=parse,
+                           estimate_cost=lambda material, simulation_config: cost)
+
+@pytest.fixture
+def material():
+    atom_types = [AtomTypes(sigma=3.0, epsilon=50.0)]
+    structure = Structure(a=12.0, b=12.0, c=12.0, atom_types=atom_types,
+                          atom_sites=[AtomSite(atom_types=atom_types[0], x=0.5, y=0.5, z=0.5, q=0.0)])
+    return Material(structure=structure)
+
+@pytest.fixture
+def entry_points(monkeypatch):
+    eps = []
+    monkeypatch.setattr(backends, "_entry_points", lambda: eps)
+    monkeypatch.setattr(backends, "__backends__", {})
+    return eps
+
+def test_get_builtin_backends():
+    assert get_backend({"type": "gas_loading"}) is gas_loading
+    assert get_backend({"type": "void_fraction", "backend": "native"}) is void_fraction
+    with pytest.raises(ValueError):
+        get_backend({"type": "gas_loading", "backend": "surrogate"})
+
+def test_get_entry_point_backend(entry_points):
+    backend = fake_backend([])
+    entry_points.append(FakeEntryPoint("gas_loading.surrogate", backend))
+    assert ("gas_loading", "surrogate") in available_backends()
+    assert get_backend({"type": "gas_loading", "backend": "surrogate"}) is backend
+    # built-in backends can't be replaced
+    entry_points.append(FakeEntryPoint("gas_loading.raspa", backend))
+    assert get_backend({"type": "gas_loading"}) is gas_loading
+
+def test_schedule_simulations_runs_cheap_simulations_first(material):
+    surface_area = {"type": "surface_area", "estimated_cost": 5.0}
+    loading = {"type": "gas_loading", "estimated_cost": 0.5}
+    cheap_void_fraction = {"type": "void_fraction", "estimated_cost": 1.0}
+    expensive_void_fraction = {"type": "void_fraction", "estimated_cost": 10.0}
+
+    assert schedule_simulations(material, [surface_area, cheap_void_fraction]) == [cheap_void_fraction, surface_area]
+    # gas loading depends on the void fraction, so it can't run first even though it is cheapest
+    assert schedule_simulations(material, [surface_area, expensive_void_fraction, loading]) == \
+        [surface_area, expensive_void_fraction, loading]
+    assert schedule_simulations(material, [loading, cheap_void_fraction, surface_area]) == \
+        [cheap_void_fraction, loading, surface_area]
+
+def test_estimate_costs(material):
+    vf_config = {"type": "void_fraction", "do_raspa": True, "do_geo": True, "adsorbate": "helium",
+                 "cutoff": 12.8, "simulation_cycles": 1000}
+    raspa_cost = void_fraction.estimate_cost(material, vf_config)
+    native_cost = void_fraction.estimate_cost(material, dict(vf_config, backend="native", energy_grid_spacing=0.4))
+    assert 0 < raspa_cost and 0 < native_cost
+
+    gl_config = {"type": "gas_loading", "cutoff": 12.8, "initialization_cycles": 500, "simulation_cycles": 1000}
+    assert gas_loading.estimate_cost(material, gl_config) > 0
+
+def test_run_all_simulations_with_entry_point_backend(material, entry_points):
+    init_slog()
+    calls = []
+    entry_points.append(FakeEntryPoint("surface_area.fake", fake_backend(calls)))
+    run_all_simulations(material, {"simulations": {1: {"type": "surface_area", "backend": "fake"}}})
+    assert calls == [("prepare", "surface_area"), ("execute",), ("parse", 42.0)]
+    assert material.site_distribution == 42.0
+
+def test_gas_loading_is_skipped_below_void_fraction(material, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    init_slog()
+    material.void_fraction.append(VoidFraction(void_fraction=0.01))
+    simulation_config = {"type": "gas_loading", "adsorbate": "methane", "pressure": 3500000,
+                         "temperature": 298.0, "skip_below_void_fraction": 0.05}
+    assert backends.run_simulation(material, simulation_config, {"keep_configs": False}) is False
+    assert material.gas_loading[0].absolute_volumetric_loading == 0.0
+    assert material.gas_loading[0].cycles == 0
+    assert list(tmp_path.iterdir()) == []
+
+    material.void_fraction[0].void_fraction = 0.5
+    assert gas_loading.skip(material, simulation_config) is False
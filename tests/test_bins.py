@@ -0,0 +1,258 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from htsohm import db
+from htsohm.bin.output_csv import csv_add_bin_column
+from htsohm.bins import BinGrid, FenwickTree, calc_bin, calc_bins, calc_property_bins
+from htsohm.db import AtomSite, AtomTypes, GasLoading, Material, Structure, VoidFraction
+from htsohm.htsohm_run import (check_db_materials_for_restart, dump_restart, last_finished_generation,
+                               load_restart)
+
+def test_calc_property_bins_matches_calc_bin():
+    rng = np.random.default_rng(0)
+    ranges = [(0.0, 1.0), (0.0, 400.0), (-3.0, 7.5)]
+    num_bins = [10, 40, 7]
+    # include values outside the ranges and exactly on bin edges
+    values = np.column_stack([rng.uniform(lb - 1, ub + 1, 1000) for lb, ub in ranges])
+    values[:11, 0] = np.linspace(0.0, 1.0, 11)
+    values[:41, 1] = np.linspace(0.0, 400.0, 41)
+
+    bins = calc_property_bins(values, ranges, num_bins)
+    assert bins.dtype.kind == "i"
+    assert bins.tolist() == [[calc_bin(v, lb, ub, nb) for v, (lb, ub), nb in zip(row, ranges, num_bins)]
+                             for row in values]
+
+    assert calc_bins(values[:, 0:2], 10, (0.0, 1.0), (0.0, 400.0)).tolist() == \
+        [[calc_bin(v0, 0.0, 1.0, 10), calc_bin(v1, 0.0, 400.0, 10)] for v0, v1 in values[:, 0:2]]
+    assert calc_bins([], 10).shape == (0, 2)
+
+def test_csv_add_bin_column(tmp_path):
+    rng = np.random.default_rng(0)
+    values = rng.uniform(0, 1, (250, 2)) * (1.0, 400.0)
+    csv_path = tmp_path / "pm.csv"
+    csv_path.write_text("id,vf,ml\n" + "".join("%d,%s,%s\n" % (i, vf, ml) for i, (vf, ml) in enumerate(values)))
+
+    expected = ["id,vf,ml,bin1,bin2,unique_bins"]
+    unique_bins = set()
+    for i, (vf, ml) in enumerate(values):
+        b = (calc_bin(vf, 0.0, 1.0, 5), calc_bin(ml, 0.0, 400.0, 5))
+        unique_bins.add(b)
+        expected.append("%d,%s,%s,%d,%d,%d" % (i, vf, ml, *b, len(unique_bins)))
+
+    with open(tmp_path / "pm-binned.csv", "w") as f:
+        csv_add_bin_column(str(csv_path), [(1, 0.0, 1.0, 5), (2, 0.0, 400.0, 5)], output_file=f, chunk_size=16)
+    assert (tmp_path / "pm-binned.csv").read_text().splitlines() == expected
+
+def brute_force_frontier(counts, r):
+    frontier = set()
+    for b, count in np.ndenumerate(counts):
+        if count == 0:
+            continue
+        neighborhood = tuple(slice(max(c - r, 0), c + r + 1) for c in b)
+        if (counts[neighborhood] == 0).any():
+            frontier.add(b)
+    return frontier
+
+@pytest.mark.parametrize("r", [1, 2])
+def test_bin_grid_matches_brute_force_when_added_in_batches(r):
+    rng = np.random.default_rng(0)
+    num_bins = 12
+    bins = np.clip(rng.normal(5, 2.5, (400, 2)).astype(int), 0, num_bins - 1)
+
+    grid = BinGrid(num_bins, frontier_radius=r)
+    counts = np.zeros((num_bins, num_bins), dtype=int)
+    for batch in np.array_split(bins, 20):
+        occupied_before = set(zip(*np.nonzero(counts)))
+        new_bins = grid.add(batch)
+        np.add.at(counts, tuple(batch.T), 1)
+
+        assert new_bins == set(zip(*np.nonzero(counts))) - occupied_before
+        assert (grid.dense_counts() == counts).all()
+        assert grid.occupied == set(zip(*np.nonzero(counts)))
+        assert grid.frontier == brute_force_frontier(counts, r)
+
+    assert len(grid) == len(bins)
+    assert (grid.material_bins == bins).all()
+    assert grid.frontier_bins(r + 1) == sorted(brute_force_frontier(counts, r + 1))
+
+def test_bin_grid_in_3d_matches_brute_force():
+    rng = np.random.default_rng(1)
+    bins = np.clip(rng.normal(3, 1.5, (300, 3)).astype(int), 0, 6)
+    grid = BinGrid(7, num_dims=3)
+    counts = np.zeros((7, 7, 7), dtype=int)
+    for batch in np.array_split(bins, 10):
+        grid.add(batch)
+        np.add.at(counts, tuple(batch.T), 1)
+        assert (grid.dense_counts() == counts).all()
+        assert grid.frontier == brute_force_frontier(counts, 1)
+
+def test_bin_grid_is_sparse():
+    grid = BinGrid(1000, num_dims=4)
+    grid.add([(0, 0, 0, 0), (999, 999, 999, 999), (0, 0, 0, 0)])
+    assert grid.size == 1000 ** 4
+    assert grid.counts == {(0, 0, 0, 0): 2, (999, 999, 999, 999): 1}
+    assert grid.frontier == set(grid.occupied)
+    assert grid.materials_in((0, 0, 0, 0)).tolist() == [0, 2]
+
+@pytest.mark.parametrize("num_dims", [2, 3])
+def test_frontier_bins_by_dilation_matches_brute_force(num_dims):
+    rng = np.random.default_rng(2)
+    bins = np.clip(rng.normal(4, 2, (200, num_dims)).astype(int), 0, 8)
+    grid = BinGrid.from_material_bins(9, bins)
+    for r in [2, 3]:
+        assert grid.frontier_bins(r) == sorted(brute_force_frontier(grid.dense_counts(), r))
+
+def test_random_frontier_bins_come_from_frontier():
+    rng = np.random.default_rng(3)
+    grid = BinGrid(12)
+    for batch in np.array_split(np.clip(rng.normal(5, 2.5, (400, 2)).astype(int), 0, 11), 20):
+        grid.add(batch)
+        drawn = grid.random_frontier_bins(50)
+        assert len(drawn) == 50
+        assert set(drawn) <= set(grid.frontier)
+    assert sorted(grid._frontier_list) == sorted(grid.frontier)
+
+def test_fenwick_tree():
+    rng = np.random.default_rng(4)
+    values = rng.integers(0, 5, 37).astype(float)
+    fenwick = FenwickTree(4)
+    for i, v in enumerate(values):
+        fenwick.add(i, v)
+    assert np.allclose([fenwick.prefix_sum(i) for i in range(38)], np.concatenate(([0], np.cumsum(values))))
+
+    built = FenwickTree.from_values(values)
+    assert np.allclose(built.tree[1:len(values) + 1], fenwick.tree[1:len(values) + 1])
+
+    targets = rng.uniform(0, values.sum(), 1000)
+    expected = np.searchsorted(np.cumsum(values), targets, side="left")
+    assert (fenwick.search(targets) == expected).all()
+
+def density_bin_probabilities(counts, num_parents):
+    """the bin probabilities of the original density-bin selector: the bins with no more materials
+    than the num_parents-th least populated bin, weighted by 1 / count."""
+    bins = sorted(counts.items(), key=lambda x: x[1])
+    cutoff = bins[min(num_parents, len(bins)) - 1][1]
+    weights = {b: 1 / c for b, c in bins if c <= cutoff}
+    total = sum(weights.values())
+    return {b: w / total for b, w in weights.items()}
+
+@pytest.mark.parametrize("num_parents", [1, 5, 30, 1000])
+@pytest.mark.parametrize("incremental", [True, False])
+def test_random_density_bins_matches_density_bin_weights(num_parents, incremental):
+    rng = np.random.default_rng(5)
+    material_bins = np.clip(rng.normal(4, 2, (300, 2)).astype(int), 0, 7)
+    if incremental:
+        # small batches move bins through the count groups one material at a time
+        grid = BinGrid(8)
+        for batch in np.array_split(material_bins, 50):
+            grid.add(batch)
+    else:
+        grid = BinGrid.from_material_bins(8, material_bins)
+
+    expected = density_bin_probabilities(grid.counts, num_parents)
+    np.random.seed(0)
+    draws = [b for _ in range(4000 // num_parents + 1) for b in grid.random_density_bins(num_parents)]
+    draw_counts = Counter(draws)
+    assert set(draws) <= set(expected)
+    for b, p in expected.items():
+        assert abs(draw_counts[b] / len(draws) - p) < 4 * (p * (1 - p) / len(draws)) ** 0.5 + 1e-3
+
+def test_random_density_bins_skips_emptied_count_groups(monkeypatch):
+    # after every bin moved through the count groups, the emptied groups keep a rounding residue
+    # of weight; the smallest possible draw lands on it
+    grid = BinGrid(4)
+    for _ in range(4):
+        for i in range(3):
+            grid.add([(i, 0)])
+    assert grid._count_group_weights.prefix_sum(3) > 0.0
+    monkeypatch.setattr(np.random, "random", lambda n: np.full(n, np.nextafter(1.0, 0.0)))
+    assert set(grid.random_density_bins(3)) <= {(0, 0), (1, 0), (2, 0)}
+
+def test_bin_grid_members():
+    bins = [(0, 0), (1, 2), (0, 0), (3, 3), (1, 2), (0, 0)]
+    grid = BinGrid.from_material_bins(4, bins)
+    assert grid.materials_in((0, 0)).tolist() == [0, 2, 5]
+    assert grid.materials_in((1, 2)).tolist() == [1, 4]
+    assert grid.materials_in((2, 2)).tolist() == []
+
+    grid.add([(2, 2)])
+    assert grid.materials_in((2, 2)).tolist() == [6]
+    for b, m in zip([(0, 0), (1, 2), (3, 3), (2, 2)] * 10,
+                    grid.random_members([(0, 0), (1, 2), (3, 3), (2, 2)] * 10)):
+        assert tuple(grid.material_bins[m]) == b
+
+    # members outgrow their array one material at a time
+    for _ in range(10):
+        grid.add([(3, 3)])
+    assert grid.materials_in((3, 3)).tolist() == [3] + list(range(7, 17))
+    assert not grid.materials_in((3, 3)).flags.writeable
+
+def test_restart_roundtrip(tmp_path):
+    box_d = np.arange(1, 6)
+    box_r = np.random.random((5, 2))
+    grid = BinGrid.from_material_bins(3, [(0, 1), (2, 2), (0, 1), (1, 0), (2, 2)])
+
+    path = str(tmp_path / "restart.txt.npz")
+    dump_restart(path, box_d, box_r, grid, 4)
+    box_d2, box_r2, grid2, gen = load_restart(path, 3)
+    assert (box_d2 == box_d).all() and (box_r2 == box_r).all() and gen == 4
+    assert (grid2.material_bins == grid.material_bins).all()
+    assert grid2.frontier == grid.frontier
+
+def test_restart_only_has_finished_generations(tmp_path):
+    # steady-state order: generation 2 children finished before the last child of generation 1
+    box_gen = np.array([0, 0, 1, 2, 1, 2, 2, 1])
+    assert last_finished_generation(box_gen, 1, 2, 3) == 2
+    assert last_finished_generation(box_gen[:7], 1, 2, 3) == 0
+    assert last_finished_generation(box_gen[:7], 1, 1, 3) == 0
+    assert last_finished_generation(box_gen[np.array([0, 1, 2, 4, 7, 3])], 1, 2, 3) == 1
+
+    box_d = np.array([1, 2, 3, 5, 4, 6, 7, 8])
+    box_r = np.random.random((8, 2))
+    grid = BinGrid.from_material_bins(3, [(0, 1), (2, 2), (0, 1), (1, 0), (2, 2), (1, 1), (0, 0), (2, 0)])
+    keep = box_gen <= 1
+    path = str(tmp_path / "restart.txt.npz")
+    dump_restart(path, box_d, box_r, grid, 2, keep=keep)
+    box_d2, box_r2, grid2, gen = load_restart(path, 3)
+    assert box_d2.tolist() == [1, 2, 3, 4, 8] and (box_r2 == box_r[keep]).all() and gen == 2
+    assert grid2.material_bins.tolist() == [[0, 1], [2, 2], [0, 1], [2, 2], [2, 0]]
+
+def test_check_db_materials_for_restart_deletes_materials_by_id():
+    _, session = db.init_database("sqlite://")
+    for i in range(6):
+        atom_types = [AtomTypes(sigma=1.0, epsilon=10.0)]
+        structure = Structure(a=10.0, b=10.0, c=10.0, atom_types=atom_types,
+                              atom_sites=[AtomSite(atom_types=atom_types[0], x=0.1, y=0.2, z=0.3, q=0.0)])
+        m = Material(structure=structure)
+        m.void_fraction.append(VoidFraction(void_fraction=0.5))
+        m.gas_loading.append(GasLoading(absolute_volumetric_loading=10.0))
+        session.add(m)
+    session.commit()
+
+    # materials 3 and 5 finished, but aren't in the restart; material 6 is
+    check_db_materials_for_restart([1, 2, 4, 6], session, delete_excess=True)
+    assert [m.id for m in session.query(Material).order_by(Material.id)] == [1, 2, 4, 6]
+    assert session.query(Structure).count() == 4
+    assert session.query(AtomSite).count() == 4
+    assert session.query(AtomTypes).count() == 4
+    assert session.query(VoidFraction).count() == 4
+
+def test_load_restart_with_bin_material_lists(tmp_path):
+    material_bins = [(0, 1), (2, 2), (0, 1), (1, 0), (2, 2)]
+    bin_counts = np.zeros((3, 3))
+    bin_materials = np.empty((3, 3), dtype=object)
+    for i, j in np.ndindex(3, 3):
+        bin_materials[i, j] = []
+    for m, (i, j) in enumerate(material_bins):
+        bin_counts[i, j] += 1
+        bin_materials[i, j].append(m)
+
+    path = str(tmp_path / "restart.txt.npz")
+    np.savez(path, np.arange(1, 6), np.random.random((5, 2)), bin_counts, bin_materials,
+             set(material_bins), 4)
+    _, _, grid, gen = load_restart(path, 3)
+    assert gen == 4
+    assert grid.material_bins.tolist() == [list(b) for b in material_bins]
+    assert (grid.dense_counts() == bin_counts).all()
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+from pytest import approx
+
+from htsohm.db import Structure
+from htsohm.energy_grid import EnergyGrid, MAX_ENERGY, calculate_energy_grid, load_energy_grid
+from htsohm.energy_grid import structure_hash, __energy_grid_cache__
+from htsohm.structure_arrays import StructureArrays
+from htsohm.widom import lj_energies, lorentz_berthelot, supercell_atoms, widom_void_fraction
+
+he_epsilon, he_sigma = 10.9, 2.64
+cutoff = 12.8
+
+@pytest.fixture
+def structure_arrays():
+    rng = np.random.default_rng(0)
+    return StructureArrays((9.0, 10.0, 11.0), rng.random((6, 3)), np.zeros(6), [0, 1, 2, 0, 1, 2],
+                           [2.0, 3.0, 1.5], [50.0, 100.0, 30.0])
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    __energy_grid_cache__.clear()
+    yield
+    __energy_grid_cache__.clear()
+
+def direct_energies(sa, points):
+    unit_cells = Structure(*sa.lattice).minimum_unit_cells(cutoff)
+    atoms, atom_index, box = supercell_atoms(sa.frac, sa.lattice, unit_cells)
+    sigma, epsilon = lorentz_berthelot(sa.site_sigma, sa.site_epsilon, he_sigma, he_epsilon)
+    return lj_energies(points, atoms, box, sigma[atom_index], epsilon[atom_index], cutoff)
+
+def test_grid_points_match_direct_energies(structure_arrays):
+    sa = structure_arrays
+    grid = calculate_energy_grid(sa, he_sigma, he_epsilon, cutoff, 1.0)
+    assert grid.shape == (9, 10, 11)
+
+    nodes = np.stack(np.meshgrid(*[np.arange(n) / n for n in grid.shape], indexing="ij"), -1).reshape(-1, 3)
+    expected = np.minimum(direct_energies(sa, nodes * sa.lattice), MAX_ENERGY)
+    assert grid.energies.ravel() == approx(expected)
+    # interpolating at the grid points, or their periodic images, returns the grid energies
+    assert grid.interpolate(nodes * sa.lattice) == approx(expected)
+    assert grid.interpolate((nodes + 1) * sa.lattice) == approx(expected)
+
+def test_interpolate_is_trilinear():
+    energies = np.arange(8, dtype=float).reshape(2, 2, 2)
+    grid = EnergyGrid((2.0, 2.0, 2.0), energies)
+    assert grid.interpolate([(0.5, 0.0, 0.0), (0.0, 0.5, 0.5), (0.5, 0.5, 0.5)]) == approx([2.0, 1.5, 3.5])
+    # the grid wraps around: halfway between the last grid point and the first one
+    assert grid.interpolate([(1.5, 0.0, 0.0)]) == approx([2.0])
+
+    boltzmann_energies = grid.interpolate([(0.5, 0.0, 0.0)], temperature=10.0)
+    assert boltzmann_energies == approx(-10.0 * np.log((np.exp(0.0) + np.exp(-0.4)) / 2))
+
+def test_widom_with_grid_matches_direct_widom(structure_arrays):
+    sa = structure_arrays
+    unit_cells = Structure(*sa.lattice).minimum_unit_cells(cutoff)
+    grid = calculate_energy_grid(sa, he_sigma, he_epsilon, cutoff, 0.4)
+    direct, error = widom_void_fraction(sa, he_sigma, he_epsilon, 298.0, cutoff, unit_cells, 40000, rng=3)
+    gridded, _ = widom_void_fraction(sa, he_sigma, he_epsilon, 298.0, cutoff, unit_cells, 40000, rng=3,
+                                     energy_grid=grid)
+    # same insertion points, so the difference is only the interpolation error
+    assert abs(gridded - direct) < 0.005
+
+def test_structure_hash(structure_arrays):
+    sa = structure_arrays
+    key = structure_hash(sa, he_sigma, he_epsilon, cutoff, 0.5)
+    assert key == structure_hash(sa.copy(), he_sigma, he_epsilon, cutoff, 0.5)
+    assert key != structure_hash(sa, he_sigma, he_epsilon, cutoff, 0.4)
+    assert key != structure_hash(sa, 3.72, 158.5, cutoff, 0.5)
+
+    moved = sa.copy()
+    moved.frac[0, 0] += 0.01
+    assert key != structure_hash(moved, he_sigma, he_epsilon, cutoff, 0.5)
+
+def test_load_energy_grid_caches_to_memory_mapped_files(structure_arrays, tmp_path):
+    sa = structure_arrays
+    grid = load_energy_grid(sa, he_sigma, he_epsilon, cutoff, 1.0, cache_dir=str(tmp_path))
+    key = structure_hash(sa, he_sigma, he_epsilon, cutoff, 1.0)
+    assert [p.name for p in tmp_path.iterdir()] == ["%s.npy" % key]
+    assert isinstance(grid.energies, np.memmap)
+    assert load_energy_grid(sa, he_sigma, he_epsilon, cutoff, 1.0, cache_dir=str(tmp_path)) is grid
+
+    # another worker, with an empty memory cache, loads the saved grid
+    __energy_grid_cache__.clear()
+    loaded = load_energy_grid(sa, he_sigma, he_epsilon, cutoff, 1.0, cache_dir=str(tmp_path))
+    assert loaded is not grid
+    assert np.array_equal(loaded.energies, grid.energies)
+
+def test_load_energy_grid_evicts_least_recently_used(structure_arrays):
+    sa = structure_arrays
+    grids = [load_energy_grid(sa, he_sigma, he_epsilon, cutoff, spacing, max_cached=2) for spacing in (2.0, 3.0)]
+    assert load_energy_grid(sa, he_sigma, he_epsilon, cutoff, 2.0, max_cached=2) is grids[0]
+    load_energy_grid(sa, he_sigma, he_epsilon, cutoff, 4.0, max_cached=2)
+    assert len(__energy_grid_cache__) == 2
+    assert load_energy_grid(sa, he_sigma, he_epsilon, cutoff, 2.0, max_cached=2) is grids[0]
+    assert load_energy_grid(sa, he_sigma, he_epsilon, cutoff, 3.0, max_cached=2) is not grids[1]
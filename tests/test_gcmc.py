@@ -0,0 +1,94 @@
+import numpy as np
+from pytest import approx
+
+from htsohm.db import AtomSite, AtomTypes, Material, Structure
+from htsohm.energy_grid import EnergyGrid
+from htsohm.gcmc import CellList, GCMC, molecules_to_volumetric_loading, peng_robinson_fugacity_coefficient
+from htsohm.simulation.raspa import adsorbate_critical_constants
+from htsohm.simulation.simulate import gas_loading
+from htsohm.slog import init_slog
+
+def test_peng_robinson_fugacity_coefficient():
+    methane = adsorbate_critical_constants("CH4_sp3")
+    assert adsorbate_critical_constants("methane") == methane
+    assert peng_robinson_fugacity_coefficient(298.0, 1.0, *methane) == approx(1.0, abs=1e-6)
+    assert peng_robinson_fugacity_coefficient(298.0, 35e5, *methane) == approx(0.927, abs=1e-3)
+    # below the critical temperature and above the vapor pressure, methane is a liquid
+    assert peng_robinson_fugacity_coefficient(150.0, 35e5, *methane) < 0.5
+
+def test_molecules_to_volumetric_loading():
+    # one molecule per 37.2 cubic nm is about 1 cm^3 (STP) / cm^3
+    assert molecules_to_volumetric_loading(37220.0) == approx(1.0, rel=1e-3)
+
+def test_cell_list_neighbors_include_every_molecule_within_cutoff():
+    rng = np.random.default_rng(0)
+    box, cutoff = np.array([26.0, 30.0, 40.0]), 12.8
+    cell_list = CellList(box, cutoff)
+    assert cell_list.num_cells == (2, 2, 3)
+
+    positions = []
+    for position in rng.random((60, 3)) * box:
+        positions.append(position)
+        assert cell_list.add(position) == len(positions) - 1
+    for index in (5, 58, 0, 30):
+        positions[index] = positions[-1]
+        positions.pop()
+        cell_list.remove(index)
+    for index in (1, 2, 3):
+        positions[index] = rng.random(3) * box
+        cell_list.move(index, positions[index])
+    positions = np.array(positions)
+    assert len(cell_list) == len(positions)
+    assert np.array_equal(cell_list.positions[:len(cell_list)], positions)
+
+    for point in rng.random((20, 3)) * box:
+        d = positions - point
+        d -= box * np.round(d / box)
+        within = {tuple(p) for p in positions[1:][(d[1:] ** 2).sum(axis=1) < cutoff ** 2]}
+        neighbors = {tuple(p) for p in cell_list.neighbors(point, exclude=0)}
+        assert within <= neighbors
+        assert tuple(positions[0]) not in neighbors
+
+def test_gcmc_of_ideal_gas_in_empty_framework():
+    energy_grid = EnergyGrid((13.0, 13.0, 13.0), np.zeros((4, 4, 4)))
+    gcmc = GCMC(energy_grid, (2, 2, 2), 3.72, 0.0, 298.0, 1e6, 12.8, rng=0)
+    assert gcmc.zeta == approx(1e6 * 26.0 ** 3 * 1e-30 / (1.380649e-23 * 298.0))
+    gcmc.run(100, equilibrate=True)
+    blocks = gcmc.run(1000)
+    assert len(blocks) == 5
+    assert np.mean(blocks) == approx(gcmc.zeta, rel=0.1)
+
+def methane_simulation_config(**kwargs):
+    simulation_config = {"type": "gas_loading", "backend": "native", "adsorbate": "methane", "pressure": 3500000,
+                         "temperature": 298.0, "cutoff": 12.8, "initialization_cycles": 20,
+                         "simulation_cycles": 50, "restart_err_threshold": 1e6, "max_restarts": 2,
+                         "energy_grid_spacing": 1.0}
+    simulation_config.update(kwargs)
+    return simulation_config
+
+def methane_material():
+    atom_types = [AtomTypes(sigma=3.0, epsilon=100.0)]
+    structure = Structure(a=13.0, b=13.0, c=13.0, atom_types=atom_types,
+                          atom_sites=[AtomSite(atom_types=atom_types[0], x=0.5, y=0.5, z=0.5, q=0.0)])
+    return Material(structure=structure)
+
+def test_native_gas_loading_run(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    init_slog()
+    material = methane_material()
+    gas_loading.run(material, methane_simulation_config(), {"keep_configs": False})
+
+    assert len(material.gas_loading) == 1
+    result = material.gas_loading[0]
+    assert (result.adsorbate, result.pressure, result.temperature) == ("methane", 3500000, 298.0)
+    assert result.cycles == 50
+    assert result.absolute_volumetric_loading > 0
+    assert result.absolute_volumetric_loading_error >= 0
+    assert list(tmp_path.iterdir()) == []
+
+def test_native_gas_loading_restarts_until_max_restarts(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    init_slog()
+    material = methane_material()
+    gas_loading.run(material, methane_simulation_config(restart_err_threshold=0.0), {"keep_configs": False})
+    assert material.gas_loading[0].cycles == 150
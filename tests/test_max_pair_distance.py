@@ -4,6 +4,7 @@ import pytest
 from pytest import approx
 
 from htsohm.max_pair_distance import minimum_distance_v, minimum_distance_point, max_pair_distance
+from htsohm.max_pair_distance import max_pair_distance_loop
 
 
 def test_minimum_distance_v__within_pbcs():
@@ -41,3 +42,8 @@ def test_max_pair_distance__max_value_should_be_corner_and_center():
     """ max value is sqrt(3) / 2 """
     points = [(0.0, 0.0, 0.0), (0.5, 0.5, 0.5)]
     assert max_pair_distance(points) == approx(3**0.5 / 2)
+
+def test_max_pair_distance__matches_loop_for_all_chunk_sizes():
+    points = np.random.RandomState(11).rand(40, 3)
+    for chunk_size in [1, 7, 40, 1024]:
+        assert max_pair_distance(points, chunk_size) == approx(max_pair_distance_loop(points))
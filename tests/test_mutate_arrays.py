@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+from pytest import approx
+
+from htsohm.db import AtomSite, AtomTypes, Material, Structure
+from htsohm.generator.mutate import random_position
+from htsohm.generator.mutate_arrays import random_positions, mutate_material, mutate_materials
+from htsohm.slog import init_slog
+
+@pytest.fixture(autouse=True)
+def slog():
+    init_slog()
+
+@pytest.fixture
+def config():
+    return {
+        "perturb": ["num_atoms", "atom_type_assignments", "atom_types", "lattice", "atom_sites"],
+        "perturb_type": "all",
+        "mutation_strength": 0.5,
+        "number_of_atom_types": 3,
+        "num_atoms_limits": [1, 10],
+        "sigma_limits": [1.0, 3.0],
+        "epsilon_limits": [10.0, 100.0],
+        "lattice_constant_limits": [10.0, 20.0],
+        "lattice_cubic": True,
+    }
+
+@pytest.fixture
+def parent():
+    atom_types = [AtomTypes(sigma=1.5, epsilon=20.0), AtomTypes(sigma=2.5, epsilon=40.0)]
+    atom_sites = [AtomSite(atom_types=atom_types[i % 2], x=0.1 * i, y=0.2, z=0.3, q=0.0) for i in range(5)]
+    parent = Material(structure=Structure(a=15.0, b=15.0, c=15.0, atom_sites=atom_sites, atom_types=atom_types))
+    parent.id = 1
+    return parent
+
+def test_random_positions_matches_random_position():
+    x0 = np.random.RandomState(0).rand(200)
+    x1 = np.append(np.random.RandomState(1).rand(197), [0.5, 0.0, 1.0])
+    x0[-3:] = [0.0, 0.5, 0.0]
+    for ms in [0.1, 0.5, 1.0]:
+        assert random_positions(x0, x1, ms).tolist() == [random_position(a, b, ms) for a, b in zip(x0, x1)]
+
+def test_mutate_material__stays_within_limits(parent, config):
+    for seed in range(20):
+        cs = mutate_material(parent, config, seed).structure
+        assert len(cs.atom_types) == 3
+        assert 1 <= len(cs.atom_sites) <= 10
+        assert cs.a == cs.b == cs.c
+        assert 10.0 <= cs.a <= 20.0
+        assert all([1.0 <= at.sigma <= 3.0 and 10.0 <= at.epsilon <= 100.0 for at in cs.atom_types])
+        assert all([0.0 <= v < 1.0 for a in cs.atom_sites for v in (a.x, a.y, a.z)])
+
+def test_mutate_material__is_reproducible_from_seed(parent, config):
+    c1 = mutate_material(parent, config, 7).structure.arrays
+    c2 = mutate_material(parent, config, 7).structure.arrays
+    assert np.array_equal(c1.frac, c2.frac) and np.array_equal(c1.sigma, c2.sigma)
+
+def test_mutate_material__arrays_match_rows(parent, config):
+    child = mutate_material(parent, config, 3)
+    structure = child.structure
+    assert child.parent_id == 1
+    assert child.number_density == approx(structure.number_density)
+    assert structure.arrays.void_fraction_atoms() == \
+        [[a.x * structure.a, a.y * structure.b, a.z * structure.c, a.atom_types.sigma] for a in structure.atom_sites]
+
+def test_mutate_material__random_perturb_type_changes_only_one_property(parent, config):
+    config["perturb_type"] = "random"
+    config["perturb"] = ["lattice"]
+    child = mutate_material(parent, config, 5)
+    assert child.perturbation == "lattice"
+    assert child.structure.arrays.frac.tolist() == parent.structure.arrays.frac.tolist()
+
+def test_mutate_materials__one_child_per_parent_reproducible(parent, config):
+    children = mutate_materials([parent] * 4, config, seed=11)
+    again = mutate_materials([parent] * 4, config, seed=11)
+    assert len(children) == 4
+    assert [c.structure.a for c in children] == [c.structure.a for c in again]
+    assert len(set([c.structure.a for c in children])) == 4
@@ -0,0 +1,128 @@
+import csv
+import io
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from htsohm import db
+from htsohm.bin.export import export_from_db
+from htsohm.bin.migrate_db import pack_atom_sites, unpack_atom_sites
+from htsohm.bin.output_csv import (MATERIAL_COLUMNS, output_atom_sites_csv_from_db, output_csv_from_db,
+                                   property_column_index)
+from htsohm.db import AtomSite, AtomTypes, GasLoading, Material, Structure, VoidFraction
+from htsohm.tables import find_table, load_columns, read_table
+
+@pytest.fixture
+def session():
+    _, session = db.init_database("sqlite://")
+    for i in range(7):
+        atom_types = [AtomTypes(sigma=1.0 + i, epsilon=10.0 + i), AtomTypes(sigma=2.0, epsilon=33.3)]
+        atom_sites = [AtomSite(atom_types=atom_types[j % 2], x=0.1 * j, y=0.2, z=0.3 * j, q=0.0)
+                      for j in range(i)]
+        m = Material(structure=Structure(a=10.0 + i, b=11.0, c=12.5, atom_sites=atom_sites, atom_types=atom_types))
+        m.generation = i // 3
+        m.site_distribution = None if i == 4 else 0.5 * i
+        m.void_fraction.append(VoidFraction(void_fraction=0.1 * i, void_fraction_geo=0.2 * i))
+        m.gas_loading.append(GasLoading(absolute_volumetric_loading=10.0 * i, absolute_volumetric_loading_error=1.0))
+        session.add(m)
+    session.commit()
+    session.expunge_all()
+    return session
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 100])
+def test_output_csv_from_db_matches_structure_properties(session, chunk_size):
+    output = io.StringIO()
+    output_csv_from_db(session, start_id=2, output_file=output, chunk_size=chunk_size)
+    rows = list(csv.DictReader(io.StringIO(output.getvalue())))
+    assert [int(r["id"]) for r in rows] == list(range(2, 8))
+
+    for r in rows:
+        m = session.query(Material).get(int(r["id"]))
+        s = m.structure
+        assert int(r["atom_sites"]) == len(s.atom_sites)
+        assert float(r["number_density"]) == s.number_density
+        assert float(r["total_epsilon"]) == pytest.approx(s.total_epsilon, rel=1e-12)
+        assert float(r["epsilon_density"]) == pytest.approx(s.epsilon_density, rel=1e-12)
+        expected_site_distribution = s.site_distribution if m.site_distribution is None else m.site_distribution
+        assert r["site_distribution"] == str(expected_site_distribution)
+
+@pytest.mark.parametrize("ext", [".parquet", ".feather"])
+def test_export_matches_csv(session, tmp_path, ext):
+    pytest.importorskip("pyarrow")
+    materials_csv = io.StringIO()
+    output_csv_from_db(session, output_file=materials_csv)
+    atom_sites_csv = io.StringIO()
+    output_atom_sites_csv_from_db(session, output_file=atom_sites_csv)
+
+    export_from_db(session, str(tmp_path / ("materials" + ext)), str(tmp_path / ("atom_sites" + ext)), chunk_size=3)
+
+    for name, csv_output, columns in [("materials", materials_csv, ["a", "id"]),
+                                      ("atom_sites", atom_sites_csv, ["x", "id"])]:
+        path = str(tmp_path / (name + ext))
+        expected = pd.read_csv(io.StringIO(csv_output.getvalue()))
+        pd.testing.assert_frame_equal(read_table(path), expected, check_dtype=False)
+        pd.testing.assert_frame_equal(read_table(path, columns=columns, max_rows=4), expected[columns][:4],
+                                      check_dtype=False)
+
+    assert read_table(str(tmp_path / ("materials" + ext)), columns=["atom_sites"]).atom_sites.dtype == np.int64
+
+def test_load_columns_from_csv_and_columnar_files(session, tmp_path):
+    pytest.importorskip("pyarrow")
+    with open(tmp_path / "materials.csv", "w") as f:
+        output_csv_from_db(session, output_file=f)
+    export_from_db(session, str(tmp_path / "materials.parquet"))
+
+    from_csv = load_columns(str(tmp_path / "materials.csv"), (9, 3, 0), max_rows=5)
+    from_parquet = load_columns(find_table(str(tmp_path / "materials")), (9, 3, 0), max_rows=5)
+    assert from_csv.shape == (5, 3)
+    assert (from_parquet == from_csv).all()
+    assert (load_columns(str(tmp_path / "materials.parquet"), "a") == from_csv[:, 1].tolist() + [15.0, 16.0]).all()
+
+def test_output_with_packed_atom_sites(session):
+    materials_csv, atom_sites_csv = io.StringIO(), io.StringIO()
+    output_csv_from_db(session, output_file=materials_csv)
+    output_atom_sites_csv_from_db(session, output_file=atom_sites_csv)
+
+    assert pack_atom_sites(session, chunk_size=3) == 7
+    assert session.query(AtomSite).count() == 0
+    packed_materials_csv, packed_atom_sites_csv = io.StringIO(), io.StringIO()
+    output_csv_from_db(session, output_file=packed_materials_csv, chunk_size=3)
+    output_atom_sites_csv_from_db(session, output_file=packed_atom_sites_csv, chunk_size=10)
+    assert packed_materials_csv.getvalue() == materials_csv.getvalue()
+
+    # packed sites have no ids, but are otherwise in the same order
+    without_ids = lambda csv_output: [line.split(",", 1)[1] for line in csv_output.getvalue().splitlines()]
+    assert without_ids(packed_atom_sites_csv) == without_ids(atom_sites_csv)
+
+    assert unpack_atom_sites(session, chunk_size=3) == 7
+    unpacked_atom_sites_csv = io.StringIO()
+    output_atom_sites_csv_from_db(session, output_file=unpacked_atom_sites_csv)
+    assert without_ids(unpacked_atom_sites_csv) == without_ids(atom_sites_csv)
+
+def test_property_column_index():
+    names = [name for name, _ in MATERIAL_COLUMNS]
+    assert names[property_column_index("void_fraction")] == "void_fraction"
+    assert names[property_column_index("void_fraction", "geo")] == "void_fraction_geo"
+    assert names[property_column_index("gas_loading")] == "absolute_volumetric_loading"
+    assert names[property_column_index("number_density")] == "number_density"
+    assert names[property_column_index("site_distribution")] == "site_distribution"
+    assert property_column_index("void_fraction", "zeo") is None
+    assert property_column_index("surface_area") is None
+
+def test_init_database_adds_missing_columns(tmp_path):
+    # a database from before columns like void_fraction_geo_error and site_distribution were added
+    path = str(tmp_path / "old.db")
+    with sqlite3.connect(path) as connection:
+        connection.execute("create table materials (id integer primary key, parent_id integer)")
+        connection.execute("create table void_fractions (id integer primary key, material_id integer)")
+
+    _, session = db.init_database("sqlite:///%s" % path)
+    assert session.query(Material).count() == 0
+    m = Material(structure=Structure(a=10.0, b=10.0, c=10.0))
+    m.site_distribution = 0.5
+    m.void_fraction.append(VoidFraction(void_fraction=0.1, void_fraction_geo_error=0.01))
+    session.add(m)
+    session.commit()
+    assert session.query(VoidFraction).one().void_fraction_geo_error == 0.01
@@ -0,0 +1,99 @@
+import random
+
+import numpy as np
+import pytest
+
+from htsohm import db
+from htsohm.db import AtomSite, AtomTypes, GasLoading, Material, Structure, VoidFraction
+from htsohm.screening import DESCRIPTOR_COLUMNS, SurrogateScreener, structure_descriptors
+
+PROPERTIES = [{"name": "void_fraction", "range": [0.0, 1.0]}, {"name": "gas_loading", "range": [0.0, 100.0]}]
+
+def new_material(a, num_sites, epsilon=50.0):
+    atom_types = [AtomTypes(sigma=3.0, epsilon=epsilon)]
+    atom_sites = [AtomSite(atom_types=atom_types[0], x=0.1 * i, y=0.2, z=0.3, q=0.0) for i in range(num_sites)]
+    return Material(structure=Structure(a=a, b=a, c=a, atom_sites=atom_sites, atom_types=atom_types))
+
+def properties_of(descriptors):
+    """a smooth stand-in for the simulated void fraction and gas loading."""
+    number_density, epsilon_density, a, _, _ = descriptors
+    return [min(1.0, a / 30.0), 400 * epsilon_density]
+
+@pytest.fixture
+def trained_screener():
+    screener = SurrogateScreener(PROPERTIES, num_bins=10, num_neighbors=3, max_bin_count=3, min_materials=10)
+    materials = [new_material(a, n) for a in np.linspace(10.0, 29.0, 20) for n in [1, 2]]
+    descriptors = [structure_descriptors(m) for m in materials]
+    screener.add(descriptors, [properties_of(d) for d in descriptors])
+    return screener
+
+def test_predict_interpolates_training_set(trained_screener):
+    m = new_material(20.2, 1)
+    predicted = trained_screener.predict(m)
+    assert predicted == pytest.approx(properties_of(structure_descriptors(m)), rel=0.1)
+
+def test_screen_rejects_children_in_crowded_bins(trained_screener):
+    # many materials near a=10 with one site: crowded bin
+    crowded = new_material(10.0, 1)
+    descriptors = structure_descriptors(crowded)
+    trained_screener.add([descriptors] * 10, [properties_of(descriptors)] * 10)
+
+    trained_screener.num_neighbors = 1
+    trained_screener.exploration_fraction = 0.0
+    assert not trained_screener.screen(crowded)
+    # a material predicted to land in a rare bin is always simulated
+    assert trained_screener.screen(new_material(10.0, 2))
+
+    trained_screener.exploration_fraction = 1.0
+    assert trained_screener.screen(crowded)
+
+    trained_screener.exploration_fraction = 0.5
+    rng = random.Random(1)
+    num_explored = sum(trained_screener.screen(crowded, rng) for _ in range(1000))
+    assert 400 < num_explored < 600
+
+def test_screen_accepts_everything_until_trained():
+    screener = SurrogateScreener(PROPERTIES, num_bins=10, exploration_fraction=0.0, min_materials=10)
+    m = new_material(10.0, 1)
+    descriptors = structure_descriptors(m)
+    screener.add([descriptors] * 9, [properties_of(descriptors)] * 9)
+    assert screener.screen(m)
+    screener.add([descriptors], [properties_of(descriptors)])
+    assert not screener.screen(m)
+
+def test_structure_properties_are_calculated_not_predicted():
+    screener = SurrogateScreener([PROPERTIES[0], {"name": "number_density", "range": [0.0, 0.01]}], num_bins=10)
+    screener.add([structure_descriptors(new_material(12.0, 1))], [[0.5, 0.0]])
+    m = new_material(12.0, 3)
+    assert screener.predict(m)[1] == pytest.approx(3 / 12.0 ** 3)
+
+    with pytest.raises(ValueError):
+        SurrogateScreener([{"name": "surface_area", "range": [0.0, 1.0]}], num_bins=10)
+
+def test_update_from_db_is_incremental():
+    _, session = db.init_database("sqlite://")
+
+    def add_materials(start, end):
+        for i in range(start, end):
+            m = new_material(10.0 + i, i % 3)
+            m.void_fraction.append(VoidFraction(void_fraction=0.1 * i, void_fraction_geo=0.05 * i))
+            # a material without a loading isn't used for training
+            m.gas_loading.append(GasLoading(absolute_volumetric_loading=None if i == 2 else 10.0 * i))
+            session.add(m)
+        session.commit()
+
+    screener = SurrogateScreener(PROPERTIES, num_bins=10, void_fraction_column="void_fraction_geo")
+    add_materials(0, 5)
+    screener.update_from_db(session, chunk_size=2)
+    assert len(screener) == 4
+    assert screener.last_id == 5
+    add_materials(5, 8)
+    screener.update_from_db(session)
+    assert len(screener) == 7
+    assert screener.last_id == 8
+    assert sum(screener.bin_grid.counts.values()) == 7
+
+    expected = [[0.05 * i, 10.0 * i] for i in range(8) if i != 2]
+    assert screener.targets == pytest.approx(np.array(expected))
+    assert screener.descriptors.shape == (7, len(DESCRIPTOR_COLUMNS))
+    assert screener.descriptors[:, 2] == pytest.approx([10.0 + i for i in range(8) if i != 2])
@@ -0,0 +1,18 @@
+from pytest import approx
+
+from htsohm.site_index import PeriodicSiteIndex
+
+def test_nearest__uses_minimum_image():
+    index = PeriodicSiteIndex([(0.5, 0.5, 0.5), (0.1, 0.1, 0.1)], (1, 1, 1))
+    dist, i = index.nearest([(0.95, 0.1, 0.1)])
+    assert dist[0] == approx(0.15)
+    assert i[0] == 1
+
+def test_nearest__wraps_points_outside_box():
+    index = PeriodicSiteIndex([(-0.5, 4.5, 2.0)], (4, 4, 4))
+    dist, i = index.nearest([(3.5, 0.5, 2.0)])
+    assert dist[0] == approx(0.0)
+
+def test_within__returns_all_sites_within_r():
+    index = PeriodicSiteIndex([(0.0, 0.0, 0.0), (0.9, 0.0, 0.0), (0.5, 0.5, 0.5)], (1, 1, 1))
+    assert sorted(index.within([(0.05, 0.0, 0.0)], 0.2)[0]) == [0, 1]
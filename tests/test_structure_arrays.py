@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+from pytest import approx
+
+from htsohm import db
+from htsohm.db import AtomSite, AtomTypes, Material, Structure
+from htsohm.structure_arrays import PACKED_SITE_DTYPE, StructureArrays
+
+@pytest.fixture
+def structure():
+    atom_types = [AtomTypes(sigma=1.5, epsilon=20.0), AtomTypes(sigma=2.5, epsilon=40.0)]
+    atom_sites = [AtomSite(atom_types=atom_types[1], x=0.1, y=0.2, z=0.3, q=0.0),
+                  AtomSite(atom_types=atom_types[0], x=0.4, y=0.5, z=0.6, q=0.5),
+                  AtomSite(atom_types=atom_types[1], x=0.7, y=0.8, z=0.9, q=-0.5)]
+    return Structure(a=10.0, b=11.0, c=12.0, atom_sites=atom_sites, atom_types=atom_types)
+
+def test_from_structure(structure):
+    sa = StructureArrays.from_structure(structure)
+    assert sa.lattice.tolist() == [10.0, 11.0, 12.0]
+    assert sa.type_index.tolist() == [1, 0, 1]
+    assert sa.site_sigma.tolist() == [2.5, 1.5, 2.5]
+    assert sa.charge.tolist() == [0.0, 0.5, -0.5]
+
+def test_void_fraction_atoms_match_structure(structure):
+    s = structure
+    assert StructureArrays.from_structure(s).void_fraction_atoms() == \
+        [[a.x * s.a, a.y * s.b, a.z * s.c, a.atom_types.sigma] for a in s.atom_sites]
+
+def test_properties_match_structure(structure):
+    sa = StructureArrays.from_structure(structure)
+    assert sa.volume == approx(structure.volume)
+    assert sa.number_density == approx(structure.number_density)
+    assert sa.total_epsilon == approx(structure.total_epsilon)
+    assert sa.epsilon_density == approx(structure.epsilon_density)
+
+def test_to_structure_round_trip(structure):
+    copy = StructureArrays.from_structure(structure).to_structure()
+    assert (copy.a, copy.b, copy.c) == (10.0, 11.0, 12.0)
+    assert [(at.sigma, at.epsilon) for at in copy.atom_types] == [(1.5, 20.0), (2.5, 40.0)]
+    assert [(a.x, a.y, a.z, a.q, copy.atom_types.index(a.atom_types)) for a in copy.atom_sites] == \
+        [(0.1, 0.2, 0.3, 0.0, 1), (0.4, 0.5, 0.6, 0.5, 0), (0.7, 0.8, 0.9, -0.5, 1)]
+
+def site_tuples(structure):
+    return [(a.x, a.y, a.z, a.q, a.atom_types.sigma) for a in structure.atom_sites]
+
+def test_packed_sites_round_trip(structure):
+    sa = StructureArrays.from_structure(structure)
+    packed = StructureArrays.from_packed_sites(sa.lattice, sa.packed_sites(), sa.sigma, sa.epsilon)
+    assert len(sa.packed_sites()) == 3 * PACKED_SITE_DTYPE.itemsize
+    assert packed.frac.tolist() == sa.frac.tolist()
+    assert packed.charge.tolist() == sa.charge.tolist()
+    assert packed.type_index.tolist() == sa.type_index.tolist()
+
+def test_packed_structure_keeps_atom_site_api(structure):
+    sites = site_tuples(structure)
+    _, session = db.init_database("sqlite://")
+    m = Material(structure=structure)
+    session.add(m)
+    session.commit()
+
+    m.structure.pack_sites()
+    session.commit()
+    session.expunge_all()
+    assert session.query(AtomSite).count() == 0
+
+    s = session.query(Structure).one()
+    assert s.packed_sites is not None
+    assert site_tuples(s) == sites
+    assert s.number_density == approx(3 / s.volume)
+    assert s.total_epsilon == approx(100.0)
+    assert s.arrays.site_sigma.tolist() == [2.5, 1.5, 2.5]
+    assert site_tuples(s.clone()) == sites
+
+    s.unpack_sites()
+    session.commit()
+    session.expunge_all()
+    s = session.query(Structure).one()
+    assert s.packed_sites is None
+    assert session.query(AtomSite).count() == 3
+    assert site_tuples(s) == sites
+
+def test_assigning_atom_sites_resets_arrays(structure):
+    assert structure.arrays.number_density == approx(3 / structure.volume)
+    structure.atom_sites = structure.atom_sites[:1]
+    assert structure.arrays.number_density == approx(1 / structure.volume)
+
+    structure.pack_sites()
+    structure.arrays
+    structure.atom_sites = []
+    assert structure.arrays.number_density == 0.0
+
+def test_pack_sites_before_adding_to_session(structure):
+    _, session = db.init_database("sqlite://")
+    m = Material(structure=structure)
+    m.structure.pack_sites()
+    session.add(m)
+    session.commit()
+    assert session.query(AtomSite).count() == 0
+    assert session.query(AtomTypes).count() == 2
+
+def test_pack_sites_after_flush(structure):
+    # the first site's atom type is flushed first, so the atom types' ids aren't in list order
+    sites = site_tuples(structure)
+    _, session = db.init_database("sqlite://")
+    m = Material(structure=structure)
+    session.add(m)
+    session.flush()
+    m.structure.pack_sites()
+    session.commit()
+    session.expunge_all()
+    assert site_tuples(session.query(Structure).one()) == sites
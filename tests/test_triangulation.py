@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+from scipy.spatial import ConvexHull, Delaunay
+
+from htsohm.select.triangulation import IncrementalTriangulation, choose_parents_hull, hull_point_weights, \
+    triangle_area, triangle_areas
+
+def random_box_range(n, seed=0):
+    return np.random.default_rng(seed).random((n, 2)) * (1.0, 400.0)
+
+def test_triangle_areas_matches_triangle_area():
+    box_range = random_box_range(100)
+    simplices = Delaunay(box_range).simplices
+    expected = [abs(triangle_area(box_range[p1], box_range[p2], box_range[p3])) for p1, p2, p3 in simplices]
+    assert np.allclose(triangle_areas(simplices, box_range), expected, rtol=0, atol=1e-12)
+
+def test_hull_point_weights_matches_loop():
+    box_range = random_box_range(100)
+    hull_edges = Delaunay(box_range).convex_hull
+    expected = {i: 0.0 for i in np.unique(hull_edges)}
+    for edge in hull_edges:
+        distance = np.sqrt(np.sum((box_range[edge[0]] - box_range[edge[1]]) ** 2))
+        expected[edge[0]] += distance
+        expected[edge[1]] += distance
+
+    indices, weights = hull_point_weights(hull_edges, box_range)
+    assert indices.tolist() == sorted(expected)
+    assert np.allclose(weights, [expected[i] for i in indices], rtol=1e-12)
+
+def test_incremental_delaunay_matches_full_triangulation():
+    box_range = random_box_range(500)
+    triangulation = IncrementalTriangulation(box_range[:50], 'simplices')
+    for new_points in np.array_split(box_range[50:], 9):
+        triangulation.add_points(new_points)
+
+    def simplex_set(simplices):
+        return set(tuple(sorted(s)) for s in simplices.tolist())
+    assert simplex_set(triangulation.triang.simplices) == simplex_set(Delaunay(box_range).simplices)
+
+def grid_box_range(n):
+    return np.array([(x, y) for x in np.linspace(0, 1, n) for y in np.linspace(0, 1, n)])
+
+def assert_triangulates_unit_square(triangulation, box_range):
+    assert triangle_areas(triangulation.triang.simplices, triangulation.triang.points).sum() == pytest.approx(1.0)
+    assert len(np.unique(triangulation.triang.points[np.unique(triangulation.triang.simplices)], axis=0)) == \
+           len(np.unique(box_range, axis=0))
+
+def test_incremental_delaunay_of_regular_grid():
+    # Qhull can't start an incremental triangulation from cocircular points
+    box_range = grid_box_range(7)
+    triangulation = IncrementalTriangulation(box_range[[0, 6, 42, 48]], 'simplices')
+    for new_points in np.array_split(box_range, 7):
+        triangulation.add_points(new_points)
+    assert_triangulates_unit_square(triangulation, box_range)
+
+    # nor add these points on a grid to one
+    rng = np.random.RandomState(491)
+    box_range = grid_box_range(rng.randint(3, 12))
+    box_range = box_range[rng.permutation(len(box_range))]
+    num_initial = rng.randint(4, 10)
+    triangulation = IncrementalTriangulation(box_range[:num_initial], 'simplices')
+    assert triangulation.incremental
+    for new_points in np.array_split(box_range[num_initial:], rng.randint(1, 10)):
+        triangulation.add_points(new_points)
+    assert_triangulates_unit_square(triangulation, box_range)
+
+def test_incremental_hull_matches_full_hull():
+    box_range = random_box_range(500)
+    triangulation = IncrementalTriangulation(box_range[:50], 'hull')
+    for new_points in np.array_split(box_range[50:], 9):
+        triangulation.add_points(new_points)
+
+    hull = ConvexHull(box_range)
+    assert sorted(triangulation.hull_indices.tolist()) == sorted(hull.vertices.tolist())
+    assert set(tuple(sorted(e)) for e in triangulation.hull_indices[triangulation.hull_edges].tolist()) == \
+        set(tuple(sorted(e)) for e in hull.simplices.tolist())
+
+def test_incremental_hull_keeps_points_on_hull_edges():
+    box_range = random_box_range(500)
+    # materials with a loading of 0, or a void fraction of 1, lie on the edges of the hull
+    box_range[::7, 1] = 0.0
+    box_range[3::11, 0] = 1.0
+    box_range[1] = (0.0, 0.0)
+    triangulation = IncrementalTriangulation(box_range[:50], 'hull')
+    for new_points in np.array_split(box_range[50:], 9):
+        triangulation.add_points(new_points)
+
+    hull_edges = Delaunay(box_range).convex_hull
+    assert triangulation.hull_indices.tolist() == np.unique(hull_edges).tolist()
+    assert set(tuple(sorted(e)) for e in triangulation.hull_indices[triangulation.hull_edges].tolist()) == \
+        set(tuple(sorted(e)) for e in hull_edges.tolist())
+
+    np.random.seed(0)
+    expected = choose_parents_hull(Delaunay(box_range), box_range, 20)
+    np.random.seed(0)
+    assert triangulation.choose_parents(20) == expected
+
+@pytest.mark.parametrize("simplices_or_hull", ['simplices', 'hull'])
+def test_choose_parents_returns_points_from_triangulation(simplices_or_hull):
+    box_range = random_box_range(200)
+    triangulation = IncrementalTriangulation(box_range[:100], simplices_or_hull)
+    triangulation.add_points(box_range[100:])
+    parent_indices = triangulation.choose_parents(20)
+    assert len(parent_indices) == 20
+    if simplices_or_hull == 'hull':
+        assert set(parent_indices) <= set(ConvexHull(box_range).vertices.tolist())
+    else:
+        assert all(0 <= i < 200 for i in parent_indices)
@@ -1,9 +1,17 @@
 import math
+from collections import OrderedDict
 
+import numpy as np
 import pytest
 from pytest import approx
 
-from htsohm.void_fraction import calculate_void_fraction
+from htsohm.void_fraction import calculate_void_fraction, calculate_void_fraction_loop, calculate_void_fractions
+from htsohm.void_fraction import coverage_grid, update_coverage_grid, void_fraction_from_coverage
+from htsohm.void_fraction import estimate_void_fraction_mc, estimate_void_fraction_octree
+from htsohm.void_fraction import atom_block, atom_blocks
+from htsohm.db import AtomSite, AtomTypes, Material, Structure
+from htsohm.simulation.simulate import void_fraction
+from htsohm.slog import get_slog, init_slog
 
 r1volume = 4*math.pi/3
 
@@ -41,3 +49,183 @@ def test_void_fraction_one_sphere_across_pbc():
 
     atoms = [(4,4,4,2)]
     assert calculate_void_fraction(atoms, (4,4,4)) == approx(1 - r1volume/4**3, 0.01)
+
+def test_void_fraction_matches_loop_implementation():
+    rng = np.random.RandomState(42)
+    box = (4.3, 3.7, 5.1)
+    atoms = [(x * box[0], y * box[1], z * box[2], d) for x, y, z, d in
+             zip(rng.rand(12), rng.rand(12), rng.rand(12), rng.uniform(0.5, 3.0, 12))]
+    atoms += [(-0.2, 4.0, 5.1, 1.5), (2.0, 2.0, 2.0, 9.0)]
+    for probe_r in [0.0, 0.65]:
+        assert calculate_void_fraction(atoms, box, 5, probe_r) == \
+               calculate_void_fraction_loop(atoms, box, 5, probe_r)
+
+@pytest.mark.parametrize("occupancy", ["float", "bool", "bits"])
+@pytest.mark.parametrize("max_memory", [None, 1, 500])
+def test_void_fraction_occupancy_and_slabs_match_full_grid(occupancy, max_memory):
+    atoms = [(0.3, 0.2, 3.9, 2.0), (2.5, 1.9, 2.2, 1.2), (4.0, 3.1, 0.0, 3.0)]
+    box = (4.1, 3.3, 4.4)
+    assert calculate_void_fraction(atoms, box, 5, 0.5, occupancy=occupancy, max_memory=max_memory) == \
+           calculate_void_fraction_loop(atoms, box, 5, 0.5)
+
+@pytest.mark.parametrize("max_memory", [None, 2000])
+def test_void_fraction_point_strategy_matches_atom_strategy(max_memory):
+    rng = np.random.RandomState(7)
+    atoms = [(x, y, z, d) for x, y, z, d in
+             zip(4 * rng.rand(10), 4 * rng.rand(10), 4 * rng.rand(10), rng.choice([1.0, 2.0, 2.5], 10))]
+    atoms += [(0, 0, 0, 2), (2, 2, 2, 2)]
+    for probe_r in [0.0, 0.5]:
+        assert calculate_void_fraction(atoms, (4,4,4), 5, probe_r, strategy="point", max_memory=max_memory) == \
+               calculate_void_fraction(atoms, (4,4,4), 5, probe_r, strategy="atom")
+
+def test_void_fraction_point_strategy_empty_crystal():
+    assert calculate_void_fraction([], (4,4,4), strategy="point") == 1.0
+
+def test_void_fraction_auto_strategy():
+    atoms = [(2,2,2,2)]
+    assert calculate_void_fraction(atoms, (4,4,4), strategy="auto") == calculate_void_fraction(atoms, (4,4,4))
+
+def test_coverage_grid_matches_void_fraction():
+    atoms = [(2,2,2,2), (2,2,2,2), (0,0,0,3)]
+    counts = coverage_grid(atoms, (4,4,4), 5, 0.5)
+    assert counts.max() == 2
+    assert void_fraction_from_coverage(counts) == calculate_void_fraction(atoms, (4,4,4), 5, 0.5)
+
+def test_update_coverage_grid_add_and_remove_atoms():
+    parent_atoms = [(2,2,2,2), (0.5,3.5,1,1.5), (0,0,0,3)]
+    child_atoms = [(2,2,2,2), (0,0,0,3), (3,1,3,2.5)]
+    counts = coverage_grid(parent_atoms, (4,4,4), 5, 0.5)
+    update_coverage_grid(counts, (4,4,4), 5, 0.5, added=[(3,1,3,2.5)], removed=[(0.5,3.5,1,1.5)])
+    assert np.array_equal(counts, coverage_grid(child_atoms, (4,4,4), 5, 0.5))
+    assert void_fraction_from_coverage(counts) == calculate_void_fraction(child_atoms, (4,4,4), 5, 0.5)
+
+def test_void_fraction_mc_empty_crystal():
+    assert estimate_void_fraction_mc([], (4,4,4)) == (1.0, 0.0)
+
+def test_void_fraction_mc_one_sphere_across_pbc():
+    vf, err = estimate_void_fraction_mc([(0,0,0,2)], (4,4,4), target_error=0.002, seed=1)
+    assert err <= 0.002
+    assert vf == approx(1 - r1volume/4**3, abs=5*err)
+
+def test_void_fraction_mc_stops_at_max_samples():
+    vf, err = estimate_void_fraction_mc([(2,2,2,2)], (4,4,4), target_error=0.0, batch_size=100,
+                                        max_samples=300, seed=1)
+    assert err > 0.0
+
+def test_void_fraction_octree_one_sphere_w_he_probe():
+    vf, err = estimate_void_fraction_octree([(2,2,2,2)], (4,4,4), probe_r=1.0, target_error=0.01)
+    assert err <= 0.01
+    assert abs(vf - (1 - r1volume*2**3/4**3)) <= err
+
+def test_void_fraction_octree_huge_atom():
+    assert estimate_void_fraction_octree([(2,2,2,100)], (4,4,4)) == (0.0, 0.0)
+
+def test_void_fractions_match_void_fraction():
+    structures = [([(2,2,2,2)], (4,4,4)), ([], (4,4,4)), ([(0,0,0,3), (1,3,2,1)], (4.5,4,4)),
+                  ([(1,1,1,2.5)], (4,4,4))]
+    for max_memory in [None, 1]:
+        assert calculate_void_fractions(structures, 5, 0.5, max_memory) == \
+               [calculate_void_fraction(atoms, box, 5, 0.5) for atoms, box in structures]
+
+def test_atom_blocks_match_atom_block():
+    shape = (40, 40, 45)
+    spheres = [(0.1, 3.9, 2.0, 1.0, (0.1, 0.1, 0.1)), (2.0, 2.0, 2.0, 3.0, (0.1, 0.1, 0.1)),
+               (1.3, 0.7, 4.4, 1.0, (0.1025, 0.1, 0.1)), (3.3, 1.2, 0.05, 0.45, (0.1025, 0.1, 0.1))]
+    centers = np.array([s[:3] for s in spheres])
+    radii = np.array([s[3] for s in spheres])
+    spacings = np.array([s[4] for s in spheres])
+
+    covered = [set() for _ in spheres]
+    for a, ix, iy, iz in atom_blocks(centers, radii, shape, spacings, max_block_points=1):
+        for s, p in zip(a, zip(ix, iy, iz)):
+            covered[s].add(p)
+    for (x, y, z, r, spacing), points in zip(spheres, covered):
+        assert points == set(zip(*atom_block(x, y, z, r, shape, spacing)))
+
+def new_material(a, sites, parent=None):
+    atom_types = [AtomTypes(sigma=3.0, epsilon=50.0)]
+    atom_sites = [AtomSite(atom_types=atom_types[0], x=x, y=y, z=z, q=0.0) for x, y, z in sites]
+    return Material(parent, Structure(a=a, b=a, c=a, atom_types=atom_types, atom_sites=atom_sites))
+
+def test_precalculated_geo_void_fractions_are_cleared():
+    init_slog()
+    simulation_config = {"do_geo": True, "probe_radius": 0.5, "geo_points_per_angstrom": 2}
+    materials = [new_material(6.0, [(0.5, 0.5, 0.5)]), new_material(8.0, [(0.1, 0.2, 0.3)])]
+    void_fraction.precalculate_geo_void_fractions(materials, simulation_config)
+    assert void_fraction.calculate_geo_void_fraction(materials[0], simulation_config) == \
+           (calculate_void_fraction([(3.0, 3.0, 3.0, 3.0)], (6.0, 6.0, 6.0), 2, 0.5), None)
+
+    void_fraction.clear_precalculated_geo_void_fractions()
+    assert void_fraction.__precalculated_geo__ == {}
+
+@pytest.fixture
+def coverage_cache(monkeypatch):
+    """an empty worker coverage grid cache."""
+    init_slog()
+    monkeypatch.setattr(void_fraction, "__coverage_cache__", OrderedDict())
+    monkeypatch.setattr(void_fraction, "__coverage_cache_bytes__", 0)
+    return void_fraction.__coverage_cache__
+
+INCREMENTAL_CONFIG = {"do_geo": True, "probe_radius": 0.5, "geo_points_per_angstrom": 2, "geo_incremental": True}
+PARENT_SITES = [(0.1, 0.1, 0.1), (0.5, 0.5, 0.5), (0.2, 0.7, 0.4), (0.8, 0.3, 0.6)]
+
+def geo_void_fraction(material, simulation_config=INCREMENTAL_CONFIG):
+    return void_fraction.calculate_geo_void_fraction(material, simulation_config)[0]
+
+def full_void_fraction(material):
+    atoms, box = void_fraction.structure_atoms(material.structure)
+    return calculate_void_fraction(atoms, box, 2, 0.5)
+
+def test_incremental_geo_void_fraction_uses_parent_grid(coverage_cache, monkeypatch):
+    parent = new_material(6.0, PARENT_SITES)
+    assert geo_void_fraction(parent) == full_void_fraction(parent)
+    assert list(coverage_cache) == [parent.uuid]
+
+    def fail(*args):
+        raise AssertionError("coverage grid recalculated from scratch")
+    monkeypatch.setattr(void_fraction, "coverage_grid", fail)
+    child = new_material(6.0, PARENT_SITES[:3] + [(0.9, 0.9, 0.1)], parent)
+    assert geo_void_fraction(child) == full_void_fraction(child)
+    assert list(coverage_cache) == [parent.uuid, child.uuid]
+
+def test_incremental_geo_void_fraction_recalculates_when_lattice_changes(coverage_cache, monkeypatch):
+    parent = new_material(6.0, PARENT_SITES)
+    geo_void_fraction(parent)
+
+    calls = []
+    coverage_grid = void_fraction.coverage_grid
+    monkeypatch.setattr(void_fraction, "coverage_grid", lambda *args: calls.append(args) or coverage_grid(*args))
+    child = new_material(6.5, PARENT_SITES, parent)
+    assert geo_void_fraction(child) == full_void_fraction(child)
+    assert len(calls) == 1
+
+def test_coverage_cache_npz_roundtrip(coverage_cache, tmp_path):
+    simulation_config = dict(INCREMENTAL_CONFIG, geo_cache_dir=str(tmp_path / "cache"))
+    parent = new_material(6.0, PARENT_SITES)
+    geo_void_fraction(parent, simulation_config)
+    cached = coverage_cache.pop(parent.uuid)
+
+    loaded = void_fraction.load_coverage(parent.uuid, simulation_config)
+    assert (loaded["counts"] == cached["counts"]).all()
+    assert loaded["atoms"] == cached["atoms"]
+    assert loaded["grid"] == cached["grid"]
+    assert void_fraction.load_coverage(parent.uuid, INCREMENTAL_CONFIG) is None
+
+    # a child in another worker, or a later run, finds its parent's grid on disk
+    child = new_material(6.0, PARENT_SITES[1:], parent)
+    assert geo_void_fraction(child, simulation_config) == full_void_fraction(child)
+    assert "Incremental" in get_slog()
+
+def test_coverage_cache_evicts_least_recently_used(coverage_cache):
+    coverage = {"counts": np.zeros(2**18, dtype=np.int8), "atoms": [], "grid": ()}
+    simulation_config = {"geo_cache_mb": 0.6}
+    for uuid in ["a", "b"]:
+        void_fraction.cache_coverage(uuid, coverage, simulation_config)
+    void_fraction.load_coverage("a", simulation_config)
+    void_fraction.cache_coverage("c", coverage, simulation_config)
+    assert list(coverage_cache) == ["a", "c"]
+
+    # replacing a grid doesn't count it twice
+    void_fraction.cache_coverage("c", coverage, simulation_config)
+    assert list(coverage_cache) == ["a", "c"]
+    assert void_fraction.__coverage_cache_bytes__ == 2 * 2**18
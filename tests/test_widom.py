@@ -0,0 +1,95 @@
+from itertools import product
+import math
+
+import numpy as np
+import pytest
+from pytest import approx
+
+from htsohm.db import AtomSite, AtomTypes, Material, Structure
+from htsohm.simulation.raspa import adsorbate_lj_parameters
+from htsohm.simulation.simulate import void_fraction
+from htsohm.slog import init_slog
+from htsohm.structure_arrays import StructureArrays
+from htsohm.widom import lj_energies, lorentz_berthelot, supercell_atoms, widom_void_fraction
+
+he_epsilon, he_sigma = 10.9, 2.64
+
+@pytest.fixture
+def structure_arrays():
+    rng = np.random.default_rng(0)
+    return StructureArrays((9.0, 10.0, 11.0), rng.random((6, 3)), np.zeros(6), [0, 1, 2, 0, 1, 2],
+                           [2.0, 3.0, 1.5], [50.0, 100.0, 30.0])
+
+def image_sum_energies(sa, points, cutoff):
+    """reference energies of a helium probe, summed over every periodic image of every atom within
+    the cutoff, with the potential shifted at the cutoff."""
+    sigma, epsilon = lorentz_berthelot(sa.site_sigma, sa.site_epsilon, he_sigma, he_epsilon)
+    shift = 4 * epsilon * ((sigma / cutoff) ** 12 - (sigma / cutoff) ** 6)
+    energies = np.zeros(len(points))
+    num_images = [math.ceil(cutoff / l) + 1 for l in sa.lattice]
+    for image in product(*[range(-n, n + 1) for n in num_images]):
+        r = np.linalg.norm(points[:, np.newaxis, :] - (sa.cartesian + image * sa.lattice), axis=2)
+        energies += np.where(r < cutoff, 4 * epsilon * ((sigma / r) ** 12 - (sigma / r) ** 6) - shift, 0.0).sum(axis=1)
+    return energies
+
+def test_lorentz_berthelot():
+    sigma, epsilon = lorentz_berthelot([2.0, 3.0], [40.0, 90.0], 4.0, 10.0)
+    assert sigma.tolist() == [3.0, 3.5]
+    assert epsilon.tolist() == approx([20.0, 30.0])
+
+def test_lj_energies_match_image_sum(structure_arrays):
+    sa = structure_arrays
+    cutoff = 12.8
+    unit_cells = Structure(*sa.lattice).minimum_unit_cells(cutoff)
+    atoms, atom_index, box = supercell_atoms(sa.frac, sa.lattice, unit_cells)
+    assert len(atoms) == len(sa) * np.prod(unit_cells)
+    assert (box >= 2 * cutoff).all()
+
+    sigma, epsilon = lorentz_berthelot(sa.site_sigma, sa.site_epsilon, he_sigma, he_epsilon)
+    points = np.random.default_rng(1).random((500, 3)) * box
+    energies = lj_energies(points, atoms, box, sigma[atom_index], epsilon[atom_index], cutoff, max_pairs=1000)
+    assert energies == approx(image_sum_energies(sa, points % sa.lattice, cutoff), rel=1e-9, abs=1e-9)
+
+def test_lj_energies_overlap():
+    energies = lj_energies([(1.0, 1.0, 1.0), (2.0, 1.0, 1.0)], np.array([(1.0, 1.0, 1.0)]), (10, 10, 10),
+                           np.array([3.0]), np.array([10.0]), 4.9)
+    assert energies[0] == np.inf
+    assert energies[1] > 0
+
+def test_widom_void_fraction_matches_integrated_boltzmann_factor(structure_arrays):
+    # statistical parity: the Monte Carlo average should agree with exp(-U / kT) integrated over
+    # a fine grid of the unit cell to within a few standard errors
+    sa = structure_arrays
+    cutoff, temperature = 12.8, 298.0
+    grid = (np.stack(np.meshgrid(*[(np.arange(20) + 0.5) / 20] * 3, indexing="ij"), -1).reshape(-1, 3)) * sa.lattice
+    expected = np.exp(-image_sum_energies(sa, grid, cutoff) / temperature).mean()
+
+    unit_cells = Structure(*sa.lattice).minimum_unit_cells(cutoff)
+    vf, error = widom_void_fraction(sa, he_sigma, he_epsilon, temperature, cutoff, unit_cells, 40000, rng=2)
+    assert 0 < error < 0.01
+    assert abs(vf - expected) < 4 * error + 1e-3
+
+def test_widom_void_fraction_of_empty_structure():
+    sa = StructureArrays((10.0, 10.0, 10.0), np.empty((0, 3)), [], [], [], [])
+    assert widom_void_fraction(sa, he_sigma, he_epsilon, 298.0, 12.8, (3, 3, 3), 1000) == (1.0, 0.0)
+
+def test_adsorbate_lj_parameters():
+    assert adsorbate_lj_parameters("helium") == (10.9, 2.64)
+    assert adsorbate_lj_parameters("CH4_sp3") == (158.5, 3.72)
+    with pytest.raises(ValueError):
+        adsorbate_lj_parameters("CO2")
+
+def test_native_void_fraction_run(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    init_slog()
+    atom_types = [AtomTypes(sigma=3.0, epsilon=50.0)]
+    structure = Structure(a=12.0, b=12.0, c=12.0, atom_types=atom_types,
+                          atom_sites=[AtomSite(atom_types=atom_types[0], x=0.5, y=0.5, z=0.5, q=0.0)])
+    material = Material(structure=structure)
+    simulation_config = {"type": "void_fraction", "backend": "native", "do_raspa": True, "adsorbate": "helium",
+                         "temperature": 298.0, "cutoff": 12.8, "simulation_cycles": 100}
+    void_fraction.run(material, simulation_config, {"keep_configs": False})
+
+    assert len(material.void_fraction) == 1
+    assert 0.8 < material.void_fraction[0].void_fraction < 1.0
+    assert list(tmp_path.iterdir()) == []
@@ -11,17 +11,18 @@ from bokeh.sampledata.autompg import autompg_clean as m
 from bokeh.transform import linear_cmap
 from bokeh.models.widgets import Slider
 
+from htsohm.tables import read_table
 from pseudomaterial_render import show_pseudomaterial
 
 # constants
 num_ch4_a3 = 2.69015E-05 # from methane-comparison.xlsx
 epsilon_max = 500
-data_files = sorted(glob("./data/*.csv"))
+data_files = sorted(glob("./data/*.csv") + glob("./data/*.parquet") + glob("./data/*.feather"))
 
 # read data and cleanup
 def load_data(path):
     print("loading new data from %s" % path)
-    m = pd.read_csv(path)
+    m = read_table(path)
     m.rename(columns={'void_fraction': 'void_fraction_raspa'}, inplace=True)
 
     m['volume_plotsize'] = (1/3)*m['volume']**(1/2)